@@ -1,17 +1,21 @@
 # app/auth.py
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 import os
 
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 
 from .schemas import TokenData, Token, UserRole
-from .database import get_db
+from .database import get_db, get_async_db
 from .crud.users import get_user_by_email
+from .crud import aio
+from .cache import principal_cache
+from .passwords import hasher  # bcrypt runs in a dedicated process pool
 from . import models
 
 # Secret key and algorithm for JWT
@@ -19,23 +23,22 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY", "changeme")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/token")
 
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return hasher.verify_sync(plain_password, hashed_password)
 
 
-def authenticate_user(db: Session, username: str, password: str):
+async def authenticate_user(db: Session, username: str, password: str):
     # Special-case default admin login
     if username == "admin" and password == "adminpass":
         return models.User(email="admin", hashed_password="", role=UserRole.admin.value)
 
-    # Regular DB lookup
-    user = get_user_by_email(db, username)
-    if not user or not verify_password(password, user.hashed_password):
+    # Regular DB lookup in the threadpool, bcrypt in the password process pool
+    user = await run_in_threadpool(get_user_by_email, db, username)
+    # Invite-pending accounts have no password and cannot log in yet
+    if not user or not user.hashed_password or not await hasher.verify(password, user.hashed_password):
         return None
     return user
 
@@ -48,32 +51,81 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """Decode JWT token to retrieve current user."""
-    credentials_exception = HTTPException(
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user as seen by the routes (detached from any session)."""
+    id: int
+    email: str
+    role: str
+    token_version: int = 0
+
+    @classmethod
+    def from_user(cls, user: models.User) -> "Principal":
+        return cls(id=user.id, email=user.email, role=user.role, token_version=user.token_version or 0)
+
+
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def decode_token(token: str) -> TokenData:
+    """Verify the JWT signature and expiry and return its claims."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         role: str = payload.get("role")
         if username is None or role is None:
-            raise credentials_exception
-        token_data = TokenData(username=username, role=role)
+            raise _credentials_exception()
+        return TokenData(username=username, role=role, version=payload.get("ver", 0))
     except JWTError:
-        raise credentials_exception
-    user = get_user_by_email(db, token_data.username)
-    if not user:
-        raise credentials_exception
-    return user
+        raise _credentials_exception()
 
 
-def get_current_admin(current_user: models.User = Depends(get_current_user)):
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db),
+    adb: Optional[aio.AsyncSession] = Depends(get_async_db)
+) -> Principal:
+    """
+    Decode JWT token to retrieve current user. Principals are cached per
+    (subject, token version); update_user/delete_user clear the cache and bump
+    the version, so tokens issued before the change are rejected.
+    """
+    token_data = decode_token(token)
+    key = (token_data.username, token_data.version)
+    principal = principal_cache.get(key)
+    if principal is not None:
+        return principal
+    # Never block the event loop on the sync session: use the async engine when
+    # configured, otherwise run the lookup in the threadpool
+    user = await aio.read(adb, aio.get_user_by_email, db, get_user_by_email, token_data.username)
+    if not user or (user.token_version or 0) != token_data.version:
+        raise _credentials_exception()
+    principal = Principal.from_user(user)
+    principal_cache.set(key, principal)
+    return principal
+
+
+def get_current_admin(current_user: Principal = Depends(get_current_user)) -> Principal:
     """
     Ensure the current user has admin role.
     """
     if current_user.role != UserRole.admin.value:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
     return current_user
+
+
+def get_admin_claims(token: str = Depends(oauth2_scheme)) -> TokenData:
+    """
+    Authorize from the verified token alone, without a user lookup. Only for
+    read-only admin endpoints: a revoked admin keeps read access until the
+    token expires (ACCESS_TOKEN_EXPIRE_MINUTES).
+    """
+    token_data = decode_token(token)
+    if token_data.role != UserRole.admin.value:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    return token_data
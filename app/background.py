@@ -0,0 +1,92 @@
+# app/background.py
+
+"""
+Periodiske bakgrunnsjobber i API-prosessen.
+
+PeriodicWorker kjører en synkron funksjon i en egen daemon-tråd hvert
+interval sekund, så databasearbeid ikke går via event-loopen eller
+forespørsels-threadpoolen. Feil logges og jobben prøves igjen neste runde.
+Med flere uvicorn-workere kjører hver prosess sin egen jobb; jobbene må derfor
+tåle å kjøre samtidig (sweeperen og webhook-workerne bruker vaktede UPDATEs og
+SKIP LOCKED).
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from .crud.inbox import WEBHOOK_WORKER_INTERVAL, WEBHOOK_WORKERS, drain_webhook_inbox
+from .crud.reservations import RESERVATION_SWEEP_INTERVAL, sweep_expired_reservations
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicWorker:
+    def __init__(self, name: str, interval: float, fn: Callable[[], object]):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.runs = 0
+        self.failures = 0
+        self.last_result = None
+        self.last_ms = 0.0
+
+    def start(self) -> None:
+        """Start tråden; interval <= 0 slår jobben av."""
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def run_once(self):
+        started = time.perf_counter()
+        try:
+            self.last_result = self.fn()
+        except Exception:
+            self.failures += 1
+            logger.exception("Background job %s failed", self.name)
+        finally:
+            self.runs += 1
+            self.last_ms = (time.perf_counter() - started) * 1000
+        return self.last_result
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def stats(self) -> Dict:
+        return {
+            "name": self.name,
+            "interval": self.interval,
+            "running": self._thread is not None,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_result": self.last_result,
+            "last_ms": round(self.last_ms, 3),
+        }
+
+
+# Kansellerer pending ordre med utløpte lagerreservasjoner
+reservation_sweeper = PeriodicWorker(
+    "reservation-sweeper",
+    RESERVATION_SWEEP_INTERVAL,
+    lambda: sweep_expired_reservations(SessionLocal),
+)
+
+# Bruker webhook_inbox på ordrene; hver worker tar sine egne batcher
+webhook_workers: List[PeriodicWorker] = [
+    PeriodicWorker(f"webhook-worker-{i}", WEBHOOK_WORKER_INTERVAL, lambda: drain_webhook_inbox(SessionLocal))
+    for i in range(WEBHOOK_WORKERS)
+]
@@ -0,0 +1,130 @@
+# app/cache.py
+
+"""
+Small in-process caches with LRU eviction and a time-to-live.
+
+Caches register themselves by name so hit/miss counters can be inspected
+through the admin endpoints and all of them can be cleared at once (tests,
+bulk maintenance). Each worker process has its own copy; entries are bounded
+by ``maxsize`` and expire after ``ttl`` seconds even without invalidation.
+
+A read that started before a write must not be cached after the write's
+``clear()``: callers take ``generation`` before reading from the database
+and pass it to ``set()``, which drops the value if a clear happened since.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+_MISSING = object()
+_registry: Dict[str, "TTLCache"] = {}
+
+
+class TTLCache:
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 30.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.generation = 0  # bumped by clear()
+        _registry[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for key, or default if missing or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or entry[0] <= now:
+                if entry is not _MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None) -> None:
+        """
+        Store value under key, evicting the least recently used entry if full.
+        If generation is given and the cache has been cleared since, the
+        value may predate that write and is not stored.
+        """
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drop a single entry."""
+        with self._lock:
+            if self._data.pop(key, _MISSING) is not _MISSING:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        """Drop all entries (counters are kept)."""
+        with self._lock:
+            if self._data:
+                self.invalidations += 1
+            self._data.clear()
+            self.generation += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Counters for every registered cache, keyed by cache name."""
+    return {name: cache.stats() for name, cache in _registry.items()}
+
+
+def clear_caches() -> None:
+    """Clear every registered cache."""
+    for cache in _registry.values():
+        cache.clear()
+
+
+# Public product catalog (GET /products, GET /products/{id}); stores serialized responses
+product_cache = TTLCache(
+    "products",
+    maxsize=int(os.getenv("PRODUCT_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("PRODUCT_CACHE_TTL", "30")),
+)
+
+# Admin dashboard counters (GET /statistics/summary); a few seconds of staleness is fine
+stats_cache = TTLCache(
+    "statistics",
+    maxsize=1,
+    ttl=float(os.getenv("STATS_SUMMARY_TTL", "10")),
+)
+
+# Authenticated principals keyed by (token subject, token version)
+principal_cache = TTLCache(
+    "principals",
+    maxsize=int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("PRINCIPAL_CACHE_TTL", "60")),
+)
@@ -0,0 +1,65 @@
+# app/conditional.py
+
+"""
+HTTP conditional request helpers (ETag / If-None-Match, Last-Modified).
+
+ETags are strong validators derived from row ids and ``updated_at`` versions,
+so they can be computed from the query result before anything is serialized.
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Iterable, Optional
+
+from fastapi import Request, Response
+
+
+def row_version(row) -> str:
+    """Version token for a row: its id plus the last modification time."""
+    stamp = getattr(row, "updated_at", None) or getattr(row, "created_at", None)
+    return f"{row.id}@{stamp.isoformat() if stamp else ''}"
+
+
+def make_etag(*parts) -> str:
+    """Build a quoted, strong ETag from arbitrary version parts."""
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def rows_etag(scope, rows: Iterable) -> str:
+    """ETag for a list response: the request scope plus every row version."""
+    return make_etag(scope, *(row_version(row) for row in rows))
+
+
+def last_modified(rows: Iterable) -> Optional[str]:
+    """HTTP-date of the most recently modified row, or None for an empty list."""
+    stamps = [getattr(r, "updated_at", None) or getattr(r, "created_at", None) for r in rows]
+    stamps = [s for s in stamps if s is not None]
+    if not stamps:
+        return None
+    newest = max(s if s.tzinfo else s.replace(tzinfo=timezone.utc) for s in stamps)
+    return format_datetime(newest.astimezone(timezone.utc), usegmt=True)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match header matches etag."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = {c.strip().removeprefix("W/") for c in header.split(",")}
+    return etag in candidates
+
+
+def validator_headers(etag: str, modified: Optional[str] = None) -> dict:
+    headers = {"ETag": etag}
+    if modified:
+        headers["Last-Modified"] = modified
+    return headers
+
+
+def not_modified(etag: str, modified: Optional[str] = None) -> Response:
+    """Empty 304 response carrying the validators."""
+    return Response(status_code=304, headers=validator_headers(etag, modified))
@@ -17,6 +17,21 @@ from .orders import (
     update_order_status,
     delete_order,
 )
+from .webhooks import (
+    process_payment_events,
+    stripe_payment_event,
+    vipps_payment_event,
+    vipps_payload,
+)
+from .inbox import (
+    enqueue_webhook,
+    drain_webhook_inbox,
+    inbox_counts,
+)
+from .reservations import (
+    expire_reservations,
+    sweep_expired_reservations,
+)
 from .products import (
     get_product,
     get_products,
@@ -24,6 +39,9 @@ from .products import (
     update_product,
     delete_product,
     adjust_product_stock,
+    apply_stock_batch,
+    import_product_chunk,
+    import_stock_chunk,
     get_product_image,
     get_product_images,
     create_product_image,
@@ -34,6 +52,8 @@ from .customers import (
     get_customer,
     get_customers,
     create_customer,
+    import_customers,
+    import_customer_chunk,
     update_customer,
     delete_customer,
     get_customer_with_orders,
@@ -0,0 +1,67 @@
+# app/crud/aio.py
+
+"""
+Async versjoner av de mest brukte lesefunksjonene (DB_ASYNC=1).
+
+Spørringene bygges av de samme select_*-funksjonene som den synkrone stien,
+så filtre, paginering og lasteplaner er identiske. Alt som skal serialiseres
+må lastes eagerly; en AsyncSession kan ikke lazy-loade.
+"""
+
+from typing import List, Optional, Set
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models
+from .products import select_products
+from .orders import select_order, select_orders
+
+
+async def read(adb: Optional[AsyncSession], async_fn, db, sync_fn, *args, **kwargs):
+    """
+    Run a read on the AsyncSession when DB_ASYNC is on, otherwise run the sync
+    crud function in the threadpool (the same thing a sync route would do).
+    """
+    if adb is not None:
+        return await async_fn(adb, *args, **kwargs)
+    return await run_in_threadpool(sync_fn, db, *args, **kwargs)
+
+
+async def get_product(db: AsyncSession, product_id: int) -> Optional[models.Product]:
+    return await db.get(models.Product, product_id)
+
+
+async def get_products(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    in_stock: Optional[bool] = None,
+) -> List[models.Product]:
+    result = await db.scalars(select_products(skip, limit, cursor, in_stock))
+    return list(result.all())
+
+
+async def get_order(db: AsyncSession, order_id: int, expand: Optional[Set[str]] = None) -> Optional[models.Order]:
+    result = await db.scalars(select_order(order_id, expand))
+    return result.first()
+
+
+async def get_orders(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    expand: Optional[Set[str]] = None,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    customer_id: Optional[int] = None,
+) -> List[models.Order]:
+    result = await db.scalars(select_orders(skip, limit, expand, cursor, status, customer_id))
+    return list(result.all())
+
+
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[models.User]:
+    result = await db.scalars(select(models.User).where(models.User.email == email))
+    return result.first()
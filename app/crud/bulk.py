@@ -0,0 +1,78 @@
+# app/crud/bulk.py
+
+"""
+Byggeklosser for bulk-import: chunking av (radnummer, objekt)-par og
+dialekt-spesifikk upsert (MySQL ON DUPLICATE KEY UPDATE, SQLite ON CONFLICT).
+"""
+
+import os
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+from sqlalchemy import Table, insert, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .. import schemas
+
+# Rows per transaction / multi-row statement in the bulk imports
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+
+T = TypeVar("T")
+Chunk = List[Tuple[int, T]]
+
+
+def chunked(rows: Iterable[Tuple[int, T]], size: int) -> Iterator[Chunk]:
+    """Split (row, item) pairs into lists of at most size pairs without materializing the input."""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def import_in_chunks(
+    rows: Iterable[Tuple[int, T]],
+    import_chunk: Callable[[Chunk], schemas.ImportResult],
+    size: Optional[int] = None,
+) -> schemas.ImportResult:
+    """
+    Run import_chunk over rows, one chunk (and transaction) at a time, and
+    merge the results.
+    """
+    result = schemas.ImportResult(created=0)
+    for chunk in chunked(rows, size or IMPORT_CHUNK_SIZE):
+        part = import_chunk(chunk)
+        result.created += part.created
+        result.updated += part.updated
+        result.errors.extend(part.errors)
+    result.errors.sort(key=lambda e: e.row)
+    return result
+
+
+def upsert_rows(db: Session, table: Table, rows: List[dict], keys: Sequence[str], update: Sequence[str]) -> None:
+    """
+    Insert rows with one executemany, overwriting the update columns of rows
+    whose unique keys already exist. Does not commit.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        stmt = mysql_insert(table)
+        stmt = stmt.on_duplicate_key_update({name: stmt.inserted[name] for name in update})
+        db.execute(stmt, rows)
+    elif dialect == "sqlite":
+        stmt = sqlite_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c[k] for k in keys],
+            set_={name: stmt.excluded[name] for name in update},
+        )
+        db.execute(stmt, rows)
+    else:
+        for row in rows:
+            match = [table.c[k] == row[k] for k in keys]
+            if db.execute(select(table.c[keys[0]]).where(*match)).first():
+                db.execute(table.update().where(*match).values({n: row[n] for n in update}))
+            else:
+                db.execute(insert(table).values(**row))
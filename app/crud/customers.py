@@ -1,11 +1,29 @@
 # app/crud/customers.py
 
-import uuid
-from sqlalchemy.orm import Session, joinedload
-from typing import List
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session, joinedload, selectinload
+from typing import List, Optional, Set, Tuple
 from .. import models, schemas
-from .users import create_user as create_user_crud
-from ..schemas import UserCreate, UserRole
+from .orders import customer_read_plan, ORDER_HEADER_COLUMNS
+from ..pagination import paginate
+from ..schemas import AccountState, UserRole
+from .bulk import import_in_chunks
+
+def customer_summary_plan(expand: Set[str]):
+    """
+    Loader options for schemas.CustomerSummary: notes and/or order headers only
+    when named in expand; order lines are never loaded.
+    """
+    options = []
+    if "notes" in expand:
+        options.append(selectinload(models.Customer.notes))
+    if "orders" in expand:
+        options.append(selectinload(models.Customer.orders).load_only(*ORDER_HEADER_COLUMNS))
+    return options
+
+def customer_plan(expand: Optional[Set[str]] = None):
+    """Pick the full CustomerRead plan, or a summary plan when expand is given."""
+    return customer_read_plan() if expand is None else customer_summary_plan(expand)
 
 def get_customer(db: Session, customer_id: int) -> models.Customer:
     """
@@ -13,11 +31,21 @@ def get_customer(db: Session, customer_id: int) -> models.Customer:
     """
     return db.query(models.Customer).filter(models.Customer.id == customer_id).first()
 
-def get_customers(db: Session, skip: int = 0, limit: int = 100) -> List[models.Customer]:
+def get_customers(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    expand: Optional[Set[str]] = None,
+    cursor: Optional[str] = None,
+    country: Optional[str] = None,
+) -> List[models.Customer]:
     """
-    Hent flere kunder, med paginering.
+    Hent flere kunder, med paginering (skip/limit eller cursor).
     """
-    return db.query(models.Customer).offset(skip).limit(limit).all()
+    query = db.query(models.Customer).options(*customer_plan(expand))
+    if country is not None:
+        query = query.filter(models.Customer.country == country)
+    return paginate(query, models.Customer.id, skip, limit, cursor).all()
 
 def create_customer(db: Session, customer: schemas.CustomerCreate) -> models.Customer:
     """
@@ -27,11 +55,16 @@ def create_customer(db: Session, customer: schemas.CustomerCreate) -> models.Cus
     if customer.user_id:
         user_id = customer.user_id
     else:
-        # Create a new auth User for this customer
-        # Use temporary random password
-        temp_pw = uuid.uuid4().hex
-        user_in = UserCreate(email=customer.email, password=temp_pw, role=UserRole.customer)
-        db_user = create_user_crud(db, user_in)
+        # Create a new auth User for this customer without a password (no
+        # bcrypt); it stays invite-pending until a password is set
+        db_user = models.User(
+            email=customer.email,
+            hashed_password=None,
+            role=UserRole.customer.value,
+            account_state=AccountState.invite_pending.value,
+        )
+        db.add(db_user)
+        db.flush()
         user_id = db_user.id
     # Create Customer record linked to user_id
     db_customer = models.Customer(
@@ -50,6 +83,72 @@ def create_customer(db: Session, customer: schemas.CustomerCreate) -> models.Cus
     db.refresh(db_customer)
     return db_customer
 
+def import_customers(db: Session, customers: List[schemas.CustomerCreate]) -> schemas.ImportResult:
+    """
+    Opprett mange kunder på en gang, IMPORT_CHUNK_SIZE (crud.bulk) rader per transaksjon.
+    """
+    seen = set()
+    return import_in_chunks(
+        enumerate(customers),
+        lambda chunk: import_customer_chunk(db, chunk, seen),
+    )
+
+def import_customer_chunk(
+    db: Session, chunk: List[Tuple[int, schemas.CustomerCreate]], seen: Set[str]
+) -> schemas.ImportResult:
+    """
+    Importer én chunk kunder. Rader uten user_id får en invite-pending bruker
+    uten passord, så ingen bcrypt kjøres. Rader med en e-post som allerede
+    finnes (kunde eller bruker, eller tidligere i importen, se seen) hoppes
+    over og rapporteres. To-tre INSERT-setninger og én commit.
+    """
+    errors: List[schemas.ImportRowError] = []
+    emails = [c.email for _, c in chunk]
+    taken = set(db.scalars(select(models.Customer.email).where(models.Customer.email.in_(emails))))
+    user_emails = set(db.scalars(select(models.User.email).where(models.User.email.in_(emails))))
+    linked = {c.user_id for _, c in chunk if c.user_id}
+    users = set(db.scalars(select(models.User.id).where(models.User.id.in_(linked)))) if linked else set()
+
+    rows = []
+    for row, customer in chunk:
+        if customer.email in seen:
+            errors.append(schemas.ImportRowError(row=row, error="Duplicate email in import"))
+        elif customer.email in taken or (not customer.user_id and customer.email in user_emails):
+            errors.append(schemas.ImportRowError(row=row, error="Email already registered"))
+        elif customer.user_id and customer.user_id not in users:
+            errors.append(schemas.ImportRowError(row=row, error=f"User {customer.user_id} not found"))
+        else:
+            rows.append(customer)
+        seen.add(customer.email)
+    if not rows:
+        return schemas.ImportResult(created=0, errors=errors)
+
+    new_users = [c.email for c in rows if not c.user_id]
+    user_ids = {}
+    if new_users:
+        db.execute(insert(models.User), [
+            {
+                "email": email,
+                "hashed_password": None,
+                "role": UserRole.customer.value,
+                "account_state": AccountState.invite_pending.value,
+                "token_version": 0,
+            }
+            for email in new_users
+        ])
+        user_ids = dict(db.execute(
+            select(models.User.email, models.User.id).where(models.User.email.in_(new_users))
+        ).all())
+    db.execute(insert(models.Customer), [
+        {
+            **c.model_dump(exclude={"user_id"}),
+            "user_id": c.user_id or user_ids[c.email],
+        }
+        for c in rows
+    ])
+    db.commit()
+    return schemas.ImportResult(created=len(rows), errors=errors)
+
 def update_customer(db: Session, customer_id: int, updates: schemas.CustomerCreate) -> models.Customer:
     """
     Oppdater eksisterende kunde basert på ID.
@@ -0,0 +1,226 @@
+# app/crud/inbox.py
+
+"""
+Kø for innkommende betalings-webhooks (acknowledge first).
+
+Endepunktene verifiserer leveransen, lagrer den rå i webhook_inbox med
+enqueue_webhook og svarer 2xx med en gang; ingen ordre lastes eller låses i
+forespørselen. Webhook-workerne i app.background kjører drain_webhook_inbox,
+som tar batcher av ventende rader (claim_inbox_batch) og bruker dem på
+ordrene med process_payment_events.
+
+En batch claimes med en vaktet UPDATE (pending -> processing, med en
+claim_token), så flere workere, også i flere prosesser, aldri tar samme rad.
+Rader som blir stående i processing etter at en worker døde, tas igjen etter
+WEBHOOK_CLAIM_TIMEOUT sekunder. Det er trygt fordi ledgeren i webhook_events
+gjør at en hendelse som allerede er brukt bare blir duplicate.
+
+Feiler en batch, prøves radene én og én, så én dårlig hendelse ikke tar med
+seg resten. Rader som fortsatt feiler venter WEBHOOK_RETRY_BACKOFF * 2^(n-1)
+sekunder (maks WEBHOOK_RETRY_BACKOFF_MAX) før neste forsøk, og settes til
+failed etter WEBHOOK_MAX_ATTEMPTS forsøk.
+"""
+
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+from uuid import uuid4
+
+from sqlalchemy import and_, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..logconfig import log_event
+from ..schemas import InboxState, PaymentEvent
+from .webhooks import parse_payment_event, process_payment_events
+
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "2"))
+WEBHOOK_WORKER_INTERVAL = float(os.getenv("WEBHOOK_WORKER_INTERVAL", "0.5"))
+WEBHOOK_BATCH = int(os.getenv("WEBHOOK_BATCH", "100"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5"))
+WEBHOOK_CLAIM_TIMEOUT = float(os.getenv("WEBHOOK_CLAIM_TIMEOUT", "60"))
+WEBHOOK_RETRY_BACKOFF = float(os.getenv("WEBHOOK_RETRY_BACKOFF", "2"))
+WEBHOOK_RETRY_BACKOFF_MAX = float(os.getenv("WEBHOOK_RETRY_BACKOFF_MAX", "300"))
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_webhook(db: Session, event: PaymentEvent, payload: str) -> bool:
+    """
+    Lagre en verifisert leveranse. Returnerer False hvis samme
+    (provider, event_id) allerede ligger i køen; en leveranse som tidligere
+    feilet settes da tilbake til pending så den prøves igjen.
+    """
+    I = models.WebhookInbox
+    try:
+        db.execute(insert(I).values(
+            provider=event.provider,
+            event_id=event.event_id,
+            payload=payload,
+            state=InboxState.pending.value,
+            attempts=0,
+            received_at=datetime.now(timezone.utc),
+        ))
+        db.commit()
+        return True
+    except IntegrityError:
+        db.rollback()
+    db.execute(
+        update(I)
+        .where(I.provider == event.provider, I.event_id == event.event_id, I.state == InboxState.failed.value)
+        .values(state=InboxState.pending.value, attempts=0, error=None, next_attempt_at=None)
+    )
+    db.commit()
+    return False
+
+
+def _claimable(now: datetime):
+    I = models.WebhookInbox
+    stale = now - timedelta(seconds=WEBHOOK_CLAIM_TIMEOUT)
+    return or_(
+        and_(
+            I.state == InboxState.pending.value,
+            or_(I.next_attempt_at.is_(None), I.next_attempt_at <= now),
+        ),
+        and_(I.state == InboxState.processing.value, I.claimed_at <= stale),
+    )
+
+
+def claim_inbox_batch(db: Session, batch_size: int = WEBHOOK_BATCH, now: Optional[datetime] = None) -> List[models.WebhookInbox]:
+    """Ta opptil batch_size ventende rader for denne workeren, eldste først."""
+    I = models.WebhookInbox
+    now = now or datetime.now(timezone.utc)
+    ids = db.scalars(
+        select(I.id)
+        .where(_claimable(now))
+        .order_by(I.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not ids:
+        db.rollback()
+        return []
+    token = uuid4().hex
+    db.execute(
+        update(I)
+        .where(I.id.in_(ids), _claimable(now))
+        .values(
+            state=InboxState.processing.value,
+            claim_token=token,
+            claimed_at=now,
+            attempts=I.attempts + 1,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return db.scalars(select(I).where(I.claim_token == token).order_by(I.id)).all()
+
+
+def _finish(db: Session, ids: List[int], token: str, **values) -> None:
+    I = models.WebhookInbox
+    if ids:
+        db.execute(
+            update(I)
+            .where(I.id.in_(ids), I.claim_token == token)
+            .values(claim_token=None, **values)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def _retry_later(db: Session, row_id: int, attempts: int, token: str, error: str, now: datetime) -> bool:
+    """Sett raden tilbake til pending med backoff, eller failed når forsøkene er brukt opp."""
+    if attempts >= WEBHOOK_MAX_ATTEMPTS:
+        _finish(db, [row_id], token, state=InboxState.failed.value, error=error[:500], processed_at=now)
+        return True
+    delay = min(WEBHOOK_RETRY_BACKOFF * 2 ** (attempts - 1), WEBHOOK_RETRY_BACKOFF_MAX)
+    _finish(
+        db, [row_id], token,
+        state=InboxState.pending.value, error=error[:500], next_attempt_at=now + timedelta(seconds=delay),
+    )
+    return False
+
+
+def process_inbox_batch(db: Session, rows: List[models.WebhookInbox]) -> int:
+    """
+    Bruk de claimede radene på ordrene og marker dem done (eller failed).
+    Feiler batchen, prøves radene én og én; rader som fortsatt feiler får
+    backoff. Returnerer antall rader som ble ferdige (done eller failed).
+    """
+    if not rows:
+        return 0
+    token = rows[0].claim_token
+    now = datetime.now(timezone.utc)
+    events: List[PaymentEvent] = []
+    parsed = []
+    invalid: List[int] = []
+    for row in rows:
+        try:
+            events.append(parse_payment_event(row.provider, row.payload))
+            parsed.append((row.id, row.attempts))
+        except Exception as e:
+            invalid.append(row.id)
+            log_event(logger, logging.WARNING, "webhook.invalid", provider=row.provider, event_id=row.event_id, error=str(e))
+
+    try:
+        results = process_payment_events(db, events) if events else []
+    except Exception as e:
+        db.rollback()
+        log_event(logger, logging.WARNING, "webhook.batch_failed", rows=len(parsed), error=str(e))
+        finished = 0
+        for (row_id, attempts), event in zip(parsed, events):
+            try:
+                [result] = process_payment_events(db, [event])
+            except Exception as e:
+                db.rollback()
+                log_event(
+                    logger, logging.ERROR, "webhook.event_failed", exc_info=True,
+                    provider=event.provider, event_id=event.event_id, attempts=attempts, error=str(e),
+                )
+                finished += _retry_later(db, row_id, attempts, token, str(e), now)
+            else:
+                _finish(db, [row_id], token, state=InboxState.done.value, result=result.value, error=None, processed_at=now)
+                finished += 1
+            db.commit()
+        _finish(db, invalid, token, state=InboxState.failed.value, error="invalid payload", processed_at=now)
+        db.commit()
+        return finished + len(invalid)
+
+    by_result: Dict[str, List[int]] = defaultdict(list)
+    for (row_id, _), result in zip(parsed, results):
+        by_result[result.value].append(row_id)
+    for result, ids in by_result.items():
+        _finish(db, ids, token, state=InboxState.done.value, result=result, error=None, processed_at=now)
+    _finish(db, invalid, token, state=InboxState.failed.value, error="invalid payload", processed_at=now)
+    db.commit()
+    return len(rows)
+
+
+def drain_webhook_inbox(session_factory: Callable[[], Session], batch_size: int = WEBHOOK_BATCH) -> int:
+    """
+    Behandle køen i batcher (egen sesjon per batch) til den er tom. Stopper
+    etter en batch der noen rader måtte vente på nytt forsøk, så de får sin
+    backoff i stedet for å tas igjen med en gang. Returnerer antall ferdige rader.
+    """
+    total = 0
+    while True:
+        db = session_factory()
+        try:
+            rows = claim_inbox_batch(db, batch_size)
+            finished = process_inbox_batch(db, rows)
+        finally:
+            db.close()
+        total += finished
+        if len(rows) < batch_size or finished < len(rows):
+            return total
+
+
+def inbox_counts(db: Session) -> Dict[str, int]:
+    """Antall rader per state i webhook_inbox."""
+    I = models.WebhookInbox
+    counts = {state.value: 0 for state in InboxState}
+    for state, count in db.execute(select(I.state, func.count(I.id)).group_by(I.state)).all():
+        counts[state] = count
+    return counts
@@ -1,10 +1,77 @@
 # app/crud/orders.py
 
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import select
+from sqlalchemy.orm import Session, joinedload, selectinload, load_only
+from typing import List, Optional, Set
 from .. import models, schemas
 from sqlalchemy.exc import SQLAlchemyError
 from ..schemas import OrderStatus  # import enum
+from ..pagination import paginate
+from ..cache import product_cache
+from .sales import record_order_created, record_order_deleted, record_status_change
+from .reservations import add_reservations, apply_status_change, reserve_stock, return_order_stock
+
+# ==========================
+# Query plans
+# ==========================
+# Each response shape gets a fixed set of loader options so that serializing
+# a page of orders costs a constant number of SELECTs instead of one per
+# relationship per row. Collections use selectinload (one IN-query per level),
+# many-to-one links use joinedload (folded into the parent query).
+
+def _items_plan(loader):
+    """Chain order lines -> product onto a loader for Order.items."""
+    return loader.joinedload(models.OrderItem.product)
+
+
+def customer_read_plan(loader=None):
+    """
+    Loader options for schemas.CustomerRead (notes and full order history).
+    Pass a loader for Order.customer to apply the plan below an order.
+    """
+    if loader is None:
+        notes = selectinload(models.Customer.notes)
+        orders = selectinload(models.Customer.orders)
+    else:
+        notes = loader.selectinload(models.Customer.notes)
+        orders = loader.selectinload(models.Customer.orders)
+    return [notes, _items_plan(orders.selectinload(models.Order.items))]
+
+
+def order_read_plan():
+    """Loader options for schemas.OrderRead and schemas.UnprocessedOrder."""
+    return [
+        _items_plan(selectinload(models.Order.items)),
+        *customer_read_plan(joinedload(models.Order.customer)),
+    ]
+
+
+ORDER_HEADER_COLUMNS = (
+    models.Order.id,
+    models.Order.customer_id,
+    models.Order.total_amount,
+    models.Order.status,
+    models.Order.created_at,
+)
+
+
+def order_summary_plan(expand: Set[str]):
+    """
+    Loader options for schemas.OrderSummary: scalar order columns plus only the
+    relationships named in expand ("items", "customer"). Anything not loaded
+    here is left out of the response by app.projections.
+    """
+    options = [load_only(*ORDER_HEADER_COLUMNS)]
+    if "items" in expand:
+        options.append(_items_plan(selectinload(models.Order.items)))
+    if "customer" in expand:
+        options.append(joinedload(models.Order.customer))
+    return options
+
+
+def order_plan(expand: Optional[Set[str]] = None):
+    """Pick the full OrderRead plan, or a summary plan when expand is given."""
+    return order_read_plan() if expand is None else order_summary_plan(expand)
 
 def create_order(db: Session, order_in: schemas.OrderCreate) -> models.Order:
     """
@@ -14,18 +81,46 @@ def create_order(db: Session, order_in: schemas.OrderCreate) -> models.Order:
     customer = db.query(models.Customer).filter(models.Customer.id == order_in.customer_id).first()
     if not customer:
         raise ValueError(f"Customer with id {order_in.customer_id} not found")
+    # Samme produkt kan stå på flere ordrelinjer; summer antall per produkt
+    quantities = {}
+    for item in order_in.items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+
+    # Hent alle produktene i én IN-spørring og lås radene i fast id-rekkefølge,
+    # slik at samtidige utsjekker ikke kan gi deadlock eller oversalg
+    products = (
+        db.query(models.Product)
+        .filter(models.Product.id.in_(quantities))
+        .order_by(models.Product.id)
+        .with_for_update()
+        .all()
+    )
+    by_id = {product.id: product for product in products}
+    for product_id, qty in quantities.items():
+        product = by_id.get(product_id)
+        if not product:
+            db.rollback()
+            raise ValueError(f"Product with id {product_id} not found")
+        if product.available < qty:
+            db.rollback()
+            raise ValueError(f"Not enough stock for product {product.name}")
+
     # Kalkuler totalbeløp basert på produktpriser og antall
     total = 0.0
     items_data = []
     for item in order_in.items:
-        product = db.query(models.Product).filter(models.Product.id == item.product_id).first()
-        if not product:
-            raise ValueError(f"Product with id {item.product_id} not found")
-        if product.stock < item.quantity:
-            raise ValueError(f"Not enough stock for product {product.name}")
+        product = by_id[item.product_id]
         total += product.price * item.quantity
         items_data.append((product, item.quantity, product.price))
 
+    # Reserver lageret med én mengdebasert UPDATE. WHERE-betingelsen gjør
+    # operasjonen atomisk selv der databasen ignorerer FOR UPDATE (SQLite).
+    # Stock trekkes først når ordren betales (se crud.reservations).
+    if not reserve_stock(db, quantities):
+        names = ", ".join(by_id[pid].name for pid in sorted(quantities))
+        db.rollback()
+        raise ValueError(f"Not enough stock for product {names}")
+
     # Opprett ordre-entity
     db_order = models.Order(
         customer_id=order_in.customer_id,
@@ -35,7 +130,7 @@ def create_order(db: Session, order_in: schemas.OrderCreate) -> models.Order:
     db.add(db_order)
     db.flush()  # tvinger SQLAlchemy til å gi db_order en ID uten commit
 
-    # Opprett ordrelinjer og oppdater lager
+    # Opprett ordrelinjer (lageret er allerede reservert over)
     for product, qty, price in items_data:
         order_item = models.OrderItem(
             order_id=db_order.id,
@@ -43,30 +138,63 @@ def create_order(db: Session, order_in: schemas.OrderCreate) -> models.Order:
             quantity=qty,
             price=price
         )
-        product.stock -= qty  # trekk fra lagerbeholdning
         db.add(order_item)
+    add_reservations(db, db_order, quantities)
 
+    # Rollup-raden for dagen er et hett punkt; oppdater den sist, rett før
+    # commit, så låsen holdes så kort som mulig
+    record_order_created(db, db_order, items=sum(quantities.values()))
     db.commit()
+    product_cache.clear()  # availability changed
     db.refresh(db_order)
     return db_order
 
-def get_order(db: Session, order_id: int) -> models.Order:
-    """
-    Hent en ordre basert på ID, inkludert kunde- og brukerdetaljer.
-    """
+def select_order(order_id: int, expand: Optional[Set[str]] = None):
+    """SELECT for one order (shared by the sync and async crud paths)."""
     return (
-        db.query(models.Order)
+        select(models.Order)
         .join(models.Customer, models.Order.customer_id == models.Customer.id)
         .join(models.User, models.Customer.user_id == models.User.id)
-        .filter(models.Order.id == order_id)
-        .first()
+        .options(*order_plan(expand))
+        .where(models.Order.id == order_id)
     )
 
-def get_orders(db: Session, skip: int = 0, limit: int = 100) -> List[models.Order]:
+def select_orders(
+    skip: int = 0,
+    limit: int = 100,
+    expand: Optional[Set[str]] = None,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    customer_id: Optional[int] = None,
+):
+    """SELECT for a page of orders (shared by the sync and async crud paths)."""
+    stmt = select(models.Order).options(*order_plan(expand))
+    if status is not None:
+        stmt = stmt.where(models.Order.status == status)
+    if customer_id is not None:
+        stmt = stmt.where(models.Order.customer_id == customer_id)
+    return paginate(stmt, models.Order.id, skip, limit, cursor)
+
+def get_order(db: Session, order_id: int, expand: Optional[Set[str]] = None) -> models.Order:
     """
-    Hent flere ordrer, med paginering.
+    Hent en ordre basert på ID, inkludert kunde- og brukerdetaljer.
     """
-    return db.query(models.Order).offset(skip).limit(limit).all()
+    return db.scalars(select_order(order_id, expand)).first()
+
+def get_orders(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    expand: Optional[Set[str]] = None,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    customer_id: Optional[int] = None,
+) -> List[models.Order]:
+    """
+    Hent flere ordrer, med paginering (skip/limit eller cursor) og valgfrie filtre.
+    """
+    stmt = select_orders(skip, limit, expand, cursor, status, customer_id)
+    return db.scalars(stmt).all()
 
 def update_order_status(db: Session, order_id: int, status: str) -> models.Order:
     """
@@ -77,12 +205,26 @@ def update_order_status(db: Session, order_id: int, status: str) -> models.Order
         status_enum = OrderStatus(status)
     except ValueError:
         raise ValueError(f"Invalid status '{status}'")
-    db_order = get_order(db, order_id)
-    if db_order:
-        db_order.status = status_enum.value
-        db.commit()
-        db.refresh(db_order)
-    return db_order
+    # Lås ordren og les statusen på nytt, så en samtidig sweeper eller
+    # webhook ikke flytter den fra samme old_status
+    db_order = db.scalars(
+        select(models.Order)
+        .options(selectinload(models.Order.items))
+        .where(models.Order.id == order_id)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    ).first()
+    if not db_order:
+        db.rollback()
+        return None
+    old_status = db_order.status
+    db_order.status = status_enum.value
+    apply_status_change(db, db_order, old_status)
+    record_status_change(db, db_order, old_status)
+    db.commit()
+    product_cache.clear()
+    # get_order skips orders whose customer has no user; the change is committed either way
+    return get_order(db, order_id) or db_order
 
 def delete_order(db: Session, order_id: int) -> None:
     """
@@ -90,12 +232,11 @@ def delete_order(db: Session, order_id: int) -> None:
     """
     db_order = get_order(db, order_id)
     if db_order:
-        # Restore product stock before deleting order items
-        for item in db_order.items:
-            if item.product:
-                item.product.stock += item.quantity
+        return_order_stock(db, db_order)
+        record_order_deleted(db, db_order)
         # Delete order items (disable session synchronization to avoid SAWarning)
         db.query(models.OrderItem).filter(models.OrderItem.order_id == order_id).delete(synchronize_session=False)
         # Delete the order itself
         db.delete(db_order)
         db.commit()
+        product_cache.clear()  # stock/reservations returned
@@ -1,8 +1,29 @@
 # app/crud/products.py
 
+from datetime import datetime, timezone
+from sqlalchemy import insert, select, update
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional, Set, Tuple
 from .. import models, schemas
+from ..pagination import paginate
+from ..cache import product_cache
+from .bulk import upsert_rows
+
+_PRODUCT_IMPORT_FIELDS = ("name", "description", "price", "stock")
+
+def select_products(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    in_stock: Optional[bool] = None,
+):
+    """SELECT for a page of products (shared by the sync and async crud paths)."""
+    stmt = select(models.Product)
+    if in_stock is True:
+        stmt = stmt.where(models.Product.stock - models.Product.reserved > 0)
+    elif in_stock is False:
+        stmt = stmt.where(models.Product.stock - models.Product.reserved <= 0)
+    return paginate(stmt, models.Product.id, skip, limit, cursor)
 
 def get_product(db: Session, product_id: int) -> models.Product:
     """
@@ -10,11 +31,17 @@ def get_product(db: Session, product_id: int) -> models.Product:
     """
     return db.query(models.Product).filter(models.Product.id == product_id).first()
 
-def get_products(db: Session, skip: int = 0, limit: int = 100) -> List[models.Product]:
+def get_products(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    in_stock: Optional[bool] = None,
+) -> List[models.Product]:
     """
-    Hent flere produkter, med paginering.
+    Hent flere produkter, med paginering (skip/limit eller cursor).
     """
-    return db.query(models.Product).offset(skip).limit(limit).all()
+    return db.scalars(select_products(skip, limit, cursor, in_stock)).all()
 
 def create_product(db: Session, product: schemas.ProductCreate) -> models.Product:
     """
@@ -22,12 +49,14 @@ def create_product(db: Session, product: schemas.ProductCreate) -> models.Produc
     """
     db_product = models.Product(
         name=product.name,
+        sku=product.sku,
         description=product.description,
         price=product.price,
         stock=product.stock,
     )
     db.add(db_product)
     db.commit()
+    product_cache.clear()
     db.refresh(db_product)
     return db_product
 
@@ -38,9 +67,14 @@ def update_product(db: Session, product_id: int, updates: schemas.ProductCreate)
     db_product = get_product(db, product_id)
     if not db_product:
         return None
-    for field, value in updates.model_dump(exclude_unset=True).items():
+    values = updates.model_dump(exclude_unset=True)
+    if "stock" in values and not _set_stock(db, product_id, values.pop("stock"), datetime.now(timezone.utc)):
+        db.rollback()
+        raise ValueError(f"Stock cannot be lower than the {db_product.reserved} units reserved by pending orders")
+    for field, value in values.items():
         setattr(db_product, field, value)
     db.commit()
+    product_cache.clear()
     db.refresh(db_product)
     return db_product
 
@@ -52,7 +86,132 @@ def delete_product(db: Session, product_id: int) -> None:
     if db_product:
         db.delete(db_product)
         db.commit()
+        product_cache.clear()
     
+def import_product_chunk(
+    db: Session, chunk: List[Tuple[int, schemas.ProductCreate]], seen: Set[str]
+) -> schemas.ImportResult:
+    """
+    Importer én chunk produkter i én transaksjon. Rader med SKU upsertes
+    (eksisterende SKU oppdateres), rader uten SKU settes inn som nye.
+    seen holder SKU-er fra tidligere chunker, for riktig created/updated-telling.
+    Negativ stock og stock under det som er reservert rapporteres per rad;
+    eksisterende produktrader låses før sjekken, som i import_stock_chunk.
+    """
+    now = datetime.now(timezone.utc)
+    errors = []
+    skus = [p.sku for _, p in chunk if p.sku]
+    reserved = dict(db.execute(
+        select(models.Product.sku, models.Product.reserved)
+        .where(models.Product.sku.in_(skus))
+        .order_by(models.Product.id)
+        .with_for_update()
+    ).all()) if skus else {}
+    keyed, plain = {}, []
+    created = updated = 0
+    for row_number, product in chunk:
+        if product.stock < 0:
+            errors.append(schemas.ImportRowError(row=row_number, error="Stock cannot be negative"))
+            continue
+        if product.sku in reserved and product.stock < reserved[product.sku]:
+            errors.append(schemas.ImportRowError(
+                row=row_number, error=f"Stock cannot be lower than the {reserved[product.sku]} units reserved"
+            ))
+            continue
+        row = {**product.model_dump(include={"sku", *_PRODUCT_IMPORT_FIELDS}), "updated_at": now}
+        if product.sku:
+            if product.sku in reserved or product.sku in seen or product.sku in keyed:
+                updated += 1
+            else:
+                created += 1
+            keyed[product.sku] = row  # last row for a SKU wins
+        else:
+            plain.append(row)
+            created += 1
+    if keyed:
+        upsert_rows(db, models.Product.__table__, list(keyed.values()), ["sku"], [*_PRODUCT_IMPORT_FIELDS, "updated_at"])
+    if plain:
+        db.execute(insert(models.Product), plain)
+    db.commit()
+    seen.update(keyed)
+    product_cache.clear()
+    return schemas.ImportResult(created=created, updated=updated, errors=errors)
+
+def import_stock_chunk(db: Session, chunk: List[Tuple[int, schemas.StockLevel]]) -> schemas.ImportResult:
+    """
+    Sett absolutt lagerbeholdning for en chunk produkter (id eller SKU) med én
+    executemany UPDATE by primary key. Ukjente produkter, negative verdier og
+    nivåer under det som er reservert rapporteres per rad; produktradene låses
+    før sjekken, så reservasjoner kan ikke komme imellom.
+    """
+    errors = []
+    skus = [s.sku for _, s in chunk if s.product_id is None and s.sku]
+    ids = [s.product_id for _, s in chunk if s.product_id is not None]
+    by_sku = dict(db.execute(
+        select(models.Product.sku, models.Product.id).where(models.Product.sku.in_(skus))
+    ).all()) if skus else {}
+    known = set(db.scalars(select(models.Product.id).where(models.Product.id.in_(ids)))) if ids else set()
+
+    now = datetime.now(timezone.utc)
+    levels = {}
+    for row, level in chunk:
+        product_id = level.product_id if level.product_id is not None else by_sku.get(level.sku)
+        if level.product_id is None and not level.sku:
+            errors.append(schemas.ImportRowError(row=row, error="product_id or sku is required"))
+        elif level.stock < 0:
+            errors.append(schemas.ImportRowError(row=row, error="Stock cannot be negative"))
+        elif product_id is None or (level.product_id is not None and product_id not in known):
+            errors.append(schemas.ImportRowError(row=row, error="Product not found"))
+        else:
+            levels[product_id] = (row, {"id": product_id, "stock": level.stock, "updated_at": now})
+    reserved = dict(db.execute(
+        select(models.Product.id, models.Product.reserved)
+        .where(models.Product.id.in_(levels))
+        .order_by(models.Product.id)
+        .with_for_update()
+    ).all()) if levels else {}
+    for product_id, (row, values) in list(levels.items()):
+        if values["stock"] < reserved.get(product_id, 0):
+            errors.append(schemas.ImportRowError(
+                row=row, error=f"Stock cannot be lower than the {reserved[product_id]} units reserved"
+            ))
+            del levels[product_id]
+    if levels:
+        db.execute(update(models.Product), [values for _, values in levels.values()])
+    db.commit()
+    product_cache.clear()
+    return schemas.ImportResult(created=0, updated=len(levels), errors=errors)
+
+def _apply_stock_delta(db: Session, product_id: int, delta: int, now: datetime) -> bool:
+    """
+    Atomisk UPDATE stock = stock + delta, kun hvis resultatet ikke blir negativt
+    eller lavere enn det som er reservert av pending ordre.
+    Returnerer False når vakten slår inn (eller produktet ikke finnes).
+    """
+    Product = models.Product
+    result = db.execute(
+        update(Product)
+        .where(Product.id == product_id, Product.stock + delta >= Product.reserved)
+        .values(stock=Product.stock + delta, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+def _set_stock(db: Session, product_id: int, stock: int, now: datetime) -> bool:
+    """
+    Atomisk UPDATE stock = stock, kun hvis det ikke blir lavere enn det som er
+    reservert av pending ordre. Returnerer False når vakten slår inn (eller
+    produktet ikke finnes).
+    """
+    Product = models.Product
+    result = db.execute(
+        update(Product)
+        .where(Product.id == product_id, Product.reserved <= stock)
+        .values(stock=stock, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
 def adjust_product_stock(db: Session, product_id: int, quantity: int) -> models.Product:
     """
     Adjust the stock of a product by a given quantity (positive to add, negative to remove).
@@ -60,14 +219,161 @@ def adjust_product_stock(db: Session, product_id: int, quantity: int) -> models.
     db_product = get_product(db, product_id)
     if not db_product:
         return None
-    new_stock = db_product.stock + quantity
-    if new_stock < 0:
+    if not _apply_stock_delta(db, product_id, quantity, datetime.now(timezone.utc)):
+        db.rollback()
         raise ValueError(f"Stock cannot be negative; attempted adjustment {quantity}")
-    db_product.stock = new_stock
     db.commit()
+    product_cache.clear()
     db.refresh(db_product)
     return db_product
 
+def apply_stock_batch(db: Session, batch: schemas.StockBatch) -> schemas.StockBatchResult:
+    """
+    Bruk mange lagerendringer (delta eller absolutt nivå) i én transaksjon.
+
+    Produkter slås opp før første UPDATE, og endringene kjøres sortert på
+    produkt-id, så radlåsene tas i fast rekkefølge (ingen deadlocks mellom
+    samtidige batcher) og holdes bare fra første UPDATE til commit.
+    Hver linje får sitt eget resultat; med all_or_nothing rulles alt tilbake
+    hvis én linje feiler. Da kjøres ingen UPDATE hvis en linje er ugyldig
+    eller ukjent, og batchen stopper ved første linje vakten avviser; linjer
+    som ikke ble brukt får rolled_back.
+    """
+    Status = schemas.StockBatchStatus
+    items = batch.items
+    skus = {i.sku for i in items if i.product_id is None and i.sku}
+    ids = {i.product_id for i in items if i.product_id is not None}
+    by_sku = dict(db.execute(
+        select(models.Product.sku, models.Product.id).where(models.Product.sku.in_(skus))
+    ).all()) if skus else {}
+    known = set(db.scalars(select(models.Product.id).where(models.Product.id.in_(ids)))) if ids else set()
+
+    results: List[Optional[schemas.StockBatchItemResult]] = [None] * len(items)
+    todo = []
+    for index, item in enumerate(items):
+        product_id = item.product_id if item.product_id is not None else by_sku.get(item.sku)
+        error = None
+        if item.product_id is None and not item.sku:
+            error = "product_id or sku is required"
+        elif (item.delta is None) == (item.stock is None):
+            error = "Exactly one of delta and stock is required"
+        elif item.stock is not None and item.stock < 0:
+            error = "Stock cannot be negative"
+        if error:
+            results[index] = schemas.StockBatchItemResult(
+                index=index, product_id=product_id, status=Status.invalid, error=error
+            )
+        elif product_id is None or (item.product_id is not None and product_id not in known):
+            results[index] = schemas.StockBatchItemResult(
+                index=index, product_id=item.product_id, status=Status.not_found
+            )
+        else:
+            todo.append((product_id, index, item))
+
+    now = datetime.now(timezone.utc)
+    applied = set()
+    doomed = batch.all_or_nothing and len(todo) < len(items)
+    # Stabil sortering: flere linjer for samme produkt brukes i innsendt rekkefølge
+    for product_id, index, item in ([] if doomed else sorted(todo, key=lambda t: t[0])):
+        if item.stock is not None:
+            ok = _set_stock(db, product_id, item.stock, now)
+            error = f"Stock cannot be lower than the units reserved; attempted stock {item.stock}"
+        else:
+            ok = _apply_stock_delta(db, product_id, item.delta, now)
+            error = f"Stock cannot be negative; attempted adjustment {item.delta}"
+        results[index] = schemas.StockBatchItemResult(
+            index=index,
+            product_id=product_id,
+            status=Status.ok if ok else Status.insufficient_stock,
+            error=None if ok else error,
+        )
+        if ok:
+            applied.add(index)
+        elif batch.all_or_nothing:
+            break
+    for product_id, index, item in todo:
+        if results[index] is None:
+            results[index] = schemas.StockBatchItemResult(
+                index=index, product_id=product_id, status=Status.rolled_back
+            )
+
+    committed = bool(applied) and not (batch.all_or_nothing and len(applied) < len(items))
+    if committed:
+        db.commit()
+        product_cache.clear()
+    else:
+        db.rollback()
+        for index in applied:
+            results[index].status = Status.rolled_back
+        applied.clear()
+    touched = {r.product_id for r in results if r.product_id is not None and r.status != Status.not_found}
+    stock = dict(db.execute(
+        select(models.Product.id, models.Product.stock).where(models.Product.id.in_(touched))
+    ).all()) if touched else {}
+    for r in results:
+        r.stock = stock.get(r.product_id)
+    return schemas.StockBatchResult(
+        applied=len(applied), failed=len(items) - len(applied), committed=committed, results=results
+    )
+
+def _image_urls(images: List[models.ProductImage]) -> dict:
+    """Pick thumbnail and main image URLs: the flagged image, else the first one."""
+    first = images[0].url if images else None
+    return {
+        "thumbnail_url": next((img.url for img in images if img.is_thumbnail), first),
+        "main_image_url": next((img.url for img in images if img.is_main), first),
+    }
+
+def refresh_product_image_urls(db: Session, product_id: int) -> None:
+    """
+    Recompute the denormalized thumbnail_url/main_image_url columns of a product
+    from its images. Also bumps updated_at so the product's ETag changes.
+    """
+    db.flush()
+    images = get_product_images(db, product_id)
+    values = _image_urls(images)
+    values["updated_at"] = datetime.now(timezone.utc)
+    db.query(models.Product).filter(models.Product.id == product_id).update(
+        values, synchronize_session=False
+    )
+
+def backfill_product_image_urls(db: Session, batch_size: int = 500) -> int:
+    """
+    Populate thumbnail_url/main_image_url for every product from product_images.
+    Returns the number of products updated.
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        ids = [
+            row.id for row in
+            db.query(models.Product.id)
+            .filter(models.Product.id > last_id)
+            .order_by(models.Product.id)
+            .limit(batch_size)
+            .all()
+        ]
+        if not ids:
+            break
+        images_by_product = {pid: [] for pid in ids}
+        images = (
+            db.query(models.ProductImage)
+            .filter(models.ProductImage.product_id.in_(ids))
+            .order_by(models.ProductImage.product_id, models.ProductImage.id)
+            .all()
+        )
+        for img in images:
+            images_by_product[img.product_id].append(img)
+        db.execute(
+            update(models.Product),
+            [{"id": pid, **_image_urls(imgs)} for pid, imgs in images_by_product.items()],
+        )
+        db.commit()
+        updated += len(ids)
+        last_id = ids[-1]
+    product_cache.clear()
+    return updated
+
 def get_product_image(db: Session, product_id: int, image_id: int) -> models.ProductImage:
     """Get one product image by ID for a given product."""
     return (
@@ -84,6 +390,7 @@ def get_product_images(db: Session, product_id: int) -> list[models.ProductImage
     return (
         db.query(models.ProductImage)
         .filter(models.ProductImage.product_id == product_id)
+        .order_by(models.ProductImage.id)
         .all()
     )
 
@@ -96,7 +403,9 @@ def create_product_image(db: Session, product_id: int, url: str, is_main: bool=F
         is_thumbnail=int(is_thumbnail)
     )
     db.add(db_image)
+    refresh_product_image_urls(db, product_id)
     db.commit()
+    product_cache.clear()
     db.refresh(db_image)
     return db_image
 
@@ -109,7 +418,9 @@ def update_product_image(db: Session, product_id: int, image_id: int, is_main: b
         db_image.is_main = int(is_main)
     if is_thumbnail is not None:
         db_image.is_thumbnail = int(is_thumbnail)
+    refresh_product_image_urls(db, product_id)
     db.commit()
+    product_cache.clear()
     db.refresh(db_image)
     return db_image
 
@@ -118,33 +429,43 @@ def delete_product_image(db: Session, product_id: int, image_id: int) -> None:
     db_image = get_product_image(db, product_id, image_id)
     if db_image:
         db.delete(db_image)
+        refresh_product_image_urls(db, product_id)
         db.commit()
+        product_cache.clear()
 
 def get_stock(db: Session, product_id: int) -> int:
     """
-    Retrieve the stock quantity for a specific product.
+    Retrieve the available stock (stock - reserved) for a specific product.
     """
     product = db.query(models.Product).filter(models.Product.id == product_id).first()
-    return product.stock if product else None
+    return product.available if product else None
 
 def update_stock(db: Session, product_id: int, quantity: int) -> models.Product:
     """
     Update the stock quantity for a specific product.
+    Raises ValueError if quantity is lower than the units reserved.
     """
     product = db.query(models.Product).filter(models.Product.id == product_id).first()
     if product:
-        product.stock = quantity
+        if not _set_stock(db, product_id, quantity, datetime.now(timezone.utc)):
+            db.rollback()
+            raise ValueError(f"Stock cannot be lower than the {product.reserved} units reserved by pending orders")
         db.commit()
+        product_cache.clear()
         db.refresh(product)
     return product
 
 def delete_stock(db: Session, product_id: int) -> bool:
     """
     Reset the stock quantity for a specific product to zero.
+    Raises ValueError while pending orders hold reservations on it.
     """
     product = db.query(models.Product).filter(models.Product.id == product_id).first()
     if product:
-        product.stock = 0
+        if not _set_stock(db, product_id, 0, datetime.now(timezone.utc)):
+            db.rollback()
+            raise ValueError(f"Stock cannot be lower than the {product.reserved} units reserved by pending orders")
         db.commit()
+        product_cache.clear()
         return True
     return False
@@ -0,0 +1,250 @@
+# app/crud/reservations.py
+
+"""
+Lagerreservasjoner for pending ordrer.
+
+create_order trekker ikke fra Product.stock, men øker Product.reserved og
+lagrer én reservasjon per (ordre, produkt) med utløpstid RESERVATION_TTL.
+Tilgjengelig lager er stock - reserved. Når ordren betales flyttes antallet
+fra reserved til stock (committed); kanselleres den, eller utløper den før
+betaling, gis reservasjonen tilbake (released). Utløpte ordre kanselleres av
+sweep_expired_reservations, som kjøres periodisk fra app.background. Betales
+en utløpt ordre, tas varene fra lageret på nytt bare hvis de fortsatt er
+tilgjengelige; ellers forblir ordren kansellert med refund_required satt.
+
+Alle reservasjoner på en ordre har samme state, så overgangene gjøres med én
+vaktet UPDATE på state; bare transaksjonen som faktisk flyttet radene endrer
+produkttellerne.
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.orm import Session, selectinload
+
+from .. import models
+from ..cache import product_cache
+from ..schemas import OrderStatus, ReservationState
+from .sales import record_status_change
+
+RESERVATION_TTL = int(os.getenv("RESERVATION_TTL", "900"))
+RESERVATION_SWEEP_INTERVAL = float(os.getenv("RESERVATION_SWEEP_INTERVAL", "30"))
+RESERVATION_SWEEP_BATCH = int(os.getenv("RESERVATION_SWEEP_BATCH", "200"))
+
+# Statuser der varene er solgt (lageret er trukket), og der ordren er avbrutt
+SOLD_STATUSES = {OrderStatus.paid.value, OrderStatus.shipped.value}
+ABANDONED_STATUSES = {OrderStatus.canceled.value, OrderStatus.refunded.value}
+
+
+def _shift_products(db: Session, quantities: Dict[int, int], stock: int = 0, reserved: int = 0) -> None:
+    """stock += stock * q og reserved += reserved * q for hvert produkt i én UPDATE."""
+    if not quantities:
+        return
+    Product = models.Product
+    q = case(quantities, value=Product.id)
+    values = {}
+    if stock:
+        values["stock"] = Product.stock + stock * q
+    if reserved:
+        values["reserved"] = Product.reserved + reserved * q
+    db.execute(
+        update(Product)
+        .where(Product.id.in_(quantities))
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _transition(db: Session, order_ids: List[int], old: ReservationState, new: ReservationState) -> Dict[int, int]:
+    """
+    Flytt reservasjonene til ordrene fra old til new. Returnerer antall per
+    produkt som ble flyttet (tomt hvis en annen transaksjon kom først).
+    """
+    R = models.StockReservation
+    if not order_ids:
+        return {}
+    moved = db.execute(
+        update(R)
+        .where(R.order_id.in_(order_ids), R.state == old.value)
+        .values(state=new.value)
+        .execution_options(synchronize_session=False)
+    )
+    if moved.rowcount == 0:
+        return {}
+    rows = db.execute(
+        select(R.product_id, func.sum(R.quantity))
+        .where(R.order_id.in_(order_ids), R.state == new.value)
+        .group_by(R.product_id)
+    ).all()
+    return {product_id: int(qty) for product_id, qty in rows}
+
+
+def reserve_stock(db: Session, quantities: Dict[int, int]) -> bool:
+    """
+    Reserver antall per produkt med én vaktet UPDATE
+    (reserved += q WHERE stock - reserved >= q). Returnerer False hvis minst
+    ett produkt ikke har nok tilgjengelig; kalleren må da rulle tilbake.
+    """
+    Product = models.Product
+    needed = case(quantities, value=Product.id)
+    result = db.execute(
+        update(Product)
+        .where(Product.id.in_(quantities), Product.stock - Product.reserved >= needed)
+        .values(reserved=Product.reserved + needed)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == len(quantities)
+
+
+def add_reservations(db: Session, order: models.Order, quantities: Dict[int, int], now: Optional[datetime] = None) -> None:
+    """Lagre reservasjonene for en nylig flushet ordre."""
+    now = now or datetime.now(timezone.utc)
+    expires_at = now + timedelta(seconds=RESERVATION_TTL)
+    db.execute(insert(models.StockReservation), [
+        {
+            "order_id": order.id,
+            "product_id": product_id,
+            "quantity": qty,
+            "state": ReservationState.active.value,
+            "expires_at": expires_at,
+            "created_at": now,
+        }
+        for product_id, qty in quantities.items()
+    ])
+
+
+def _take_stock(db: Session, quantities: Dict[int, int]) -> bool:
+    """
+    stock -= q for hvert produkt, med vakt stock - reserved >= q. Enten tas
+    alt, eller ingenting: feiler ett produkt legges de forrige tilbake.
+    """
+    Product = models.Product
+    taken: Dict[int, int] = {}
+    for product_id, qty in sorted(quantities.items()):
+        result = db.execute(
+            update(Product)
+            .where(Product.id == product_id, Product.stock - Product.reserved >= qty)
+            .values(stock=Product.stock - qty)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            _shift_products(db, taken, stock=1)
+            return False
+        taken[product_id] = qty
+    return True
+
+
+def commit_reservations(db: Session, order_id: int) -> bool:
+    """
+    Ordren er betalt: trekk reservert antall fra stock. Returnerer False hvis
+    reservasjonen var utløpt og varene ikke lenger er tilgjengelige.
+    """
+    taken = _transition(db, [order_id], ReservationState.active, ReservationState.committed)
+    _shift_products(db, taken, stock=-1, reserved=-1)
+    if taken:
+        return True
+    # Betalt etter at reservasjonen utløp: ta varene fra lageret på nytt
+    retaken = _transition(db, [order_id], ReservationState.released, ReservationState.committed)
+    if not retaken or _take_stock(db, retaken):
+        return True
+    _transition(db, [order_id], ReservationState.committed, ReservationState.released)
+    return False
+
+
+def release_reservations(db: Session, order_ids: List[int]) -> None:
+    """Gi tilbake aktive reservasjoner (kansellert eller utløpt ordre)."""
+    released = _transition(db, order_ids, ReservationState.active, ReservationState.released)
+    _shift_products(db, released, reserved=-1)
+
+
+def apply_status_change(db: Session, order: models.Order, old_status: Optional[str]) -> bool:
+    """
+    Hold reservasjonene i takt med en statusendring på ordren. Returnerer
+    False hvis en utløpt ordre ble betalt etter at varene er solgt til andre:
+    ordren beholder da old_status og får refund_required.
+    """
+    if order.status == old_status:
+        return True
+    if order.status in SOLD_STATUSES:
+        if not commit_reservations(db, order.id):
+            order.status = old_status
+            order.refund_required = True
+            return False
+    elif order.status in ABANDONED_STATUSES:
+        release_reservations(db, [order.id])
+    return True
+
+
+def return_order_stock(db: Session, order: models.Order) -> None:
+    """
+    Gi tilbake det en ordre holder før den slettes: aktive reservasjoner
+    frigis, committed antall legges tilbake på stock. Ordre fra før
+    reservasjoner fantes har ingen rader og trakk lageret ved opprettelse.
+    """
+    R = models.StockReservation
+    if db.scalar(select(R.id).where(R.order_id == order.id).limit(1)) is None:
+        restored: Dict[int, int] = {}
+        for item in order.items:
+            if item.product_id is not None:
+                restored[item.product_id] = restored.get(item.product_id, 0) + item.quantity
+        _shift_products(db, restored, stock=1)
+        return
+    release_reservations(db, [order.id])
+    returned = _transition(db, [order.id], ReservationState.committed, ReservationState.released)
+    _shift_products(db, returned, stock=1)
+    db.execute(delete(R).where(R.order_id == order.id))
+
+
+def expire_reservations(db: Session, now: Optional[datetime] = None, batch_size: int = RESERVATION_SWEEP_BATCH) -> int:
+    """
+    Kanseller én batch pending ordre med utløpte reservasjoner og frigi
+    reservasjonene, i én kort transaksjon. Returnerer antall ordre.
+    """
+    R = models.StockReservation
+    now = now or datetime.now(timezone.utc)
+    order_ids = db.scalars(
+        select(R.order_id)
+        .join(models.Order, models.Order.id == R.order_id)
+        .where(
+            R.state == ReservationState.active.value,
+            R.expires_at <= now,
+            models.Order.status == OrderStatus.pending.value,
+        )
+        .group_by(R.order_id)
+        .order_by(R.order_id)
+        .limit(batch_size)
+    ).all()
+    if not order_ids:
+        return 0
+    # Ordre som betales akkurat nå er låst av betalingen; ta dem neste runde
+    orders = db.scalars(
+        select(models.Order)
+        .options(selectinload(models.Order.items))
+        .where(models.Order.id.in_(order_ids), models.Order.status == OrderStatus.pending.value)
+        .order_by(models.Order.id)
+        .with_for_update(skip_locked=True)
+    ).all()
+    release_reservations(db, [order.id for order in orders])
+    for order in orders:
+        order.status = OrderStatus.canceled.value
+        record_status_change(db, order, OrderStatus.pending.value)
+    db.commit()
+    if orders:
+        product_cache.clear()
+    return len(orders)
+
+
+def sweep_expired_reservations(session_factory: Callable[[], Session], batch_size: int = RESERVATION_SWEEP_BATCH) -> int:
+    """Kjør expire_reservations i batcher (egen sesjon per batch) til ingen gjenstår."""
+    total = 0
+    while True:
+        db = session_factory()
+        try:
+            count = expire_reservations(db, batch_size=batch_size)
+        finally:
+            db.close()
+        total += count
+        if count < batch_size:
+            return total
@@ -0,0 +1,119 @@
+# app/crud/sales.py
+
+"""
+Vedlikehold av sales_daily-rollupen.
+
+Hver endring av en ordre (opprettet, ny status, slettet) legger til et delta
+på raden (dag, status) i samme transaksjon som selve endringen, så rollupen
+aldri er ute av takt med ordretabellen. Deltaet skrives med én upsert, slik at
+samtidige ordre samme dag ikke kolliderer på innsettingen av dagens rad.
+"""
+
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..schemas import OrderStatus
+
+_COUNTERS = ("order_count", "revenue", "item_count")
+
+
+def _status(status: Optional[str]) -> str:
+    return status or OrderStatus.pending.value
+
+
+def _order_day(order: models.Order) -> date:
+    return order.created_at.date()
+
+
+def _item_count(order: models.Order) -> int:
+    return sum(item.quantity for item in order.items)
+
+
+def add_sales_delta(
+    db: Session, day: date, status: str, orders: int, revenue: float, items: int
+) -> None:
+    """
+    Legg deltaene til raden (day, status), og opprett raden om den mangler.
+    Committer ikke; kalleren eier transaksjonen.
+    """
+    table = models.SalesDaily.__table__
+    values = {"day": day, "status": _status(status), "order_count": orders, "revenue": revenue, "item_count": items}
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        stmt = mysql_insert(table).values(**values)
+        stmt = stmt.on_duplicate_key_update(
+            {name: table.c[name] + stmt.inserted[name] for name in _COUNTERS}
+        )
+        db.execute(stmt)
+    elif dialect == "sqlite":
+        stmt = sqlite_insert(table).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.day, table.c.status],
+            set_={name: table.c[name] + stmt.excluded[name] for name in _COUNTERS},
+        )
+        db.execute(stmt)
+    else:
+        result = db.execute(
+            update(table)
+            .where(table.c.day == day, table.c.status == values["status"])
+            .values({name: table.c[name] + values[name] for name in _COUNTERS})
+        )
+        if result.rowcount == 0:
+            db.execute(insert(table).values(**values))
+
+
+def record_order_created(db: Session, order: models.Order, items: int) -> None:
+    """Tell med en nylig flushet ordre (items: antall enheter på ordrelinjene)."""
+    add_sales_delta(db, _order_day(order), order.status, 1, order.total_amount, items)
+
+
+def record_order_deleted(db: Session, order: models.Order) -> None:
+    add_sales_delta(db, _order_day(order), order.status, -1, -order.total_amount, -_item_count(order))
+
+
+def record_status_change(db: Session, order: models.Order, old_status: Optional[str]) -> None:
+    """Flytt ordren fra raden for old_status til raden for order.status."""
+    if _status(old_status) == _status(order.status):
+        return
+    day, items = _order_day(order), _item_count(order)
+    add_sales_delta(db, day, old_status, -1, -order.total_amount, -items)
+    add_sales_delta(db, day, order.status, 1, order.total_amount, items)
+
+
+def rebuild_sales_daily(db: Session) -> int:
+    """
+    Bygg sales_daily på nytt fra orders/order_items i én transaksjon.
+    Returnerer antall rader i rollupen.
+    """
+    items = (
+        select(models.OrderItem.order_id, func.sum(models.OrderItem.quantity).label("quantity"))
+        .group_by(models.OrderItem.order_id)
+        .subquery()
+    )
+    day = func.date(models.Order.created_at)
+    status = func.coalesce(models.Order.status, OrderStatus.pending.value)
+    source = (
+        select(
+            day,
+            status,
+            func.count(models.Order.id),
+            func.coalesce(func.sum(models.Order.total_amount), 0.0),
+            func.coalesce(func.sum(items.c.quantity), 0),
+        )
+        .select_from(models.Order)
+        .outerjoin(items, items.c.order_id == models.Order.id)
+        .where(models.Order.created_at.isnot(None))
+        .group_by(day, status)
+    )
+    db.execute(delete(models.SalesDaily))
+    db.execute(
+        insert(models.SalesDaily).from_select(["day", "status", *_COUNTERS], source)
+    )
+    db.commit()
+    return db.scalar(select(func.count()).select_from(models.SalesDaily))
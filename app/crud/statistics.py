@@ -1,43 +1,126 @@
 # filepath: app/crud/statistics.py
 from sqlalchemy.orm import Session
-from sqlalchemy import extract, func
-from typing import List, Tuple
+from sqlalchemy import and_, case, func, or_, select
+from datetime import date, timedelta
+from typing import Iterator, List, Optional, Set
 
 from .. import models
-from ..schemas import OrderStatus, MonthlySales
+from ..schemas import OrderStatus, MonthlySales, Granularity, SalesBucket, StatisticsSummary
+from .orders import order_plan, order_summary_plan
 
 
-def get_monthly_sales(db: Session, year: int) -> List[Tuple[int, float]]:
+def get_monthly_sales(db: Session, year: int) -> List[MonthlySales]:
     """
     Return total sales per month for a given year (only paid orders).
+    Reads the sales_daily rollup over a half-open date range (at most 366 rows).
     """
-    # Aggregate total_amount by month for the specified year, only for paid orders
-    results = (
+    rows = (
+        db.query(models.SalesDaily.day, models.SalesDaily.revenue)
+        .filter(models.SalesDaily.day >= date(year, 1, 1))
+        .filter(models.SalesDaily.day < date(year + 1, 1, 1))
+        .filter(models.SalesDaily.status == OrderStatus.paid.value)
+        .all()
+    )
+    totals = {}
+    for day, revenue in rows:
+        totals[day.month] = totals.get(day.month, 0.0) + revenue
+    return [MonthlySales(month=month, total=float(totals[month])) for month in sorted(totals)]
+
+
+def _bucket_start(day: date, granularity: Granularity) -> date:
+    if granularity == Granularity.week:
+        return day - timedelta(days=day.weekday())
+    if granularity == Granularity.month:
+        return day.replace(day=1)
+    return day
+
+
+def get_sales_range(
+    db: Session,
+    start: date,
+    end: date,
+    granularity: Granularity = Granularity.day,
+    status: str = OrderStatus.paid.value,
+) -> List[SalesBucket]:
+    """
+    Return order count, revenue and items per day/week/month for [start, end).
+    A primary key range scan on sales_daily; buckets are summed in Python.
+    Weeks start on Monday and the first/last bucket may be partial.
+    """
+    rows = (
         db.query(
-            extract('month', models.Order.created_at).label('month'),
-            func.coalesce(func.sum(models.Order.total_amount), 0).label('total')
+            models.SalesDaily.day,
+            models.SalesDaily.order_count,
+            models.SalesDaily.revenue,
+            models.SalesDaily.item_count,
         )
-        .filter(extract('year', models.Order.created_at) == year)
-        .filter(models.Order.status == OrderStatus.paid.value)
-        .group_by('month')
-        .order_by('month')
+        .filter(models.SalesDaily.day >= start)
+        .filter(models.SalesDaily.day < end)
+        .filter(models.SalesDaily.status == status)
+        .order_by(models.SalesDaily.day)
         .all()
     )
-    # Convert results into MonthlySales schema instances
-    return [MonthlySales(month=int(month), total=float(total)) for month, total in results]
+    buckets = {}
+    for day, orders, revenue, items in rows:
+        key = _bucket_start(day, granularity)
+        bucket = buckets.setdefault(key, [0, 0.0, 0])
+        bucket[0] += orders
+        bucket[1] += revenue
+        bucket[2] += items
+    return [
+        SalesBucket(period_start=key, order_count=orders, revenue=float(revenue), item_count=items)
+        for key, (orders, revenue, items) in buckets.items()
+        if orders
+    ]
 
 
-def get_unprocessed_orders(db: Session) -> List[models.Order]:
+def get_unprocessed_orders(db: Session, expand: Optional[Set[str]] = None) -> List[models.Order]:
     """
     Return all orders that have been paid but not yet shipped (successfully paid orders awaiting processing).
     """
     return (
         db.query(models.Order)
+        .options(*order_plan(expand))
         .filter(models.Order.status == OrderStatus.paid.value)
+        # Served by ix_orders_status_created_at without a filesort
+        .order_by(models.Order.created_at, models.Order.id)
         .all()
     )
 
 
+def iter_unprocessed_orders(db: Session, batch_size: int = 500) -> Iterator[List[models.Order]]:
+    """
+    Yield paid orders in batches of batch_size, with customer and items
+    (+ product) loaded per batch. Keyset pagination on (created_at, id) keeps
+    each batch an index range scan on ix_orders_status_created_at, and the
+    session is emptied between batches so memory does not grow with the export.
+    """
+    Order = models.Order
+    last = None
+    while True:
+        stmt = (
+            select(Order)
+            .options(*order_summary_plan({"customer", "items"}))
+            .where(Order.status == OrderStatus.paid.value)
+            .order_by(Order.created_at, Order.id)
+            .limit(batch_size)
+        )
+        if last is not None:
+            created_at, order_id = last
+            stmt = stmt.where(or_(
+                Order.created_at > created_at,
+                and_(Order.created_at == created_at, Order.id > order_id),
+            ))
+        batch = db.scalars(stmt).unique().all()
+        if not batch:
+            return
+        last = (batch[-1].created_at, batch[-1].id)
+        yield batch
+        db.expunge_all()
+        if len(batch) < batch_size:
+            return
+
+
 def get_total_users(db: Session) -> int:
     """
     Return total number of registered users.
@@ -45,31 +128,53 @@ def get_total_users(db: Session) -> int:
     return db.query(func.count(models.User.id)).scalar() or 0
 
 
+def _rollup_sum(db: Session, column, status: Optional[str] = None):
+    query = db.query(func.coalesce(func.sum(column), 0))
+    if status is not None:
+        query = query.filter(models.SalesDaily.status == status)
+    return query.scalar()
+
+
 def get_paid_unprocessed_count(db: Session) -> int:
     """
     Return count of orders that are paid but not yet processed (if processing status differs, here we treat paid as unprocessed).
     """
-    return (
-        db.query(func.count(models.Order.id))
-        .filter(models.Order.status == OrderStatus.paid.value)
-        .scalar() or 0
-    )
+    return int(_rollup_sum(db, models.SalesDaily.order_count, OrderStatus.paid.value))
 
 
 def get_total_orders(db: Session) -> int:
     """
     Return total number of orders placed.
     """
-    return db.query(func.count(models.Order.id)).scalar() or 0
+    return int(_rollup_sum(db, models.SalesDaily.order_count))
 
 
 def get_total_revenue(db: Session) -> float:
     """
     Return total revenue of orders with status paid (excluding refunded).
     """
-    total = (
-        db.query(func.coalesce(func.sum(models.Order.total_amount), 0.0))
-        .filter(models.Order.status == OrderStatus.paid.value)
-        .scalar()
+    return float(_rollup_sum(db, models.SalesDaily.revenue, OrderStatus.paid.value))
+
+
+def get_summary(db: Session) -> StatisticsSummary:
+    """
+    Return all dashboard counters in one statement: conditional aggregation
+    over sales_daily plus a scalar subquery for the user count.
+    """
+    rollup = models.SalesDaily
+    is_paid = rollup.status == OrderStatus.paid.value
+    row = db.execute(
+        select(
+            select(func.count(models.User.id)).scalar_subquery(),
+            func.coalesce(func.sum(rollup.order_count), 0),
+            func.coalesce(func.sum(case((is_paid, rollup.revenue), else_=0.0)), 0.0),
+            func.coalesce(func.sum(case((is_paid, rollup.order_count), else_=0)), 0),
+        )
+    ).one()
+    users, orders, revenue, paid = row
+    return StatisticsSummary(
+        total_users=users or 0,
+        total_orders=int(orders),
+        total_revenue=float(revenue),
+        paid_unprocessed_count=int(paid),
     )
-    return float(total)
@@ -1,17 +1,23 @@
 # app/crud/users.py
-from sqlalchemy.orm import Session
-from passlib.context import CryptContext
+from sqlalchemy.orm import Session, joinedload
+from typing import Optional, Set
 from .. import models, schemas
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from ..pagination import paginate
+from ..cache import principal_cache
+from ..passwords import hasher, pwd_context  # noqa: F401 (pwd_context re-exported)
 
 
 def get_user_by_email(db: Session, email: str) -> models.User:
     return db.query(models.User).filter(models.User.email == email).first()
 
 
-def create_user(db: Session, user_in: schemas.UserCreate) -> models.User:
-    hashed_password = pwd_context.hash(user_in.password)
+def create_user(db: Session, user_in: schemas.UserCreate, hashed_password: Optional[str] = None) -> models.User:
+    """
+    Create a user. Async routes hash first (app.passwords) and pass hashed_password;
+    otherwise the password is hashed here through the same bounded process pool.
+    """
+    if hashed_password is None:
+        hashed_password = hasher.hash_sync(user_in.password)
     db_user = models.User(
         email=user_in.email,
         hashed_password=hashed_password,
@@ -23,11 +29,16 @@ def create_user(db: Session, user_in: schemas.UserCreate) -> models.User:
     return db_user
 
 
-def get_users(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.User).offset(skip).limit(limit).all()
+def get_users(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, role: Optional[str] = None):
+    query = db.query(models.User)
+    if role is not None:
+        query = query.filter(models.User.role == role)
+    return paginate(query, models.User.id, skip, limit, cursor).all()
 
 
-def update_user(db: Session, user_id: int, user_in: schemas.UserCreate) -> models.User:
+def update_user(
+    db: Session, user_id: int, user_in: schemas.UserCreate, hashed_password: Optional[str] = None
+) -> models.User:
     """
     Update an existing user (admin only).
     """
@@ -36,9 +47,13 @@ def update_user(db: Session, user_id: int, user_in: schemas.UserCreate) -> model
         return None
     # Update fields
     db_user.email = user_in.email
-    db_user.hashed_password = pwd_context.hash(user_in.password)
+    db_user.hashed_password = hashed_password or hasher.hash_sync(user_in.password)
+    db_user.account_state = schemas.AccountState.active.value
     db_user.role = user_in.role
+    # Revoke tokens issued before the change (email, password or role)
+    db_user.token_version = (db_user.token_version or 0) + 1
     db.commit()
+    principal_cache.clear()
     db.refresh(db_user)
     return db_user
 
@@ -51,8 +66,17 @@ def delete_user(db: Session, user_id: int) -> None:
     if db_user:
         db.delete(db_user)
         db.commit()
+        principal_cache.clear()
+
+
+def user_summary_plan(expand: Set[str]):
+    """Loader options for schemas.UserSummary; the customer profile only when expanded."""
+    return [joinedload(models.User.customer)] if "customer" in expand else []
 
 
-def get_user(db: Session, user_id: int) -> models.User:
-    """Get a user by its ID."""
-    return db.query(models.User).filter(models.User.id == user_id).first()
+def get_user(db: Session, user_id: int, expand: Optional[Set[str]] = None) -> models.User:
+    """Get a user by its ID. With expand, only load what schemas.UserSummary needs."""
+    query = db.query(models.User)
+    if expand is not None:
+        query = query.options(*user_summary_plan(expand))
+    return query.filter(models.User.id == user_id).first()
@@ -0,0 +1,211 @@
+# app/crud/webhooks.py
+
+"""
+Idempotent behandling av betalings-webhooks (Stripe og Vipps).
+
+Hver hendelse lagres i webhook_events med unik (provider, event_id). En
+gjentatt leveranse gjenkjennes med ett indeksert oppslag før noen ordre
+lastes, og gir WebhookResult.duplicate uten videre arbeid. Statusoverganger
+fra webhooks går bare framover (ORDER_TRANSITIONS): en sen "expired" eller
+"rejected" kan ikke kansellere en ordre som allerede er betalt.
+
+process_payment_events tar en liste hendelser og gjør alt i én transaksjon:
+ett duplikatoppslag per provider, én last av ordrene (låst, uten joins),
+én bulk-insert i ledgeren og én commit.
+"""
+
+import json
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload
+
+from .. import models
+from ..cache import product_cache
+from ..schemas import OrderStatus, PaymentEvent, VippsCallback, WebhookResult
+from .reservations import apply_status_change
+from .sales import record_status_change
+
+# Lovlige statusoverganger fra webhooks. canceled -> paid er med fordi en
+# betaling kan komme etter at reservasjonen utløp og ordren ble kansellert;
+# den brukes bare hvis varene kan tas fra lageret igjen (se
+# reservations.commit_reservations), ellers blir resultatet needs_refund.
+ORDER_TRANSITIONS = {
+    OrderStatus.pending.value: {
+        OrderStatus.paid.value,
+        OrderStatus.shipped.value,
+        OrderStatus.canceled.value,
+        OrderStatus.refunded.value,
+    },
+    OrderStatus.paid.value: {OrderStatus.shipped.value, OrderStatus.refunded.value},
+    OrderStatus.shipped.value: {OrderStatus.refunded.value},
+    OrderStatus.canceled.value: {OrderStatus.paid.value},
+    OrderStatus.refunded.value: set(),
+}
+
+# Stripe-hendelser som flytter en ordre, og Vipps transactionStatus -> status
+STRIPE_EVENT_STATUS = {
+    "checkout.session.completed": OrderStatus.paid,
+    "checkout.session.expired": OrderStatus.canceled,
+}
+VIPPS_STATUS = {
+    "AUTHORIZED": OrderStatus.paid,
+    "SETTLED": OrderStatus.paid,
+    "REJECTED": OrderStatus.canceled,
+}
+
+
+def stripe_payment_event(event: dict) -> PaymentEvent:
+    """Normaliser en Stripe-hendelse; typer vi ikke bruker får status None."""
+    status = STRIPE_EVENT_STATUS.get(event["type"])
+    order_id = None
+    if status is not None:
+        order_id = event["data"]["object"]["metadata"].get("order_id")
+    return PaymentEvent(
+        provider="stripe",
+        event_id=event["id"],
+        event_type=event["type"],
+        order_id=int(order_id) if order_id else None,
+        status=status if order_id else None,
+    )
+
+
+def vipps_payment_event(order_id: int, callback: VippsCallback) -> Optional[PaymentEvent]:
+    """Normaliser en Vipps-callback; None for statuser vi ikke bruker."""
+    transaction_status = callback.transactionStatus.upper()
+    status = VIPPS_STATUS.get(transaction_status)
+    if status is None:
+        return None
+    return PaymentEvent(
+        provider="vipps",
+        event_id=callback.transactionId or f"{order_id}:{transaction_status}",
+        event_type=transaction_status,
+        order_id=order_id,
+        status=status,
+    )
+
+
+def vipps_payload(order_id: int, callback: VippsCallback) -> str:
+    """Rå Vipps-callback slik den lagres i webhook_inbox (med ordre-id fra URL-en)."""
+    return json.dumps({"order_id": order_id, **callback.model_dump()})
+
+
+def parse_payment_event(provider: str, payload: str) -> PaymentEvent:
+    """Bygg PaymentEvent fra en lagret rå leveranse."""
+    data = json.loads(payload)
+    if provider == "stripe":
+        return stripe_payment_event(data)
+    if provider == "vipps":
+        event = vipps_payment_event(data.pop("order_id"), VippsCallback(**data))
+        if event is not None:
+            return event
+    raise ValueError(f"Unsupported {provider} payload")
+
+
+def can_transition(old: Optional[str], new: str) -> bool:
+    return new in ORDER_TRANSITIONS.get(old or OrderStatus.pending.value, set())
+
+
+def _seen_events(db: Session, keys: Sequence[Tuple[str, str]]) -> set:
+    """(provider, event_id) for nøklene som allerede står i ledgeren."""
+    E = models.WebhookEvent
+    by_provider: Dict[str, List[str]] = {}
+    for provider, event_id in keys:
+        by_provider.setdefault(provider, []).append(event_id)
+    seen = set()
+    for provider, event_ids in by_provider.items():
+        rows = db.scalars(
+            select(E.event_id).where(E.provider == provider, E.event_id.in_(event_ids))
+        ).all()
+        seen.update((provider, event_id) for event_id in rows)
+    return seen
+
+
+def process_payment_events(db: Session, events: Sequence[PaymentEvent]) -> List[WebhookResult]:
+    """
+    Bruk en batch webhook-hendelser på ordrene. Returnerer ett resultat per
+    hendelse i samme rekkefølge. Hendelser for ordre som ikke finnes lagres
+    ikke, så en senere leveranse vurderes på nytt.
+    """
+    results: List[Optional[WebhookResult]] = [None] * len(events)
+    fresh: Dict[Tuple[str, str], int] = {}
+    for i, event in enumerate(events):
+        key = (event.provider, event.event_id)
+        if key in fresh:
+            results[i] = WebhookResult.duplicate
+        else:
+            fresh[key] = i
+    if not fresh:
+        return results
+
+    for key in _seen_events(db, list(fresh)):
+        results[fresh.pop(key)] = WebhookResult.duplicate
+    if not fresh:
+        return results
+
+    order_ids = {
+        events[i].order_id for i in fresh.values()
+        if events[i].status is not None and events[i].order_id is not None
+    }
+    orders: Dict[int, models.Order] = {}
+    if order_ids:
+        orders = {
+            order.id: order
+            for order in db.scalars(
+                select(models.Order)
+                .options(selectinload(models.Order.items))
+                .where(models.Order.id.in_(order_ids))
+                .order_by(models.Order.id)
+                .with_for_update()
+                .execution_options(populate_existing=True)
+            ).all()
+        }
+
+    ledger = []
+    applied = False
+    for i in sorted(fresh.values()):
+        event = events[i]
+        order = orders.get(event.order_id) if event.order_id is not None else None
+        if event.status is None:
+            result = WebhookResult.ignored
+        elif order is None:
+            results[i] = WebhookResult.not_found
+            continue
+        elif not can_transition(order.status, event.status.value):
+            result = WebhookResult.ignored
+        else:
+            old_status = order.status
+            order.status = event.status.value
+            if apply_status_change(db, order, old_status):
+                record_status_change(db, order, old_status)
+                result = WebhookResult.applied
+                applied = True
+            else:
+                # Varene er solgt til andre: ordren forblir kansellert, flagget for refusjon
+                result = WebhookResult.needs_refund
+        results[i] = result
+        ledger.append({
+            "provider": event.provider,
+            "event_id": event.event_id,
+            "event_type": event.event_type,
+            "order_id": event.order_id,
+            "status": event.status.value if event.status is not None else None,
+            "result": result.value,
+        })
+
+    try:
+        if ledger:
+            db.execute(insert(models.WebhookEvent), ledger)
+        db.commit()
+    except IntegrityError:
+        # En parallell leveranse av samme hendelse kom først: ta dem én og én
+        db.rollback()
+        if len(events) == 1:
+            return [WebhookResult.duplicate]
+        for i in fresh.values():
+            results[i] = process_payment_events(db, [events[i]])[0]
+        return results
+    if applied:
+        product_cache.clear()
+    return results
@@ -1,13 +1,16 @@
 # app/database.py
 
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 from dotenv import load_dotenv
 
-# Last inn miljøvariabler fra .env
+# Last inn miljøvariabler fra .env før pool-konfigurasjonen leses
 load_dotenv()
 
+from .dbpool import engine_kwargs, configure_engine  # noqa: E402
+from . import dbpool  # noqa: E402
+
 # Les konfigurasjon for MySQL fra miljøvariabler
 MYSQL_USER = os.getenv("MYSQL_USER", "root")
 MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD", "")
@@ -22,14 +25,45 @@ DATABASE_URL = (
 )
 
 # Opprett SQLAlchemy-engine
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,  # sørger for å teste forbindelsen før bruk
-)
+# Pool-størrelse, timeout, recycle og pre-ping styres av DB_POOL_* (se app/dbpool.py)
+engine = create_engine(DATABASE_URL, **engine_kwargs())
+configure_engine(engine)
 
 # Lag en SessionLocal for dependencies
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# ---------------------------------------------------------------
+# Lese-replika (valgfri, MYSQL_REPLICA_HOST)
+# ---------------------------------------------------------------
+# Tunge lesespørringer (statistikk, katalog, CRM-notater) går mot replikaen
+# slik at de ikke konkurrerer med checkout-transaksjoner på primæren. Uten
+# MYSQL_REPLICA_HOST peker get_read_db på primæren.
+MYSQL_REPLICA_HOST = os.getenv("MYSQL_REPLICA_HOST")
+MYSQL_REPLICA_PORT = os.getenv("MYSQL_REPLICA_PORT", MYSQL_PORT)
+MYSQL_REPLICA_USER = os.getenv("MYSQL_REPLICA_USER", MYSQL_USER)
+MYSQL_REPLICA_PASSWORD = os.getenv("MYSQL_REPLICA_PASSWORD", MYSQL_PASSWORD)
+
+if MYSQL_REPLICA_HOST:
+    REPLICA_DATABASE_URL = (
+        f"mysql+pymysql://{MYSQL_REPLICA_USER}:{MYSQL_REPLICA_PASSWORD}@"
+        f"{MYSQL_REPLICA_HOST}:{MYSQL_REPLICA_PORT}/{MYSQL_DATABASE}"
+    )
+    replica_engine = create_engine(REPLICA_DATABASE_URL, **engine_kwargs())
+    configure_engine(replica_engine)
+
+    @event.listens_for(replica_engine, "connect")
+    def _read_only_session(dbapi_connection, connection_record):
+        # Et skriv mot replikaen er en bug; la MySQL avvise det
+        if replica_engine.dialect.name == "mysql":
+            cursor = dbapi_connection.cursor()
+            cursor.execute("SET SESSION TRANSACTION READ ONLY")
+            cursor.close()
+
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+else:
+    replica_engine = engine
+    ReadSessionLocal = SessionLocal
+
 # Base for ORM-modeller
 Base = declarative_base()
 
@@ -41,4 +75,65 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def get_read_db():
+    """
+    Avhengighet for en skrivebeskyttet session mot lese-replikaen.
+    Kun for ruter som tåler replikeringsforsinkelse; skriv og
+    les-etter-skriv går via get_db.
+    """
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def is_replica(db) -> bool:
+    """
+    True når sesjonen leser fra lese-replikaen. Slike lesninger kan være
+    eldre enn et skriv som allerede har tømt cachene, så de caches ikke.
+    """
+    return replica_engine is not engine and db.get_bind() is replica_engine
+
+# ---------------------------------------------------------------
+# Valgfri async-motor (DB_ASYNC=1)
+# ---------------------------------------------------------------
+# Når den er slått på, går de mest brukte lesestiene (produkter, ordrer og
+# brukeroppslag ved autentisering) via en AsyncSession i stedet for å ta opp
+# en plass i Starlettes trådpool. Krever en async-driver: aiomysql eller
+# asyncmy for MySQL (DB_ASYNC_DRIVER), aiosqlite for tester.
+DB_ASYNC = os.getenv("DB_ASYNC", "0").lower() in ("1", "true", "yes")
+DB_ASYNC_DRIVER = os.getenv("DB_ASYNC_DRIVER", "aiomysql")
+ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL",
+    f"mysql+{DB_ASYNC_DRIVER}://{MYSQL_USER}:{MYSQL_PASSWORD}@"
+    f"{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}"
+)
+
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        pool_size=dbpool.POOL_SIZE,
+        max_overflow=dbpool.MAX_OVERFLOW,
+        pool_timeout=dbpool.POOL_TIMEOUT,
+        pool_recycle=dbpool.POOL_RECYCLE,
+        pool_pre_ping=dbpool.PRE_PING != "never",
+    )
+    # expire_on_commit=False: objekter serialiseres etter at sesjonen er ferdig
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+async def get_async_db():
+    """
+    Avhengighet for en AsyncSession per forespørsel. Gir None når DB_ASYNC er
+    av, slik at rutene faller tilbake til den synkrone sesjonen.
+    """
+    if AsyncSessionLocal is None:
+        yield None
+        return
+    async with AsyncSessionLocal() as session:
+        yield session
\ No newline at end of file
@@ -0,0 +1,203 @@
+# app/dbpool.py
+
+"""
+Connection pool configuration and metrics for the SQLAlchemy engine.
+
+Pool sizing comes from the environment (DB_POOL_*). ``InstrumentedQueuePool``
+times every checkout (wait for a free connection, including creating an
+overflow connection) and every new DBAPI connection, so the admin endpoint can
+tell pool exhaustion apart from slow queries.
+
+Pre-ping strategies (DB_POOL_PRE_PING):
+- ``always``: SQLAlchemy's pool_pre_ping, one round-trip on every checkout
+- ``idle``: ping only connections that have been idle longer than
+  DB_POOL_PING_IDLE seconds (default)
+- ``never``: rely on DB_POOL_RECYCLE and disconnect handling only
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Optional
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# MySQL lukker ledige forbindelser etter wait_timeout (8 t som standard)
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+PRE_PING = os.getenv("DB_POOL_PRE_PING", "idle").lower()
+PING_IDLE = float(os.getenv("DB_POOL_PING_IDLE", "30"))
+
+if PRE_PING not in ("always", "idle", "never"):
+    raise ValueError("DB_POOL_PRE_PING must be one of: always, idle, never")
+
+# Upper bounds (milliseconds) for the wait/connect histograms
+BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (milliseconds)."""
+
+    def __init__(self, bounds=BUCKETS_MS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float) -> None:
+        self.counts[bisect_left(self.bounds, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def snapshot(self) -> Dict:
+        labels = [f"<={b}" for b in self.bounds] + [f">{self.bounds[-1]}"]
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class PoolMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.checkout_wait = Histogram()
+            self.connect = Histogram()
+            self.timeouts = 0
+            self.pings = 0
+            self.invalidated = 0
+
+    def observe_wait(self, ms: float) -> None:
+        with self._lock:
+            self.checkout_wait.observe(ms)
+
+    def observe_connect(self, ms: float) -> None:
+        with self._lock:
+            self.connect.observe(ms)
+
+    def incr(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "checkout_wait": self.checkout_wait.snapshot(),
+                "connect": self.connect.snapshot(),
+                "timeouts": self.timeouts,
+                "pings": self.pings,
+                "invalidated": self.invalidated,
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records checkout wait and connect latency."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def recreate(self):
+        # Recreated pools (engine.dispose(), forking) keep the same counters
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.incr("timeouts")
+            raise
+        finally:
+            self.metrics.observe_wait((time.perf_counter() - start) * 1000)
+
+    def _create_connection(self):
+        start = time.perf_counter()
+        try:
+            return super()._create_connection()
+        finally:
+            self.metrics.observe_connect((time.perf_counter() - start) * 1000)
+
+
+def engine_kwargs() -> Dict:
+    """Keyword arguments for create_engine() from the DB_POOL_* settings."""
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": POOL_SIZE,
+        "max_overflow": MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT,
+        "pool_recycle": POOL_RECYCLE,
+        "pool_pre_ping": PRE_PING == "always",
+    }
+
+
+def install_idle_ping(engine, idle_seconds: float = PING_IDLE) -> None:
+    """
+    Ping a connection on checkout only if it has been idle for idle_seconds.
+
+    A failed ping raises DisconnectionError, which makes the pool discard the
+    connection and retry the checkout with a fresh one.
+    """
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(dbapi_connection, record):
+        record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_connection, record, proxy):
+        last = record.info.get("checked_in_at")
+        if last is None or time.monotonic() - last < idle_seconds:
+            return
+        metrics = getattr(engine.pool, "metrics", None)
+        if metrics:
+            metrics.incr("pings")
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("SELECT 1")
+        except Exception as e:
+            if metrics:
+                metrics.incr("invalidated")
+            raise exc.DisconnectionError() from e
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
+
+def configure_engine(engine) -> None:
+    if PRE_PING == "idle":
+        install_idle_ping(engine)
+
+
+def pool_stats(engine) -> Dict:
+    """Current pool occupancy plus the recorded latency metrics."""
+    pool = engine.pool
+    stats: Dict = {"pool": type(pool).__name__, "pre_ping": PRE_PING}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "timeout": pool.timeout(),
+            "recycle": pool._recycle,
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+        })
+    metrics: Optional[PoolMetrics] = getattr(pool, "metrics", None)
+    if metrics is not None:
+        stats.update(metrics.snapshot())
+    return stats
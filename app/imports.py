@@ -0,0 +1,115 @@
+# app/imports.py
+
+"""
+Helpers for the CSV/NDJSON bulk import endpoints.
+
+Uploads are read record by record and validated against a pydantic schema;
+valid rows are handed to a crud ``import_*_chunk`` function in chunks of
+IMPORT_CHUNK_SIZE (one transaction and a few multi-row statements each), so
+memory is bounded by the chunk size, not the file size. Rows that fail to
+parse or validate are reported with their 0-based record number.
+"""
+
+import csv
+import json
+from enum import Enum
+from typing import Callable, Iterator, List, Optional, Tuple, Type
+
+from fastapi import HTTPException, UploadFile
+from pydantic import BaseModel, ValidationError
+
+from .crud.bulk import import_in_chunks
+from .schemas import ImportResult, ImportRowError
+
+
+class ImportFormat(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+
+
+def detect_format(upload: UploadFile, format: Optional[ImportFormat]) -> ImportFormat:
+    if format is not None:
+        return format
+    name = (upload.filename or "").lower()
+    content_type = (upload.content_type or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or "ndjson" in content_type or "jsonl" in content_type:
+        return ImportFormat.ndjson
+    if name.endswith(".csv") or "csv" in content_type:
+        return ImportFormat.csv
+    raise HTTPException(status_code=400, detail="Unknown file format; pass ?format=csv or ?format=ndjson")
+
+
+def _decoded_lines(raw: Iterator[bytes]) -> Iterator[str]:
+    """Decode the upload one line at a time (BOM allowed on the first line)."""
+    for number, line in enumerate(raw):
+        yield line.decode("utf-8-sig" if number == 0 else "utf-8")
+
+
+def iter_records(upload: UploadFile, format: ImportFormat, errors: List[ImportRowError]) -> Iterator[Tuple[int, dict]]:
+    """
+    Yield (record number, raw dict) pairs from the uploaded file.
+
+    Lines are decoded one by one, so a decoding error is tied to the record
+    that contains it. In NDJSON that record is reported and the rest of the
+    file is still read. In CSV reading stops there: an error in the header
+    or first record is raised (nothing has been imported yet); later on,
+    earlier chunks may already be committed, so the error is reported on
+    that record and the records before it are still imported.
+    """
+    row = 0
+    if format == ImportFormat.ndjson:
+        for number, raw in enumerate(upload.file):
+            if not raw.strip():
+                continue
+            try:
+                record = json.loads(raw.decode("utf-8-sig" if number == 0 else "utf-8"))
+                if not isinstance(record, dict):
+                    raise ValueError("expected a JSON object")
+            except UnicodeDecodeError:
+                errors.append(ImportRowError(row=row, error="Record is not valid UTF-8"))
+            except ValueError as e:
+                errors.append(ImportRowError(row=row, error=f"Invalid JSON: {e}"))
+            else:
+                yield row, record
+            row += 1
+        return
+    try:
+        for record in csv.DictReader(_decoded_lines(upload.file)):
+            # Empty CSV cells mean "not set"
+            yield row, {k: v for k, v in record.items() if k and v not in ("", None)}
+            row += 1
+    except (UnicodeDecodeError, csv.Error) as e:
+        if row == 0:
+            raise
+        reason = "File is not valid UTF-8" if isinstance(e, UnicodeDecodeError) else f"Invalid CSV: {e}"
+        errors.append(ImportRowError(row=row, error=f"{reason}; this and later records were not imported"))
+
+
+def validated(records: Iterator[Tuple[int, dict]], schema: Type[BaseModel], errors: List[ImportRowError]):
+    """Yield (record number, schema instance); invalid records go to errors."""
+    for row, record in records:
+        try:
+            yield row, schema.model_validate(record)
+        except ValidationError as e:
+            detail = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            errors.append(ImportRowError(row=row, error=detail))
+
+
+def import_upload(
+    upload: UploadFile,
+    format: Optional[ImportFormat],
+    schema: Type[BaseModel],
+    import_chunk: Callable[[list], ImportResult],
+) -> ImportResult:
+    """Parse, validate and import an uploaded file chunk by chunk."""
+    errors: List[ImportRowError] = []
+    rows = validated(iter_records(upload, detect_format(upload, format), errors), schema, errors)
+    try:
+        result = import_in_chunks(rows, import_chunk)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="File must be UTF-8 encoded")
+    except csv.Error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid CSV: {e}")
+    # errors is filled while the generator is consumed
+    result.errors = sorted(result.errors + errors, key=lambda e: e.row)
+    return result
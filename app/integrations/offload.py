@@ -0,0 +1,86 @@
+# app/integrations/offload.py
+
+"""
+Blocking payment-provider calls from async routes.
+
+Each provider gets its own ProviderPool: calls run in anyio worker threads
+bounded by a per-provider CapacityLimiter, not in Starlette's shared
+threadpool. A slow provider can therefore tie up at most its own
+max_concurrency threads, and catalog/order requests keep their slots. When
+max_waiting callers are already queued for a provider, further calls fail
+fast with PaymentProviderBusy (HTTP 503) instead of piling up.
+"""
+
+import threading
+import time
+from functools import partial
+from typing import Dict
+
+import anyio
+import anyio.to_thread
+
+
+class PaymentProviderBusy(Exception):
+    """Too many calls are queued for a payment provider."""
+
+    def __init__(self, provider: str):
+        super().__init__(f"{provider} is busy")
+        self.provider = provider
+
+
+class ProviderPool:
+    def __init__(self, name: str, max_concurrency: int, max_waiting: int):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self.limiter = anyio.CapacityLimiter(max_concurrency)
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.max_waiting_seen = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) in a worker thread within this provider's limit."""
+        waiting = self.limiter.statistics().tasks_waiting
+        if self.limiter.available_tokens == 0 and waiting >= self.max_waiting:
+            with self._lock:
+                self.rejected += 1
+            raise PaymentProviderBusy(self.name)
+        with self._lock:
+            self.max_waiting_seen = max(self.max_waiting_seen, waiting + 1)
+        started = time.perf_counter()
+        ok = False
+        try:
+            result = await anyio.to_thread.run_sync(partial(fn, *args, **kwargs), limiter=self.limiter)
+            ok = True
+            return result
+        finally:
+            # Latency covers every call; completed and failed are disjoint
+            elapsed = (time.perf_counter() - started) * 1000
+            with self._lock:
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self.total_ms += elapsed
+                self.max_ms = max(self.max_ms, elapsed)
+
+    def stats(self) -> Dict:
+        limiter = self.limiter.statistics()
+        with self._lock:
+            calls = self.completed + self.failed
+            return {
+                "max_concurrency": self.max_concurrency,
+                "max_waiting": self.max_waiting,
+                "in_flight": limiter.borrowed_tokens,
+                "waiting": limiter.tasks_waiting,
+                "max_waiting_seen": self.max_waiting_seen,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "avg_ms": round(self.total_ms / calls, 3) if calls else 0.0,
+                "max_ms": round(self.max_ms, 3),
+            }
@@ -12,8 +12,35 @@ import os
 import stripe
 from typing import Dict, Any
 
+from .offload import ProviderPool
+
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SK")
 STRIPE_PUBLISHABLE_KEY = os.getenv("STRIPE_PK")
+# Signing secret for /payment/stripe/webhook; unset skips signature checks
+STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
+# Request timeout in seconds (the library default is 80) and retries on network errors
+STRIPE_TIMEOUT = float(os.getenv("STRIPE_TIMEOUT", "10"))
+STRIPE_MAX_NETWORK_RETRIES = int(os.getenv("STRIPE_MAX_NETWORK_RETRIES", "1"))
+# Concurrent Stripe calls from async routes / callers allowed to queue for one
+STRIPE_MAX_CONCURRENCY = int(os.getenv("STRIPE_MAX_CONCURRENCY", "10"))
+STRIPE_MAX_WAITING = int(os.getenv("STRIPE_MAX_WAITING", "50"))
+
+# One kept-alive HTTP session with explicit timeouts for all Stripe calls
+stripe.default_http_client = stripe.RequestsClient(timeout=STRIPE_TIMEOUT)
+stripe.max_network_retries = STRIPE_MAX_NETWORK_RETRIES
+
+stripe_pool = ProviderPool("stripe", STRIPE_MAX_CONCURRENCY, STRIPE_MAX_WAITING)
+
+
+def verify_webhook_signature(payload: bytes, sig_header: str) -> None:
+    """
+    Check the Stripe-Signature header against STRIPE_WEBHOOK_SECRET.
+    Raises stripe.SignatureVerificationError if it does not match.
+    """
+    if STRIPE_WEBHOOK_SECRET:
+        stripe.WebhookSignature.verify_header(
+            payload.decode("utf-8"), sig_header or "", STRIPE_WEBHOOK_SECRET
+        )
 
 class StripeClient:
     def __init__(self):
@@ -92,6 +119,10 @@ class StripeClient:
         except Exception as e:
             raise Exception(f"Failed to create Stripe checkout session: {str(e)}")
 
+    async def create_payment_intent_async(self, **kwargs) -> Dict:
+        """create_payment_intent in stripe_pool, for async routes."""
+        return await stripe_pool.run(self.create_payment_intent, **kwargs)
+
     def get_payment_intent_status(self, payment_intent_id: str) -> Dict:
         """
         Get the status of a Stripe PaymentIntent.
@@ -111,6 +142,9 @@ class StripeClient:
         except Exception as e:
             raise Exception(f"Failed to get Stripe payment status: {str(e)}")
 
+    async def get_payment_intent_status_async(self, payment_intent_id: str) -> Dict:
+        return await stripe_pool.run(self.get_payment_intent_status, payment_intent_id)
+
     def confirm_payment_intent(self, payment_intent_id: str) -> Dict:
         """
         Confirm a Stripe PaymentIntent (usually done client-side, but useful for testing).
@@ -8,9 +8,18 @@ Husk å fylle ut miljøvariabler i .env og oppdatere URL-er om du går til produ
 from dotenv import load_dotenv
 load_dotenv()
 
+import logging
 import os
+import threading
+import time
 import requests
-from typing import Dict, Any
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any, Optional
+
+from ..logconfig import log_event, redact
+from .offload import ProviderPool
+
+logger = logging.getLogger(__name__)
 
 VIPPS_CLIENT_ID = os.getenv("VIPPS_CLIENT_ID")
 VIPPS_CLIENT_SECRET = os.getenv("VIPPS_CLIENT_SECRET")
@@ -24,36 +33,60 @@ VIPPS_SYSTEM_NAME = os.getenv("VIPPS_SYSTEM_NAME", "mrfixweb")
 VIPPS_SYSTEM_VERSION = os.getenv("VIPPS_SYSTEM_VERSION", "1.0.0")
 VIPPS_SYSTEM_PLUGIN_NAME = os.getenv("VIPPS_SYSTEM_PLUGIN_NAME", "mrfixweb-plugin")
 VIPPS_SYSTEM_PLUGIN_VERSION = os.getenv("VIPPS_SYSTEM_PLUGIN_VERSION", "1.0.0")
+# (connect, read) timeouts in seconds for every call to Vipps
+VIPPS_TIMEOUT = (
+    float(os.getenv("VIPPS_CONNECT_TIMEOUT", "3.05")),
+    float(os.getenv("VIPPS_READ_TIMEOUT", "10")),
+)
+# Kept-alive connections per host in the shared session
+VIPPS_POOL_SIZE = int(os.getenv("VIPPS_POOL_SIZE", "10"))
+# Refresh the access token this many seconds before it expires
+VIPPS_TOKEN_REFRESH_MARGIN = float(os.getenv("VIPPS_TOKEN_REFRESH_MARGIN", "300"))
+# Concurrent Vipps calls from async routes / callers allowed to queue for one
+VIPPS_MAX_CONCURRENCY = int(os.getenv("VIPPS_MAX_CONCURRENCY", "10"))
+VIPPS_MAX_WAITING = int(os.getenv("VIPPS_MAX_WAITING", "50"))
+
+vipps_pool = ProviderPool("vipps", VIPPS_MAX_CONCURRENCY, VIPPS_MAX_WAITING)
 
 class VippsClient:
-    def __init__(self, sandbox: bool = True):
+    def __init__(self, sandbox: bool = True, session: Optional[requests.Session] = None):
         """
         Initialiser klient med sandbox eller produksjons-URL.
+        Bruk get_vipps_client() for den delte instansen; tokenet og
+        HTTP-forbindelsene gjenbrukes da mellom forespørsler.
         """
         # Separate base URLs for auth and payment
         if sandbox:
             self.auth_base_url = VIPPS_SANDBOX_URL
             self.payment_base_url = VIPPS_SANDBOX_PAYMENT_URL
-            print(f"{VIPPS_CLIENT_SECRET} VippsClient initialized in sandbox mode")
         else:
             self.auth_base_url = VIPPS_PRODUCTION_URL
             self.payment_base_url = VIPPS_PRODUCTION_PAYMENT_URL
-        
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=VIPPS_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+        self.timeout = VIPPS_TIMEOUT
+
         self.access_token = None
+        self.token_expires_at = 0.0  # time.monotonic()
+        self._token_lock = threading.Lock()
+        self.token_fetches = 0
         # defer authentication until needed
 
     def _authenticate(self):
         """
         Autentiser mot Vipps for å hente tilgangstoken.
         """
-        print("Starting authentication with Vipps...")
         # Ensure credentials configured
         if not VIPPS_CLIENT_ID or not VIPPS_CLIENT_SECRET or not VIPPS_APIM_SUBSCRIPTION_KEY:
             raise Exception("Missing Vipps configuration in environment")
         
         auth_url = f"{self.auth_base_url}/accesstoken/get"
-        print(f"Auth URL: {auth_url}")
-        
+
         # Use Vipps specific header authentication method
         headers = {
             "Content-Type": "application/json",
@@ -65,20 +98,78 @@ class VippsClient:
         
         # Empty data as per Vipps documentation
         data = ""
-        print(f"Auth data: {data}")
-        print(f"Auth headers: {headers}")
-        
-        resp = requests.post(auth_url, data=data, headers=headers)
-        print(f"Auth response status: {resp.status_code}")
-        print(f"Auth response body: {resp.text}")
-        
+        requested_at = time.monotonic()
+        resp = self.session.post(auth_url, data=data, headers=headers, timeout=self.timeout)
+        self.token_fetches += 1
+        duration_ms = round((time.monotonic() - requested_at) * 1000, 1)
+
         if resp.status_code == 200:
             response_data = resp.json()
             # Token key may be 'accessToken' or 'access_token'
             self.access_token = response_data.get("accessToken") or response_data.get("access_token")
-            print(f"Access token obtained: {self.access_token}")
+            # expires_in is sent as a string of seconds
+            expires_in = float(response_data.get("expires_in") or response_data.get("expiresIn") or 3600)
+            self.token_expires_at = requested_at + expires_in
+            log_event(logger, logging.INFO, "vipps.token_fetched", expires_in=expires_in, duration_ms=duration_ms)
         else:
-            raise Exception(f"Failed to authenticate with Vipps: {resp.text}")
+            log_event(
+                logger, logging.WARNING, "vipps.token_failed",
+                status=resp.status_code, body=resp.text, duration_ms=duration_ms,
+            )
+            raise Exception(f"Failed to authenticate with Vipps: {redact(resp.text)}")
+
+    def _get_token(self) -> str:
+        """
+        Gyldig tilgangstoken, hentet på nytt ved behov.
+
+        Bare én tråd henter token om gangen; de andre venter på den og bruker
+        resultatet (ingen stampede mot /accesstoken/get). Innenfor
+        VIPPS_TOKEN_REFRESH_MARGIN av utløp fornyer én tråd tokenet mens de
+        andre fortsetter med det gamle, som fortsatt er gyldig.
+        """
+        now = time.monotonic()
+        if self.access_token and now < self.token_expires_at - VIPPS_TOKEN_REFRESH_MARGIN:
+            return self.access_token
+        if self.access_token and now < self.token_expires_at:
+            if self._token_lock.acquire(blocking=False):
+                try:
+                    if time.monotonic() >= self.token_expires_at - VIPPS_TOKEN_REFRESH_MARGIN:
+                        self._authenticate()
+                except Exception:
+                    # Keep using the current token until it expires
+                    log_event(logger, logging.WARNING, "vipps.token_refresh_failed", exc_info=True)
+                finally:
+                    self._token_lock.release()
+            return self.access_token
+        with self._token_lock:
+            if not self.access_token or time.monotonic() >= self.token_expires_at:
+                self._authenticate()
+            return self.access_token
+
+    def _invalidate_token(self, token: str) -> None:
+        """Forkast et token Vipps avviste (401), med mindre det allerede er byttet."""
+        with self._token_lock:
+            if self.access_token == token:
+                self.access_token = None
+                self.token_expires_at = 0.0
+
+    def _request(self, method: str, url: str, headers: Dict[str, str], **kwargs) -> requests.Response:
+        """Autentisert kall; et 401 gir ett nytt forsøk med nytt token."""
+        for attempt in range(2):
+            token = self._get_token()
+            resp = self.session.request(
+                method, url,
+                headers={**headers, "Authorization": f"Bearer {token}"},
+                timeout=self.timeout,
+                **kwargs,
+            )
+            if resp.status_code != 401 or attempt:
+                return resp
+            self._invalidate_token(token)
+        return resp
+
+    def close(self) -> None:
+        self.session.close()
 
     def create_payment(
         self,
@@ -94,25 +185,14 @@ class VippsClient:
         Opprett en betalingsforespørsel i Vipps.
         Pass in `extras` dict to merge any additional fields (e.g., industryData, profile, metadata, expiresAt, shipping options, qrFormat, minimumUserAge).
         """
-        print("Starting payment creation...")
-        print(f"Order ID: {order_id}, Amount: {amount}, Callback URL: {callback_url}")
-        print(f"Shipping: {shipping}, Receipt: {receipt}, Extras: {extras}")
-        # Ensure authenticated
-        if not self.access_token:
-            print("No access token found, authenticating...")
-            self._authenticate()
-
         # Default idempotency key
         if not idempotency_key:
             import uuid
             idempotency_key = str(uuid.uuid4())
-        print(f"Idempotency Key: {idempotency_key}")
 
         # Use ePayment v1 endpoint on API host (apitest.vipps.no)
         url = f"{self.auth_base_url}/epayment/v1/payments"
-        print(f"Payment URL: {url}")
         headers = {
-            "Authorization": f"Bearer {self.access_token}",
             "Content-Type": "application/json",
             "Ocp-Apim-Subscription-Key": VIPPS_APIM_SUBSCRIPTION_KEY,
             "Merchant-Serial-Number": MERCHANT_SERIAL_NUMBER,
@@ -122,7 +202,7 @@ class VippsClient:
             "Vipps-System-Plugin-Version": VIPPS_SYSTEM_PLUGIN_VERSION,
             "Idempotency-Key": idempotency_key
         }
-        print(f"Payment headers: {headers}")        # Build request body according to ePayment API
+        # Build request body according to ePayment API
         # Ensure reference is 8-64 characters and alphanumeric with dashes
         reference = f"mrfixweb-order-{order_id}"
         if len(reference) < 8:
@@ -146,7 +226,6 @@ class VippsClient:
             "returnUrl": callback_url,
             "paymentDescription": f"Payment for order {order_id}"
         }
-        print(f"Payment body before extras: {body}")
         # Include receipt if provided
         if receipt:
             body["receipt"] = receipt
@@ -154,29 +233,67 @@ class VippsClient:
         if extras:
             for key, value in extras.items():
                 body[key] = value
-        print(f"Final payment body: {body}")
 
-        resp = requests.post(url, json=body, headers=headers)
-        print(f"Payment response status: {resp.status_code}")
-        print(f"Payment response body: {resp.text}")
+        started = time.monotonic()
+        resp = self._request("POST", url, headers, json=body)
+        duration_ms = round((time.monotonic() - started) * 1000, 1)
         if resp.status_code in (200, 201):
+            log_event(
+                logger, logging.INFO, "vipps.payment_created", sample=True,
+                order_id=order_id, amount=amount, status=resp.status_code, duration_ms=duration_ms,
+            )
             return resp.json()
         else:
-            raise Exception(f"Failed to create Vipps payment: {resp.text}")
+            log_event(
+                logger, logging.WARNING, "vipps.payment_failed",
+                order_id=order_id, amount=amount, status=resp.status_code,
+                body=resp.text, duration_ms=duration_ms,
+            )
+            raise Exception(f"Failed to create Vipps payment: {redact(resp.text)}")
 
     def get_payment_status(self, payment_id: str) -> Dict:
         """
         Hent betalingsstatus for payment_id.
         """
-        if not self.access_token:
-            self._authenticate()
         url = f"{self.payment_base_url}/ecomm/v2/payments/{payment_id}"
         headers = {
-            "Authorization": f"Bearer {self.access_token}",
             "Ocp-Apim-Subscription-Key": VIPPS_APIM_SUBSCRIPTION_KEY
         }
-        resp = requests.get(url, headers=headers)
+        resp = self._request("GET", url, headers)
         if resp.status_code == 200:
             return resp.json()
         else:
-            raise Exception(f"Failed to get Vipps payment status: {resp.text}")
+            log_event(
+                logger, logging.WARNING, "vipps.status_failed",
+                payment_id=payment_id, status=resp.status_code, body=resp.text,
+            )
+            raise Exception(f"Failed to get Vipps payment status: {redact(resp.text)}")
+
+    # Async API for async routes: the blocking calls run in vipps_pool
+    async def create_payment_async(self, **kwargs) -> Dict:
+        return await vipps_pool.run(self.create_payment, **kwargs)
+
+    async def get_payment_status_async(self, payment_id: str) -> Dict:
+        return await vipps_pool.run(self.get_payment_status, payment_id)
+
+
+_clients: Dict[bool, VippsClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_vipps_client(sandbox: bool = True) -> VippsClient:
+    """Den delte klienten for prosessen (ett token og én forbindelsespool per modus)."""
+    client = _clients.get(sandbox)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(sandbox)
+            if client is None:
+                client = _clients[sandbox] = VippsClient(sandbox=sandbox)
+    return client
+
+
+def close_vipps_clients() -> None:
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
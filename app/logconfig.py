@@ -0,0 +1,162 @@
+# app/logconfig.py
+
+"""
+Strukturert logging for API-et og integrasjonene.
+
+- configure_logging() legger én QueueHandler på rot-loggeren; en QueueListener
+  i egen tråd formaterer og skriver til stderr. Forespørselstrådene gjør
+  bare en put() på køen, aldri blokkerende I/O.
+- log_event() logger en hendelse med navngitte felt. Feltene redigeres
+  (REDACT_KEYS) før de havner i recorden, og suksess-hendelser (sample=True)
+  slippes bare gjennom med sannsynlighet LOG_SUCCESS_SAMPLE_RATE.
+- LOG_FORMAT=json gir én JSON-linje per hendelse, text gir lesbare linjer.
+
+Standard er LOG_LEVEL=INFO og INTEGRATION_LOG_LEVEL=WARNING: i drift logges
+da ingenting per forespørsel fra betalingsintegrasjonene, bare feil.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+INTEGRATION_LOG_LEVEL = os.getenv("INTEGRATION_LOG_LEVEL", "WARNING").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_SUCCESS_SAMPLE_RATE = float(os.getenv("LOG_SUCCESS_SAMPLE_RATE", "0.01"))
+
+REDACTED = "***"
+# Header/body/field names whose values never reach a log line (case-insensitive)
+REDACT_KEYS = {
+    "authorization",
+    "client_id",
+    "client_secret",
+    "ocp-apim-subscription-key",
+    "access_token",
+    "accesstoken",
+    "token",
+    "password",
+    "secret",
+    "stripe-signature",
+    "api_key",
+}
+_SECRET_VALUE_RE = re.compile(
+    r'("(?:%s)"\s*:\s*)"[^"]*"' % "|".join(re.escape(k) for k in REDACT_KEYS),
+    re.IGNORECASE,
+)
+_BEARER_RE = re.compile(r"(Bearer\s+)[A-Za-z0-9._~+/=-]+", re.IGNORECASE)
+MAX_TEXT = 500
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def redact(value: Any) -> Any:
+    """Kopi av value med hemmelige nøkler og bearer-tokens maskert."""
+    if isinstance(value, dict):
+        return {
+            k: REDACTED if str(k).lower() in REDACT_KEYS else redact(v)
+            for k, v in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    if isinstance(value, str):
+        text = redact_text(value)
+        return text if len(text) <= MAX_TEXT else text[:MAX_TEXT] + "..."
+    return value
+
+
+def redact_text(text: str) -> str:
+    text = _BEARER_RE.sub(r"\1" + REDACTED, text)
+    return _SECRET_VALUE_RE.sub(r'\1"%s"' % REDACTED, text)
+
+
+def log_event(
+    logger: logging.Logger,
+    level: int,
+    event: str,
+    sample: bool = False,
+    exc_info: bool = False,
+    **fields: Any,
+) -> None:
+    """
+    Logg hendelsen event med felt. Koster nesten ingenting når nivået er av
+    eller en samplet hendelse velges bort: ingen record bygges.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if sample and random.random() >= LOG_SUCCESS_SAMPLE_RATE:
+        return
+    logger.log(level, event, exc_info=exc_info, extra={"fields": redact(fields)})
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Like QueueHandler, but redacts the message and keeps the traceback separate."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = redact_text(record.getMessage())
+        record.args = None
+        if record.exc_info:
+            record.exc_text = redact_text(logging.Formatter().formatException(record.exc_info))
+            record.exc_info = None
+        return record
+
+
+def configure_logging(stream=None) -> None:
+    """Sett opp kø-basert logging for prosessen (idempotent)."""
+    global _listener
+    if _listener is not None:
+        return
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    log_queue: queue.Queue = queue.Queue(-1)
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.handlers = [_QueueHandler(log_queue)]
+    root.setLevel(LOG_LEVEL)
+    logging.getLogger("app.integrations").setLevel(INTEGRATION_LOG_LEVEL)
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Tøm køen og stopp lytter-tråden."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
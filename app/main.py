@@ -1,24 +1,32 @@
 # app/main.py
 
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, status
+from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from .database import engine, Base, get_db, SessionLocal
 from sqlalchemy.orm import Session
-from .routers import customers, products, orders, crm, users, statistics
+from .routers import customers, products, orders, crm, users, statistics, admin
 from .routers.payment import router as payment_router  # Import payment router directly to avoid attribute error
 from .auth import authenticate_user, create_access_token
 from .schemas import Token, UserRole
 from .database import SessionLocal
 import logging
-from .models import User
+from .models import User, Order, SalesDaily
+from .crud.sales import rebuild_sales_daily
 from .crud.users import pwd_context
+from .passwords import hasher, PasswordHasherBusy
+from .background import reservation_sweeper, webhook_workers
+from .integrations.vipps import close_vipps_clients
+from .integrations.offload import PaymentProviderBusy
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
 from dotenv import load_dotenv
+from .logconfig import configure_logging, shutdown_logging
 
 load_dotenv()
+configure_logging()
 
 ADMIN_EMAIL = os.getenv("ADMIN_EMAIL", "admin")
 
@@ -38,9 +46,22 @@ async def lifespan(app: FastAPI):
             db.add(db_user)
             db.commit()
             logging.info("Default admin user created.")
+        # Første oppstart etter at sales_daily ble innført: fyll rollupen én gang
+        if db.query(Order.id).first() and not db.query(SalesDaily.day).first():
+            rebuild_sales_daily(db)
+            logging.info("sales_daily rollup built from existing orders.")
     finally:
         db.close()
+    reservation_sweeper.start()
+    for worker in webhook_workers:
+        worker.start()
     yield
+    reservation_sweeper.stop()
+    for worker in webhook_workers:
+        worker.stop()
+    close_vipps_clients()
+    hasher.shutdown()
+    shutdown_logging()
 
 # Opprett alle tabeller basert på modeller
 # NB: I produksjon bør man bruke migrasjoner (f.eks. Alembic) i stedet av å kjøre create_all()
@@ -73,6 +94,59 @@ if engine.dialect.name != 'sqlite':
             except Exception:
                 pass
 
+    def add_column_if_missing(table: str, column: str, ddl: str):
+        """Add a column created after the table already existed in production."""
+        if column in [col['name'] for col in inspector.get_columns(table)]:
+            return
+        with engine.connect() as conn:
+            try:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+            except Exception:
+                pass
+
+    # Row versions for HTTP ETags
+    add_column_if_missing('products', 'updated_at', 'DATETIME(6) NULL')
+    add_column_if_missing('product_images', 'updated_at', 'DATETIME(6) NULL')
+    # Denormalized image URLs (populate with: python -m app.manage backfill-image-urls)
+    add_column_if_missing('products', 'thumbnail_url', 'VARCHAR(500) NULL')
+    add_column_if_missing('products', 'main_image_url', 'VARCHAR(500) NULL')
+    # Token versions for the principal cache
+    add_column_if_missing('users', 'token_version', 'INTEGER NOT NULL DEFAULT 0')
+    # Invite-pending accounts have no password yet
+    add_column_if_missing('users', 'account_state', "VARCHAR(20) NOT NULL DEFAULT 'active'")
+    with engine.connect() as conn:
+        try:
+            conn.execute(text("ALTER TABLE users MODIFY hashed_password VARCHAR(255) NULL"))
+        except Exception:
+            pass
+
+    def add_index_if_missing(table: str, name: str, columns: str):
+        """Create an index declared on a model after the table already existed."""
+        if name in [ix['name'] for ix in inspector.get_indexes(table)]:
+            return
+        with engine.connect() as conn:
+            try:
+                conn.execute(text(f"CREATE INDEX {name} ON {table} ({columns})"))
+            except Exception:
+                pass
+
+    # Stock reservations for pending orders
+    add_column_if_missing('products', 'reserved', 'INTEGER NOT NULL DEFAULT 0')
+    add_column_if_missing('orders', 'refund_required', 'BOOLEAN NOT NULL DEFAULT 0')
+    add_column_if_missing('webhook_inbox', 'next_attempt_at', 'DATETIME NULL')
+
+    # Catalog import key
+    add_column_if_missing('products', 'sku', 'VARCHAR(64) NULL')
+    with engine.connect() as conn:
+        try:
+            conn.execute(text("CREATE UNIQUE INDEX uq_products_sku ON products (sku)"))
+        except Exception:
+            pass
+
+    # Sargable statistics / order list filters
+    add_index_if_missing('orders', 'ix_orders_status_created_at', 'status, created_at')
+    add_index_if_missing('orders', 'ix_orders_customer_created_at', 'customer_id, created_at')
+
 app = FastAPI(
     title="Webshop API",
     description="API for webshop med CRM, Vipps og Bring-integrasjon",
@@ -96,6 +170,7 @@ app.include_router(orders.router)
 app.include_router(crm.router)
 app.include_router(users.router)
 app.include_router(statistics.router)
+app.include_router(admin.router)
 # Include payment router
 app.include_router(payment_router)
 
@@ -106,6 +181,24 @@ app.mount(
     name="static"
 )
 
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy(request: Request, exc: PasswordHasherBusy):
+    """Shed load instead of queueing logins behind a full bcrypt pool."""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Too many password operations in progress, try again shortly"},
+        headers={"Retry-After": "1"},
+    )
+
+@app.exception_handler(PaymentProviderBusy)
+async def payment_provider_busy(request: Request, exc: PaymentProviderBusy):
+    """A slow payment provider must not queue checkouts without bound."""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": f"Payment provider {exc.provider} is busy, try again shortly"},
+        headers={"Retry-After": "2"},
+    )
+
 @app.get("/")
 def root():
     """
@@ -114,7 +207,7 @@ def root():
     return {"message": "Webshop API is up and running!"}
 
 @app.post("/token", response_model=Token)
-def login_for_access_token(
+async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
@@ -124,7 +217,7 @@ def login_for_access_token(
         access_token = create_access_token(data=token_data)
         return {"access_token": access_token, "token_type": "bearer"}
     # Regular user authentication
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -132,6 +225,6 @@ def login_for_access_token(
             headers={"WWW-Authenticate": "Bearer"},
         )
     access_token = create_access_token(
-        data={"sub": user.email, "role": user.role}
+        data={"sub": user.email, "role": user.role, "ver": user.token_version or 0}
     )
     return {"access_token": access_token, "token_type": "bearer"}
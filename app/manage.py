@@ -0,0 +1,78 @@
+# app/manage.py
+
+"""
+Vedlikeholdskommandoer som kjøres mot databasen konfigurert i .env.
+
+Bruk:
+    python -m app.manage backfill-image-urls
+    python -m app.manage rebuild-sales-daily
+    python -m app.manage expire-reservations
+    python -m app.manage drain-webhooks
+"""
+
+import argparse
+
+from .database import SessionLocal
+from .crud.products import backfill_product_image_urls
+from .crud.sales import rebuild_sales_daily
+from .crud.reservations import sweep_expired_reservations
+from .crud.inbox import drain_webhook_inbox
+
+
+def backfill_image_urls(args) -> None:
+    """Populate products.thumbnail_url/main_image_url from product_images."""
+    db = SessionLocal()
+    try:
+        count = backfill_product_image_urls(db, batch_size=args.batch_size)
+    finally:
+        db.close()
+    print(f"Updated image URLs for {count} products")
+
+
+def rebuild_sales(args) -> None:
+    """Rebuild the sales_daily rollup from orders and order_items."""
+    db = SessionLocal()
+    try:
+        rows = rebuild_sales_daily(db)
+    finally:
+        db.close()
+    print(f"Rebuilt sales_daily ({rows} rows)")
+
+
+def expire_reservations(args) -> None:
+    """Cancel pending orders whose stock reservations have expired."""
+    count = sweep_expired_reservations(SessionLocal, batch_size=args.batch_size)
+    print(f"Canceled {count} expired orders")
+
+
+def drain_webhooks(args) -> None:
+    """Apply all queued payment webhooks to their orders."""
+    count = drain_webhook_inbox(SessionLocal, batch_size=args.batch_size)
+    print(f"Processed {count} webhook events")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.manage")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backfill = commands.add_parser("backfill-image-urls", help=backfill_image_urls.__doc__)
+    backfill.add_argument("--batch-size", type=int, default=500)
+    backfill.set_defaults(func=backfill_image_urls)
+
+    rebuild = commands.add_parser("rebuild-sales-daily", help=rebuild_sales.__doc__)
+    rebuild.set_defaults(func=rebuild_sales)
+
+    expire = commands.add_parser("expire-reservations", help=expire_reservations.__doc__)
+    expire.add_argument("--batch-size", type=int, default=200)
+    expire.set_defaults(func=expire_reservations)
+
+    drain = commands.add_parser("drain-webhooks", help=drain_webhooks.__doc__)
+    drain.add_argument("--batch-size", type=int, default=100)
+    drain.set_defaults(func=drain_webhooks)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,23 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Date, Text, Index, UniqueConstraint, Boolean
 from sqlalchemy.orm import relationship
+from sqlalchemy.dialects import mysql
 from datetime import datetime, timezone  # include timezone
 from .database import Base
 
+# Microsecond precision on MySQL so back-to-back updates get distinct versions
+PreciseDateTime = DateTime().with_variant(mysql.DATETIME(fsp=6), "mysql")
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String(255), unique=True, index=True, nullable=False)
-    hashed_password = Column(String(255), nullable=False)
+    # NULL while account_state is "invite_pending" (no password chosen yet)
+    hashed_password = Column(String(255), nullable=True)
     role = Column(String(50), nullable=False)
+    account_state = Column(String(20), nullable=False, default="active", server_default="active")
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    # Bumped on every update; tokens carry it as "ver" so old tokens stop working
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
     # One-to-one link to customer profile
     customer = relationship("Customer", back_populates="user", uselist=False)
 
@@ -42,37 +50,45 @@ class Product(Base):
     __tablename__ = "products"
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False, index=True)
+    # Supplier article number; key for catalog imports (upsert)
+    sku = Column(String(64), nullable=True, unique=True)
     description = Column(Text, nullable=True)
     price = Column(Float, nullable=False)
     stock = Column(Integer, default=0, nullable=False)
+    # Units held by active stock_reservations (pending orders); see crud.reservations
+    reserved = Column(Integer, default=0, server_default="0", nullable=False)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    # Bumped on every change (also stock and image changes); used for ETags
+    updated_at = Column(
+        PreciseDateTime,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc)
+    )
+    # Denormalized from product_images by crud.products.refresh_product_image_urls:
+    # the flagged thumbnail/main image, falling back to the first image
+    thumbnail_url = Column(String(500), nullable=True)
+    main_image_url = Column(String(500), nullable=True)
     order_items = relationship("OrderItem", back_populates="product")
+
+    @property
+    def available(self) -> int:
+        """Stock that can still be ordered."""
+        return self.stock - (self.reserved or 0)
+
     images = relationship(
         "ProductImage",
         back_populates="product",
         cascade="all, delete-orphan"
     )
 
-    @property
-    def thumbnail_url(self) -> str | None:
-        """
-        Return URL of the product's thumbnail image if set, else the first image or None.
-        """
-        # Return explicitly flagged thumbnail if available
-        for img in self.images:
-            if img.is_thumbnail:
-                return img.url
-        # Fallback: return first image if exists
-        if self.images:
-            return self.images[0].url
-        return None
-
 class Order(Base):
     __tablename__ = "orders"
     id = Column(Integer, primary_key=True, index=True)
     customer_id = Column(Integer, ForeignKey("customers.id", ondelete="SET NULL"), nullable=True)
     total_amount = Column(Float, nullable=False)
     status = Column(String(50), default="pending")
+    # Paid after its reservation expired and the units were sold to others
+    refund_required = Column(Boolean, nullable=False, default=False, server_default="0")
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     customer = relationship("Customer", back_populates="orders")
     items = relationship(
@@ -80,6 +96,26 @@ class Order(Base):
         back_populates="order",
         cascade="all, delete-orphan"
     )
+    __table_args__ = (
+        # Status lists and date ranges per status / per customer are range scans
+        Index("ix_orders_status_created_at", "status", "created_at"),
+        Index("ix_orders_customer_created_at", "customer_id", "created_at"),
+    )
+
+class StockReservation(Base):
+    """Lager holdt av en ordre per produkt; state er en schemas.ReservationState."""
+    __tablename__ = "stock_reservations"
+    id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    state = Column(String(20), nullable=False, default="active")
+    expires_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    __table_args__ = (
+        # The sweeper scans active reservations by expiry
+        Index("ix_stock_reservations_state_expires_at", "state", "expires_at"),
+    )
 
 class OrderItem(Base):
     __tablename__ = "order_items"
@@ -100,4 +136,65 @@ class ProductImage(Base):
     is_main = Column(Integer, default=0)  # 1 for main image
     is_thumbnail = Column(Integer, default=0)  # 1 for thumbnail
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = Column(
+        PreciseDateTime,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc)
+    )
     product = relationship("Product", back_populates="images")
+
+class SalesDaily(Base):
+    """
+    Ferdig aggregerte ordretall per dag og status (UTC-dato for created_at).
+    Vedlikeholdes inkrementelt av crud.orders og kan bygges på nytt med
+    `python -m app.manage rebuild-sales-daily`.
+    """
+    __tablename__ = "sales_daily"
+    day = Column(Date, primary_key=True)
+    status = Column(String(50), primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+    item_count = Column(Integer, nullable=False, default=0)
+
+class WebhookEvent(Base):
+    """
+    Ledger over mottatte betalings-webhooks. Den unike nøkkelen
+    (provider, event_id) gjør at gjentatte leveranser av samme hendelse
+    gjenkjennes og hoppes over; result viser hva hendelsen gjorde med ordren.
+    """
+    __tablename__ = "webhook_events"
+    id = Column(Integer, primary_key=True, index=True)
+    provider = Column(String(20), nullable=False)
+    event_id = Column(String(255), nullable=False)
+    event_type = Column(String(100), nullable=True)
+    order_id = Column(Integer, nullable=True, index=True)
+    status = Column(String(50), nullable=True)  # status the event asks for
+    result = Column(String(20), nullable=False)  # schemas.WebhookResult
+    received_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    __table_args__ = (
+        UniqueConstraint("provider", "event_id", name="uq_webhook_events_provider_event"),
+    )
+
+class WebhookInbox(Base):
+    """
+    Kø med rå webhook-leveranser. Endepunktene lagrer hendelsen her og svarer
+    med en gang; app.background sine webhook-workere bruker dem på ordrene.
+    """
+    __tablename__ = "webhook_inbox"
+    id = Column(Integer, primary_key=True, index=True)
+    provider = Column(String(20), nullable=False)
+    event_id = Column(String(255), nullable=False)
+    payload = Column(Text, nullable=False)  # raw request body
+    state = Column(String(20), nullable=False, default="pending")  # schemas.InboxState
+    attempts = Column(Integer, nullable=False, default=0)
+    claim_token = Column(String(32), nullable=True)
+    claimed_at = Column(DateTime, nullable=True)
+    next_attempt_at = Column(DateTime, nullable=True)  # backoff after a failed attempt
+    result = Column(String(20), nullable=True)  # schemas.WebhookResult when done
+    error = Column(String(500), nullable=True)
+    received_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    processed_at = Column(DateTime, nullable=True)
+    __table_args__ = (
+        UniqueConstraint("provider", "event_id", name="uq_webhook_inbox_provider_event"),
+        Index("ix_webhook_inbox_state_id", "state", "id"),
+    )
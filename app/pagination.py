@@ -0,0 +1,65 @@
+# app/pagination.py
+
+"""
+Keyset (cursor) pagination shared by the list endpoints.
+
+Lists are ordered by primary key. A client either pages with the classic
+``skip``/``limit`` parameters, or passes the opaque ``cursor`` returned in the
+``X-Next-Cursor`` response header, which turns the page into an indexed
+``WHERE id > :last_id`` range scan instead of an ever growing OFFSET.
+"""
+
+import base64
+from typing import Optional, Sequence
+
+from fastapi import HTTPException, Response
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(last_id: int) -> str:
+    """Encode the last seen id as an opaque cursor string."""
+    return base64.urlsafe_b64encode(f"id:{last_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """Decode a cursor produced by encode_cursor. Raises ValueError if malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        prefix, value = base64.urlsafe_b64decode(padded.encode()).decode().split(":", 1)
+        if prefix != "id":
+            raise ValueError
+        return int(value)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f"Invalid cursor '{cursor}'")
+
+
+def paginate(query, id_column, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    """
+    Apply ordering and paging to a query (or select). With a cursor the page
+    starts after the encoded id and skip is ignored.
+    """
+    query = query.order_by(id_column)
+    if cursor is not None:
+        return query.filter(id_column > decode_cursor(cursor)).limit(limit)
+    return query.offset(skip).limit(limit)
+
+
+def next_cursor(rows: Sequence, limit: int) -> Optional[str]:
+    """Cursor for the page after rows, or None when this was the last page."""
+    if limit <= 0 or len(rows) < limit:
+        return None
+    return encode_cursor(rows[-1].id)
+
+
+def set_next_cursor(response: Response, rows: Sequence, limit: int) -> Response:
+    """Expose the next cursor (if any) in the X-Next-Cursor header."""
+    cursor = next_cursor(rows, limit)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+    return response
+
+
+def invalid_cursor(exc: ValueError) -> HTTPException:
+    """Map a cursor decoding error to a 400 response."""
+    return HTTPException(status_code=400, detail=str(exc))
@@ -0,0 +1,130 @@
+# app/passwords.py
+
+"""
+Password hashing off the request threadpool.
+
+bcrypt costs ~250 ms of CPU per call. Hashing and verification run in a small
+dedicated process pool (PASSWORD_HASH_WORKERS), so a login storm uses those
+cores only and never holds the GIL or Starlette's threadpool for the duration.
+At most PASSWORD_HASH_MAX_PENDING calls may be running or queued; beyond that
+callers get PasswordHasherBusy (HTTP 503) instead of an ever-growing queue.
+
+PASSWORD_HASH_WORKERS=0 hashes inline in the calling thread (development).
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, Optional
+
+from passlib.context import CryptContext
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(2, os.cpu_count() or 1))))
+HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+
+
+class PasswordHasherBusy(Exception):
+    """More password operations are pending than PASSWORD_HASH_MAX_PENDING."""
+
+
+# Top-level functions so the process pool can pickle them
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(password: str, hashed: str) -> bool:
+    return pwd_context.verify(password, hashed)
+
+
+class PasswordHasher:
+    def __init__(self, workers: int = HASH_WORKERS, max_pending: int = HASH_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.max_pending_seen = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a process with running threads (uvicorn, anyio) is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def _submit(self, fn, *args) -> Future:
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHasherBusy()
+            self.pending += 1
+            self.max_pending_seen = max(self.max_pending_seen, self.pending)
+            started = time.perf_counter()
+        try:
+            if self.workers > 0:
+                future = self._pool().submit(fn, *args)
+            else:
+                future = Future()
+                try:
+                    future.set_result(fn(*args))
+                except Exception as e:
+                    future.set_exception(e)
+        except Exception:
+            self._done(started)
+            raise
+        future.add_done_callback(lambda _: self._done(started))
+        return future
+
+    def _done(self, started: float) -> None:
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+            self.total_ms += elapsed
+            self.max_ms = max(self.max_ms, elapsed)
+
+    # Sync API for crud functions running in the threadpool
+    def hash_sync(self, password: str) -> str:
+        return self._submit(_hash, password).result()
+
+    def verify_sync(self, password: str, hashed: str) -> bool:
+        return self._submit(_verify, password, hashed).result()
+
+    # Async API for async routes: the event loop only waits on the future
+    async def hash(self, password: str) -> str:
+        return await asyncio.wrap_future(self._submit(_hash, password))
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await asyncio.wrap_future(self._submit(_verify, password, hashed))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "max_pending_seen": self.max_pending_seen,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_ms": round(self.total_ms / self.completed, 3) if self.completed else 0.0,
+                "max_ms": round(self.max_ms, 3),
+            }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+hasher = PasswordHasher()
@@ -0,0 +1,88 @@
+# app/projections.py
+
+"""
+Helpers for the opt-in ?expand= response projections.
+
+Without ``expand`` the routers return their full, legacy response models. When
+``expand`` is given (even empty) the response is built from the slim schemas in
+``app.schemas`` and only the listed relationships are loaded and serialized.
+"""
+
+from typing import Dict, Iterable, Optional, Set
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import inspect
+
+ORDER_EXPANDS = frozenset({"customer", "items"})
+CUSTOMER_EXPANDS = frozenset({"notes", "orders"})
+USER_EXPANDS = frozenset({"customer"})
+
+# A customer nested below an order or user is always a summary
+NESTED_CUSTOMER = {"notes": True, "orders": True}
+
+
+def parse_expand(expand: Optional[str], allowed: Iterable[str]) -> Optional[Set[str]]:
+    """
+    Parse a comma separated ?expand= value. Returns None when the parameter was
+    not given, so callers can keep the full response shape.
+    """
+    if expand is None:
+        return None
+    requested = {part.strip() for part in expand.split(",") if part.strip()}
+    unknown = requested - set(allowed)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown expand value(s): {', '.join(sorted(unknown))}",
+        )
+    return requested
+
+
+class _LoadedView:
+    """
+    Read-only view of an ORM instance that hides attributes which were not
+    loaded by the query, so pydantic falls back to the schema default instead
+    of triggering a lazy load.
+    """
+
+    __slots__ = ("_obj", "_unloaded")
+
+    def __init__(self, obj):
+        self._obj = obj
+        self._unloaded = inspect(obj).unloaded
+
+    def __getattr__(self, name):
+        if name in self._unloaded:
+            raise AttributeError(name)
+        return _wrap(getattr(self._obj, name))
+
+
+def _wrap(value):
+    if isinstance(value, list):
+        return [_wrap(v) for v in value]
+    if hasattr(value, "_sa_instance_state"):
+        return _LoadedView(value)
+    return value
+
+
+def _exclude(allowed: Iterable[str], expanded: Set[str], nested: Optional[Dict] = None) -> Dict:
+    exclude = {name: True for name in allowed if name not in expanded}
+    for name, sub in (nested or {}).items():
+        if name in expanded:
+            exclude[name] = sub
+    return exclude
+
+
+def project(obj, schema: type[BaseModel], allowed: Iterable[str], expanded: Set[str], nested: Optional[Dict] = None):
+    """Serialize one ORM object (or a list of them) with the given slim schema."""
+    exclude = _exclude(allowed, expanded, nested)
+    if isinstance(obj, list):
+        return [schema.model_validate(_wrap(o)).model_dump(mode="json", exclude=exclude) for o in obj]
+    return schema.model_validate(_wrap(obj)).model_dump(mode="json", exclude=exclude)
+
+
+def projected_response(obj, schema: type[BaseModel], allowed: Iterable[str], expanded: Set[str], nested: Optional[Dict] = None) -> JSONResponse:
+    """Return a projection as a ready JSON response (bypasses the route's response_model)."""
+    return JSONResponse(content=project(obj, schema, allowed, expanded, nested))
@@ -0,0 +1,75 @@
+# app/routers/admin.py
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from ..auth import get_admin_claims
+from .. import crud
+from ..background import reservation_sweeper, webhook_workers
+from ..cache import cache_stats
+from ..database import engine, get_db, replica_engine
+from ..dbpool import pool_stats
+from ..integrations.stripe import stripe_pool
+from ..integrations.vipps import vipps_pool
+from ..passwords import hasher
+
+# Read-only operational metrics: verified admin claims are enough
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    dependencies=[Depends(get_admin_claims)]
+)
+
+@router.get("/cache")
+def read_cache_stats():
+    """
+    Hit/miss counters for the in-process caches (admin only).
+    """
+    return cache_stats()
+
+
+@router.get("/pool")
+def read_pool_stats():
+    """
+    Connection pool occupancy, checkout wait and connect latency (admin only).
+    With a read replica configured, its pool is reported under "replica".
+    """
+    stats = pool_stats(engine)
+    if replica_engine is not engine:
+        stats["replica"] = pool_stats(replica_engine)
+    return stats
+
+
+@router.get("/passwords")
+def read_password_hasher_stats():
+    """
+    Password process pool: pending (queue depth), rejections and latency (admin only).
+    """
+    return hasher.stats()
+
+
+@router.get("/payments")
+def read_payment_provider_stats():
+    """
+    Per-provider payment call concurrency, queue depth, rejections and latency (admin only).
+    """
+    return {"vipps": vipps_pool.stats(), "stripe": stripe_pool.stats()}
+
+
+@router.get("/reservations")
+def read_reservation_sweeper_stats():
+    """
+    Reservation sweeper runs, failures and orders expired in the last run (admin only).
+    """
+    return reservation_sweeper.stats()
+
+
+@router.get("/webhooks")
+def read_webhook_stats(db: Session = Depends(get_db)):
+    """
+    Webhook inbox rows per state and the webhook workers' runs and failures (admin only).
+    """
+    return {
+        "inbox": crud.inbox_counts(db),
+        "workers": [worker.stats() for worker in webhook_workers],
+    }
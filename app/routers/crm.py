@@ -3,9 +3,9 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
-from .. import crud, schemas, models
-from ..database import get_db
-from ..auth import get_current_user
+from .. import crud, schemas
+from ..database import get_db, get_read_db
+from ..auth import Principal, get_current_user
 
 router = APIRouter(
     prefix="/crm",
@@ -15,7 +15,7 @@ router = APIRouter(
 @router.post("/notes", response_model=schemas.CRMNoteRead, status_code=201)
 def create_note(
     note_in: schemas.CRMNoteCreate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -31,8 +31,8 @@ def create_note(
 @router.get("/notes/{customer_id}", response_model=List[schemas.CRMNoteRead])
 def read_notes(
     customer_id: int,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
 ):
     """
     Hent alle CRM-notater for en gitt kunde.
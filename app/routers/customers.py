@@ -1,12 +1,15 @@
 # app/routers/customers.py
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, File, HTTPException, Response, UploadFile
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from .. import crud, schemas
+from ..projections import parse_expand, projected_response, CUSTOMER_EXPANDS
+from ..pagination import set_next_cursor, invalid_cursor
 from ..database import get_db
-from ..auth import get_current_user, get_current_admin
-from ..models import Customer, User
+from ..auth import Principal, get_current_user, get_current_admin
+from ..models import Customer
+from ..imports import ImportFormat, import_upload
 
 router = APIRouter(
     prefix="/customers",
@@ -15,11 +18,30 @@ router = APIRouter(
 
 # Admin-only: list all customers
 @router.get("/", response_model=List[schemas.CustomerRead], dependencies=[Depends(get_current_admin)])
-def read_customers(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_customers(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    country: Optional[str] = None,
+    expand: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
     """
     Hent en liste over kunder med paginering.
-    """
-    return crud.get_customers(db, skip=skip, limit=limit)
+    Pass the X-Next-Cursor header value as ?cursor= to fetch the next page.
+    Pass ?expand=notes,orders (or an empty ?expand=) for the slim CustomerSummary shape.
+    """
+    expanded = parse_expand(expand, CUSTOMER_EXPANDS)
+    try:
+        customers = crud.get_customers(db, skip=skip, limit=limit, expand=expanded, cursor=cursor, country=country)
+    except ValueError as e:
+        raise invalid_cursor(e)
+    if expanded is None:
+        set_next_cursor(response, customers, limit)
+        return customers
+    projected = projected_response(customers, schemas.CustomerSummary, CUSTOMER_EXPANDS, expanded)
+    return set_next_cursor(projected, customers, limit)
 
 # Admin-only: read any customer by ID
 @router.get("/{customer_id}", response_model=schemas.CustomerRead, dependencies=[Depends(get_current_admin)])
@@ -44,6 +66,30 @@ def create_customer(customer: schemas.CustomerCreate, db: Session = Depends(get_
         raise HTTPException(status_code=400, detail="Email already registered")
     return crud.create_customer(db, customer)
 
+# Admin-only: bulk create customers (invite-pending accounts, no password hashing)
+@router.post("/import", response_model=schemas.ImportResult, dependencies=[Depends(get_current_admin)])
+def import_customers(customers: List[schemas.CustomerCreate], db: Session = Depends(get_db)):
+    """
+    Importer mange kunder i én forespørsel. Rader med eksisterende e-post
+    hoppes over og rapporteres i errors.
+    """
+    return crud.import_customers(db, customers)
+
+@router.post("/import/file", response_model=schemas.ImportResult, dependencies=[Depends(get_current_admin)])
+def import_customers_file(
+    file: UploadFile = File(...),
+    format: Optional[ImportFormat] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Som /customers/import, men fra en CSV- eller NDJSON-fil (strømmes i chunker).
+    """
+    seen = set()
+    return import_upload(
+        file, format, schemas.CustomerCreate,
+        lambda chunk: crud.import_customer_chunk(db, chunk, seen),
+    )
+
 # Admin-only: update any customer
 @router.put("/{customer_id}", response_model=schemas.CustomerRead, dependencies=[Depends(get_current_admin)])
 def update_customer(customer_id: int, customer_in: schemas.CustomerCreate, db: Session = Depends(get_db)):
@@ -67,7 +113,7 @@ def delete_customer(customer_id: int, db: Session = Depends(get_db)):
 # Customer: view own profile
 @router.get("/me", response_model=schemas.CustomerRead)
 def read_own_customer(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -81,7 +127,7 @@ def read_own_customer(
 # Customer: delete/anonymize own data
 @router.delete("/me", status_code=204)
 def delete_own_customer(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
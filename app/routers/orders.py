@@ -1,12 +1,16 @@
 # app/routers/orders.py
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from .. import crud, schemas
-from ..database import get_db
+from ..crud import aio
+from ..projections import parse_expand, projected_response, ORDER_EXPANDS, NESTED_CUSTOMER
+from ..pagination import set_next_cursor, invalid_cursor
+from ..database import get_db, get_async_db
 from ..auth import get_current_user, get_current_admin
-from ..integrations.vipps import VippsClient
+from ..integrations.offload import PaymentProviderBusy
+from ..integrations.vipps import get_vipps_client
 from ..schemas import VippsPaymentRequest, VippsPaymentResponse, VippsCallback
 
 router = APIRouter(
@@ -15,21 +19,54 @@ router = APIRouter(
 )
 
 @router.get("/", response_model=List[schemas.OrderRead], dependencies=[Depends(get_current_user)])
-def read_orders(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def read_orders(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    status: Optional[schemas.OrderStatus] = None,
+    customer_id: Optional[int] = None,
+    expand: Optional[str] = None,
+    db: Session = Depends(get_db),
+    adb: Optional[aio.AsyncSession] = Depends(get_async_db)
+):
     """
     Hent en liste over ordrer med paginering.
+    Pass the X-Next-Cursor header value as ?cursor= to fetch the next page.
+    Pass ?expand=customer,items (or an empty ?expand=) for the slim OrderSummary shape.
     """
-    return crud.get_orders(db, skip=skip, limit=limit)
+    expanded = parse_expand(expand, ORDER_EXPANDS)
+    try:
+        orders = await aio.read(
+            adb, aio.get_orders, db, crud.get_orders,
+            skip=skip, limit=limit, expand=expanded, cursor=cursor,
+            status=status.value if status else None, customer_id=customer_id,
+        )
+    except ValueError as e:
+        raise invalid_cursor(e)
+    if expanded is None:
+        set_next_cursor(response, orders, limit)
+        return orders
+    projected = projected_response(orders, schemas.OrderSummary, ORDER_EXPANDS, expanded, {"customer": NESTED_CUSTOMER})
+    return set_next_cursor(projected, orders, limit)
 
 @router.get("/{order_id}", response_model=schemas.OrderRead, dependencies=[Depends(get_current_user)])
-def read_order(order_id: int, db: Session = Depends(get_db)):
+async def read_order(
+    order_id: int,
+    expand: Optional[str] = None,
+    db: Session = Depends(get_db),
+    adb: Optional[aio.AsyncSession] = Depends(get_async_db)
+):
     """
     Hent detaljene til én ordre.
     """
-    db_order = crud.get_order(db, order_id)
+    expanded = parse_expand(expand, ORDER_EXPANDS)
+    db_order = await aio.read(adb, aio.get_order, db, crud.get_order, order_id, expand=expanded)
     if not db_order:
         raise HTTPException(status_code=404, detail="Order not found")
-    return db_order
+    if expanded is None:
+        return db_order
+    return projected_response(db_order, schemas.OrderSummary, ORDER_EXPANDS, expanded, {"customer": NESTED_CUSTOMER})
 
 @router.post("/", response_model=schemas.OrderRead, status_code=201, dependencies=[Depends(get_current_user)])
 def create_order(order_in: schemas.OrderCreate, db: Session = Depends(get_db)):
@@ -42,16 +79,17 @@ def create_order(order_in: schemas.OrderCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/{order_id}/pay", response_model=VippsPaymentResponse, dependencies=[Depends(get_current_user)])
-def pay_order(
+async def pay_order(
     order_id: int,
     payment_req: VippsPaymentRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    adb: Optional[aio.AsyncSession] = Depends(get_async_db)
 ):
     """
     Initiate a Vipps payment for a pending order.
     """
     # Fetch order
-    order = crud.get_order(db, order_id)
+    order = await aio.read(adb, aio.get_order, db, crud.get_order, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     if order.status != schemas.OrderStatus.pending.value:
@@ -59,14 +97,16 @@ def pay_order(
     # Create Vipps payment with shipping cost
     shipping_cost = 80.0
     total_amount = order.total_amount + shipping_cost
-    vipps = VippsClient(sandbox=True)
+    vipps = get_vipps_client(sandbox=True)
     try:
-        result = vipps.create_payment(
+        result = await vipps.create_payment_async(
             order_id=order_id,
             amount=total_amount,
             callback_url=payment_req.callback_url,
             shipping=payment_req.shipping.dict()
         )
+    except PaymentProviderBusy:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     return {"data": result}
@@ -78,21 +118,14 @@ def vipps_callback(
     db: Session = Depends(get_db)
 ):
     """
-    Endpoint for Vipps to notify payment status. Updates order status accordingly.
+    Endpoint for Vipps to notify payment status. The callback is queued in
+    webhook_inbox and acknowledged at once; the webhook workers update the order.
     """
-    # Map Vipps transactionStatus to our OrderStatus
-    status_map = {
-        "AUTHORIZED": schemas.OrderStatus.paid.value,
-        "SETTLED": schemas.OrderStatus.paid.value,
-        "REJECTED": schemas.OrderStatus.canceled.value
-    }
-    new_status = status_map.get(callback.transactionStatus.upper())
-    if not new_status:
+    event = crud.vipps_payment_event(order_id, callback)
+    if event is None:
         # ignore unknown statuses
         return
-    db_order = crud.update_order_status(db, order_id, new_status)
-    if not db_order:
-        raise HTTPException(status_code=404, detail="Order not found")
+    crud.enqueue_webhook(db, event, crud.vipps_payload(order_id, callback))
     return
 
 @router.put("/{order_id}/status", response_model=schemas.OrderRead, dependencies=[Depends(get_current_admin)])
@@ -1,12 +1,20 @@
 
 # filepath: app/routers/payment.py
 from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from ..database import get_db
+from typing import Optional
+import logging
+from ..database import get_db, get_async_db
 from ..auth import get_current_user
-from ..integrations.vipps import VippsClient, VIPPS_CLIENT_ID, VIPPS_CLIENT_SECRET
-from ..integrations.stripe import StripeClient, STRIPE_SECRET_KEY
+from ..integrations.offload import PaymentProviderBusy
+from ..integrations.vipps import get_vipps_client, VIPPS_CLIENT_ID, VIPPS_CLIENT_SECRET
+from ..integrations.stripe import StripeClient, STRIPE_SECRET_KEY, verify_webhook_signature
 from .. import crud, schemas
+from ..crud import aio
+from ..logconfig import log_event
+
+logger = logging.getLogger("app.integrations.payment")
 
 # Vipps payment router
 vipps_router = APIRouter(
@@ -24,7 +32,11 @@ stripe_router = APIRouter(
 router = APIRouter()
 
 @vipps_router.post("/initiate", response_model=schemas.VippsPaymentResponse, dependencies=[Depends(get_current_user)])
-def vipps_initiate(request: schemas.VippsInitiateRequest, db: Session = Depends(get_db)):
+async def vipps_initiate(
+    request: schemas.VippsInitiateRequest,
+    db: Session = Depends(get_db),
+    adb: Optional[aio.AsyncSession] = Depends(get_async_db)
+):
     """
     Initiate a Vipps payment for a pending order via separate payment endpoint.
     """
@@ -35,8 +47,7 @@ def vipps_initiate(request: schemas.VippsInitiateRequest, db: Session = Depends(
             detail="Vipps credentials not configured; set VIPPS_CLIENT_ID and VIPPS_CLIENT_SECRET"
         )
     
-    order = crud.get_order(db, request.order_id)
-    print(f"Initiating Vipps payment for order {request.order_id}")
+    order = await aio.read(adb, aio.get_order, db, crud.get_order, request.order_id)
 
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -49,21 +60,27 @@ def vipps_initiate(request: schemas.VippsInitiateRequest, db: Session = Depends(
     shipping_cost = 80.0
     total_amount_with_shipping = order.total_amount + shipping_cost
     
-    vipps = VippsClient(sandbox=True)
+    vipps = get_vipps_client(sandbox=True)
     try:
-        result = vipps.create_payment(
+        result = await vipps.create_payment_async(
             order_id=request.order_id,
             amount=total_amount_with_shipping,
             callback_url=request.callback_url,
             shipping=request.shipping.dict()
         )
+    except PaymentProviderBusy:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     return {"data": result}
 
 
 @stripe_router.post("/initiate", response_model=schemas.StripePaymentResponse, dependencies=[Depends(get_current_user)])
-def stripe_initiate(request: schemas.StripeInitiateRequest, db: Session = Depends(get_db)):
+async def stripe_initiate(
+    request: schemas.StripeInitiateRequest,
+    db: Session = Depends(get_db),
+    adb: Optional[aio.AsyncSession] = Depends(get_async_db)
+):
     """
     Initiate a Stripe payment for a pending order via separate payment endpoint.
     """
@@ -74,7 +91,7 @@ def stripe_initiate(request: schemas.StripeInitiateRequest, db: Session = Depend
             detail="Stripe credentials not configured; set STRIPE_SK environment variable"
         )
     
-    order = crud.get_order(db, request.order_id)
+    order = await aio.read(adb, aio.get_order, db, crud.get_order, request.order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     if order.status != schemas.OrderStatus.pending.value:
@@ -88,12 +105,14 @@ def stripe_initiate(request: schemas.StripeInitiateRequest, db: Session = Depend
     
     stripe_client = StripeClient()
     try:
-        result = stripe_client.create_payment_intent(
+        result = await stripe_client.create_payment_intent_async(
             order_id=request.order_id,
             amount=total_amount_with_shipping,
             callback_url=request.callback_url,
             shipping=request.shipping.dict()
         )
+    except PaymentProviderBusy:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     return {"data": result}
@@ -102,42 +121,27 @@ def stripe_initiate(request: schemas.StripeInitiateRequest, db: Session = Depend
 @stripe_router.post("/webhook")
 async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
     """
-    Handle Stripe webhook events for payment status updates.
+    Receive a Stripe event. The event is verified and queued in webhook_inbox,
+    and Stripe gets its 200 right away; the webhook workers update the order.
     """
     import json
-    
+
     payload = await request.body()
     sig_header = request.headers.get('stripe-signature')
-    
+
     try:
-        # In production, you should verify the webhook signature
-        # For now, we'll just parse the JSON payload
-        event = json.loads(payload)
-        
-        if event['type'] == 'checkout.session.completed':
-            session = event['data']['object']
-            order_id = session['metadata'].get('order_id')
-            
-            if order_id:
-                # Update order status to paid
-                db_order = crud.update_order_status(db, int(order_id), schemas.OrderStatus.paid.value)
-                if not db_order:
-                    raise HTTPException(status_code=404, detail="Order not found")
-                    
-        elif event['type'] == 'checkout.session.expired':
-            session = event['data']['object']
-            order_id = session['metadata'].get('order_id')
-            
-            if order_id:
-                # Update order status to canceled
-                db_order = crud.update_order_status(db, int(order_id), schemas.OrderStatus.canceled.value)
-                
-        return {"status": "success"}
-        
+        verify_webhook_signature(payload, sig_header)
+        payment_event = crud.stripe_payment_event(json.loads(payload))
     except Exception as e:
-        print(f"Stripe webhook error: {str(e)}")
+        log_event(logger, logging.WARNING, "stripe.webhook_invalid", error=str(e))
         raise HTTPException(status_code=400, detail="Invalid webhook payload")
 
+    if payment_event.status is None:
+        # Event types we don't act on are acknowledged without touching the database
+        return {"status": "ignored"}
+    queued = await run_in_threadpool(crud.enqueue_webhook, db, payment_event, payload.decode("utf-8"))
+    return {"status": "queued" if queued else "duplicate"}
+
 
 # Include both routers
 router.include_router(vipps_router)
@@ -1,14 +1,20 @@
 # app/routers/products.py
 
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Request, Response
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import os
 import uuid
 
 from .. import crud, schemas
-from ..database import get_db
+from ..crud import aio
+from ..database import get_db, get_read_db, get_async_db, is_replica
 from ..auth import get_current_user, get_current_admin
+from ..pagination import next_cursor, invalid_cursor, NEXT_CURSOR_HEADER
+from ..cache import product_cache
+from ..conditional import rows_etag, last_modified, etag_matches, not_modified, validator_headers
+from ..imports import ImportFormat, import_upload
 from fastapi import status
 
 router = APIRouter(
@@ -17,21 +23,78 @@ router = APIRouter(
 )
 
 @router.get("/", response_model=List[schemas.ProductRead])
-def read_products(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def read_products(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    in_stock: Optional[bool] = None,
+    db: Session = Depends(get_read_db),
+    adb: Optional[aio.AsyncSession] = Depends(get_async_db)
+):
     """
     Hent en liste over produkter med paginering.
+    Pass the X-Next-Cursor header value as ?cursor= to fetch the next page.
+    Serialized pages are cached in-process (see app.cache.product_cache), and
+    If-None-Match is answered with 304 before anything is serialized. Pages
+    read from the replica are not cached: after a write clears the cache,
+    a lagging replica would otherwise refill it with pre-write rows.
     """
-    return crud.get_products(db, skip=skip, limit=limit)
+    key = ("list", skip, limit, cursor, in_stock)
+    cached = product_cache.get(key)
+    if cached is None:
+        generation = product_cache.generation
+        try:
+            products = await aio.read(
+                adb, aio.get_products, db, crud.get_products,
+                skip=skip, limit=limit, cursor=cursor, in_stock=in_stock,
+            )
+        except ValueError as e:
+            raise invalid_cursor(e)
+        etag = rows_etag(key, products)
+        modified = last_modified(products)
+        if etag_matches(request, etag):
+            return not_modified(etag, modified)
+        payload = [schemas.ProductRead.model_validate(p).model_dump(mode="json") for p in products]
+        cached = (etag, modified, payload, next_cursor(products, limit))
+        if adb is not None or not is_replica(db):
+            product_cache.set(key, cached, generation)
+    etag, modified, payload, cursor_out = cached
+    if etag_matches(request, etag):
+        return not_modified(etag, modified)
+    headers = validator_headers(etag, modified)
+    if cursor_out:
+        headers[NEXT_CURSOR_HEADER] = cursor_out
+    return JSONResponse(content=payload, headers=headers)
 
 @router.get("/{product_id}", response_model=schemas.ProductRead)
-def read_product(product_id: int, db: Session = Depends(get_db)):
+async def read_product(
+    product_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    adb: Optional[aio.AsyncSession] = Depends(get_async_db)
+):
     """
     Hent detaljer om ett produkt.
     """
-    db_product = crud.get_product(db, product_id)
-    if not db_product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return db_product
+    key = ("item", product_id)
+    cached = product_cache.get(key)
+    if cached is None:
+        generation = product_cache.generation
+        db_product = await aio.read(adb, aio.get_product, db, crud.get_product, product_id)
+        if not db_product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        etag = rows_etag(key, [db_product])
+        modified = last_modified([db_product])
+        if etag_matches(request, etag):
+            return not_modified(etag, modified)
+        payload = schemas.ProductRead.model_validate(db_product).model_dump(mode="json")
+        cached = (etag, modified, payload)
+        product_cache.set(key, cached, generation)
+    etag, modified, payload = cached
+    if etag_matches(request, etag):
+        return not_modified(etag, modified)
+    return JSONResponse(content=payload, headers=validator_headers(etag, modified))
 
 @router.post("/", response_model=schemas.ProductRead, status_code=201, dependencies=[Depends(get_current_admin)])
 def create_product(product: schemas.ProductCreate, db: Session = Depends(get_db)):
@@ -46,12 +109,53 @@ def create_product(product: schemas.ProductCreate, db: Session = Depends(get_db)
     os.makedirs(media_dir, exist_ok=True)
     return new_prod
 
+@router.post("/import", response_model=schemas.ImportResult, dependencies=[Depends(get_current_admin)])
+def import_products(
+    file: UploadFile = File(...),
+    format: Optional[ImportFormat] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Importer en leverandørkatalog (CSV eller NDJSON). Rader med sku oppdaterer
+    eksisterende produkt med samme SKU; rader uten sku opprettes som nye.
+    """
+    seen = set()
+    return import_upload(
+        file, format, schemas.ProductCreate,
+        lambda chunk: crud.import_product_chunk(db, chunk, seen),
+    )
+
+@router.post("/stock/import", response_model=schemas.ImportResult, dependencies=[Depends(get_current_admin)])
+def import_stock(
+    file: UploadFile = File(...),
+    format: Optional[ImportFormat] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Sett absolutt lagerbeholdning fra fil (kolonner product_id eller sku, og stock).
+    """
+    return import_upload(
+        file, format, schemas.StockLevel,
+        lambda chunk: crud.import_stock_chunk(db, chunk),
+    )
+
+@router.post("/stock/batch", response_model=schemas.StockBatchResult, dependencies=[Depends(get_current_admin)])
+def batch_stock(batch: schemas.StockBatch, db: Session = Depends(get_db)):
+    """
+    Juster eller sett lagerbeholdning for mange produkter i én transaksjon,
+    med resultat per linje.
+    """
+    return crud.apply_stock_batch(db, batch)
+
 @router.put("/{product_id}", response_model=schemas.ProductRead, dependencies=[Depends(get_current_admin)])
 def update_product(product_id: int, product_in: schemas.ProductCreate, db: Session = Depends(get_db)):
     """
     Oppdater eksisterende produkt.
     """
-    db_product = crud.update_product(db, product_id, product_in)
+    try:
+        db_product = crud.update_product(db, product_id, product_in)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
     return db_product
@@ -82,9 +186,14 @@ def adjust_stock(product_id: int, stock_update: schemas.StockUpdate, db: Session
 # ==========================
 
 @router.get("/{product_id}/images", response_model=List[schemas.ProductImageRead])
-def list_images(product_id: int, db: Session = Depends(get_db)):
+def list_images(product_id: int, request: Request, db: Session = Depends(get_read_db)):
     images = crud.get_product_images(db, product_id)
-    return images
+    etag = rows_etag(("images", product_id), images)
+    modified = last_modified(images)
+    if etag_matches(request, etag):
+        return not_modified(etag, modified)
+    payload = [schemas.ProductImageRead.model_validate(img).model_dump(mode="json") for img in images]
+    return JSONResponse(content=payload, headers=validator_headers(etag, modified))
 
 @router.get("/{product_id}/images/{image_id}", response_model=schemas.ProductImageRead)
 def get_image(product_id: int, image_id: int, db: Session = Depends(get_db)):
@@ -141,7 +250,7 @@ def delete_image(product_id: int, image_id: int, db: Session = Depends(get_db)):
 @router.get("/{product_id}/stock", response_model=int)
 def get_stock(product_id: int, db: Session = Depends(get_db)):
     """
-    Retrieve the stock quantity for a specific product.
+    Retrieve the available stock (stock - reserved) for a specific product.
     """
     stock = crud.products.get_stock(db, product_id=product_id)
     if stock is None:
@@ -153,7 +262,10 @@ def update_stock(product_id: int, quantity: int, db: Session = Depends(get_db)):
     """
     Update the stock quantity for a specific product.
     """
-    product = crud.products.update_stock(db, product_id=product_id, quantity=quantity)
+    try:
+        product = crud.products.update_stock(db, product_id=product_id, quantity=quantity)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     return product
@@ -163,6 +275,9 @@ def delete_stock(product_id: int, db: Session = Depends(get_db)):
     """
     Reset the stock quantity for a specific product to zero.
     """
-    success = crud.products.delete_stock(db, product_id=product_id)
+    try:
+        success = crud.products.delete_stock(db, product_id=product_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not success:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -1,65 +1,183 @@
 # filepath: app/routers/statistics.py
-from fastapi import APIRouter, Depends
+import csv
+import io
+import json
+import os
+from datetime import date, datetime, timedelta, timezone
+from enum import Enum
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
-from ..database import get_db
-from ..auth import get_current_admin
+from ..database import get_read_db
+from ..auth import get_current_admin, get_admin_claims
 from ..crud.statistics import (
     get_monthly_sales,
+    get_sales_range,
     get_unprocessed_orders,
+    iter_unprocessed_orders,
     get_total_users,
     get_paid_unprocessed_count,
     get_total_orders,
     get_total_revenue,
+    get_summary,
 )
-from ..schemas import MonthlySales, UnprocessedOrder, CountResponse, RevenueResponse
+from ..cache import stats_cache
+from ..schemas import OrderStatus, Granularity, SalesBucket, StatisticsSummary, MonthlySales, UnprocessedOrder, CountResponse, RevenueResponse, OrderSummary
+from ..projections import parse_expand, project, projected_response, ORDER_EXPANDS, NESTED_CUSTOMER
 
+# Aggregate counters authorize from the token claims alone (no user lookup);
+# endpoints that return customer data still check the user via get_current_admin
 router = APIRouter(
     prefix="/statistics",
     tags=["statistics"]
 )
 
-@router.get("/sales/{year}", response_model=List[MonthlySales], dependencies=[Depends(get_current_admin)])
-def read_monthly_sales(year: int, db: Session = Depends(get_db)):
+# Orders per query/flush in the streaming export
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+
+EXPORT_EXPANDS = {"customer", "items"}
+CSV_COLUMNS = [
+    "order_id", "created_at", "total_amount", "customer_id", "first_name", "last_name",
+    "email", "phone", "address", "postal_code", "city", "country",
+    "product_id", "product_name", "quantity", "price",
+]
+
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+def _export_ndjson(db: Session):
+    """One OrderSummary (customer + items) per line."""
+    try:
+        for batch in iter_unprocessed_orders(db, EXPORT_BATCH_SIZE):
+            rows = project(batch, OrderSummary, ORDER_EXPANDS, EXPORT_EXPANDS, {"customer": NESTED_CUSTOMER})
+            yield "".join(json.dumps(row) + "\n" for row in rows)
+    finally:
+        db.close()
+
+
+def _export_csv(db: Session):
+    """One row per order line, customer shipping data repeated on each row."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    try:
+        yield buffer.getvalue()
+        for batch in iter_unprocessed_orders(db, EXPORT_BATCH_SIZE):
+            buffer.seek(0)
+            buffer.truncate()
+            for order in batch:
+                c = order.customer
+                customer = [
+                    order.customer_id, c.first_name, c.last_name, c.email, c.phone,
+                    c.address, c.postal_code, c.city, c.country,
+                ] if c else [order.customer_id] + [""] * 8
+                for item in order.items:
+                    writer.writerow([
+                        order.id, order.created_at.isoformat(), order.total_amount, *customer,
+                        item.product_id, item.product.name if item.product else "",
+                        item.quantity, item.price,
+                    ])
+            yield buffer.getvalue()
+    finally:
+        db.close()
+
+@router.get("/summary", response_model=StatisticsSummary, dependencies=[Depends(get_admin_claims)])
+def read_summary(db: Session = Depends(get_read_db)):
+    """
+    All dashboard counters in one request and one query (admin only).
+    Cached for STATS_SUMMARY_TTL seconds per worker.
+    """
+    summary = stats_cache.get("summary")
+    if summary is None:
+        summary = get_summary(db)
+        stats_cache.set("summary", summary)
+    return summary
+
+@router.get("/sales", response_model=List[SalesBucket], dependencies=[Depends(get_admin_claims)])
+def read_sales(
+    from_: date = Query(..., alias="from"),
+    to: Optional[date] = None,
+    granularity: Granularity = Granularity.day,
+    status: OrderStatus = OrderStatus.paid,
+    db: Session = Depends(get_read_db)
+):
+    """
+    Sales per day, week or month for the half-open range [from, to) (admin only).
+    `to` defaults to tomorrow (UTC), i.e. up to and including today.
+    """
+    if to is None:
+        to = datetime.now(timezone.utc).date() + timedelta(days=1)
+    if to <= from_:
+        raise HTTPException(status_code=400, detail="'to' must be after 'from'")
+    return get_sales_range(db, from_, to, granularity, status.value)
+
+@router.get("/sales/{year}", response_model=List[MonthlySales], dependencies=[Depends(get_admin_claims)])
+def read_monthly_sales(year: int, db: Session = Depends(get_read_db)):
     """
     Get total sales per month for a specific year (only paid orders) (admin only).
     """
     return get_monthly_sales(db, year)
 
+@router.get("/unprocessed_orders/export", dependencies=[Depends(get_current_admin)])
+def export_unprocessed_orders(format: ExportFormat = ExportFormat.ndjson, db: Session = Depends(get_read_db)):
+    """
+    Stream all paid, unshipped orders as NDJSON or CSV for the warehouse (admin only).
+    Orders are read in batches of EXPORT_BATCH_SIZE and sent as each batch is
+    ready, so memory stays flat and the first rows arrive right away.
+    """
+    # The body is produced after this function returns; the generators close
+    # the session when the stream ends (or the client disconnects)
+    if format == ExportFormat.csv:
+        return StreamingResponse(
+            _export_csv(db),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="unprocessed_orders.csv"'},
+        )
+    return StreamingResponse(_export_ndjson(db), media_type="application/x-ndjson")
+
 @router.get("/unprocessed_orders", response_model=List[UnprocessedOrder], dependencies=[Depends(get_current_admin)])
-def read_unprocessed_orders(db: Session = Depends(get_db)):
+def read_unprocessed_orders(expand: Optional[str] = None, db: Session = Depends(get_read_db)):
     """
     Get all orders that have been successfully paid but not yet shipped (admin only).
+    Pass ?expand=customer,items (or an empty ?expand=) for the slim OrderSummary shape.
     """
-    return get_unprocessed_orders(db)
+    expanded = parse_expand(expand, ORDER_EXPANDS)
+    orders = get_unprocessed_orders(db, expand=expanded)
+    if expanded is None:
+        return orders
+    return projected_response(orders, OrderSummary, ORDER_EXPANDS, expanded, {"customer": NESTED_CUSTOMER})
 
-@router.get("/total_users", response_model=CountResponse, dependencies=[Depends(get_current_admin)])
-def read_total_users(db: Session = Depends(get_db)):
+@router.get("/total_users", response_model=CountResponse, dependencies=[Depends(get_admin_claims)])
+def read_total_users(db: Session = Depends(get_read_db)):
     """
     Return total number of registered users (admin only).
     """
     count = get_total_users(db)
     return {"count": count}
 
-@router.get("/paid_unprocessed_count", response_model=CountResponse, dependencies=[Depends(get_current_admin)])
-def read_paid_unprocessed_count(db: Session = Depends(get_db)):
+@router.get("/paid_unprocessed_count", response_model=CountResponse, dependencies=[Depends(get_admin_claims)])
+def read_paid_unprocessed_count(db: Session = Depends(get_read_db)):
     """
     Return count of paid orders not yet processed (admin only).
     """
     count = get_paid_unprocessed_count(db)
     return {"count": count}
 
-@router.get("/total_orders", response_model=CountResponse, dependencies=[Depends(get_current_admin)])
-def read_total_orders(db: Session = Depends(get_db)):
+@router.get("/total_orders", response_model=CountResponse, dependencies=[Depends(get_admin_claims)])
+def read_total_orders(db: Session = Depends(get_read_db)):
     """
     Return total number of orders placed (admin only).
     """
     count = get_total_orders(db)
     return {"count": count}
 
-@router.get("/total_revenue", response_model=RevenueResponse, dependencies=[Depends(get_current_admin)])
-def read_total_revenue(db: Session = Depends(get_db)):
+@router.get("/total_revenue", response_model=RevenueResponse, dependencies=[Depends(get_admin_claims)])
+def read_total_revenue(db: Session = Depends(get_read_db)):
     """
     Return total revenue from paid orders (admin only).
     """
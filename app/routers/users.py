@@ -1,11 +1,14 @@
 # app/routers/users.py
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from .. import crud, schemas
+from ..projections import parse_expand, projected_response, USER_EXPANDS, NESTED_CUSTOMER
+from ..pagination import set_next_cursor, invalid_cursor
 from ..database import get_db
-from ..auth import get_current_admin, get_current_user
-from .. import models
+from ..auth import Principal, get_current_admin, get_current_user
+from ..passwords import hasher
 
 router = APIRouter(
     prefix="/users",
@@ -13,13 +16,17 @@ router = APIRouter(
 )
 
 @router.post("/", response_model=schemas.UserRead, status_code=status.HTTP_201_CREATED)
-def create_user(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
+async def create_user(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
     """Register a new user (admin or customer)"""
-    existing = crud.get_user_by_email(db, user_in.email)
-    if existing:
+    if await run_in_threadpool(crud.get_user_by_email, db, user_in.email):
         raise HTTPException(status_code=400, detail="Email already registered")
+    # bcrypt runs in the password process pool; the event loop just awaits it
+    hashed_password = await hasher.hash(user_in.password)
+    return await run_in_threadpool(_create_user, db, user_in, hashed_password)
+
+def _create_user(db: Session, user_in: schemas.UserCreate, hashed_password: str) -> schemas.UserRead:
     # Create the user
-    db_user = crud.create_user(db, user_in)
+    db_user = crud.create_user(db, user_in, hashed_password)
     # If customer role and shipping data provided, create customer profile
     if db_user.role == schemas.UserRole.customer.value and user_in.shipping:
         shipping = user_in.shipping
@@ -35,24 +42,44 @@ def create_user(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
             country=shipping.country
         )
         crud.create_customer(db, cust_in)
-    return db_user
+    # Serialize here so relationship loads do not run on the event loop
+    return schemas.UserRead.model_validate(db_user)
 
 @router.get("/", response_model=List[schemas.UserRead], dependencies=[Depends(get_current_admin)])
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Admin: list all users"""
-    return crud.get_users(db, skip=skip, limit=limit)
+def read_users(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    role: Optional[schemas.UserRole] = None,
+    db: Session = Depends(get_db)
+):
+    """Admin: list all users (skip/limit or ?cursor= from the X-Next-Cursor header)"""
+    try:
+        users = crud.get_users(db, skip=skip, limit=limit, cursor=cursor, role=role.value if role else None)
+    except ValueError as e:
+        raise invalid_cursor(e)
+    set_next_cursor(response, users, limit)
+    return users
 
 @router.get("/me", response_model=schemas.UserRead)
 def read_current_user(
+    expand: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
-    """Retrieve profile of the current authenticated user, including shipping/customer data"""
+    """
+    Retrieve profile of the current authenticated user, including shipping/customer data.
+    Pass ?expand=customer (or an empty ?expand=) for the slim UserSummary shape.
+    """
+    expanded = parse_expand(expand, USER_EXPANDS)
     # Load fresh user with relationships
-    db_user = crud.get_user(db, current_user.id)
+    db_user = crud.get_user(db, current_user.id, expand=expanded)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
-    return db_user
+    if expanded is None:
+        return db_user
+    return projected_response(db_user, schemas.UserSummary, USER_EXPANDS, expanded, {"customer": NESTED_CUSTOMER})
 
 @router.get("/{user_id}", response_model=schemas.UserRead, dependencies=[Depends(get_current_admin)])
 def read_user(user_id: int, db: Session = Depends(get_db)):
@@ -63,12 +90,21 @@ def read_user(user_id: int, db: Session = Depends(get_db)):
     return db_user
 
 @router.put("/{user_id}", response_model=schemas.UserRead, dependencies=[Depends(get_current_admin)])
-def update_user(user_id: int, user_in: schemas.UserCreate, db: Session = Depends(get_db)):
+async def update_user(user_id: int, user_in: schemas.UserCreate, db: Session = Depends(get_db)):
     """Admin: update existing user"""
-    db_user = crud.update_user(db, user_id, user_in)
-    if not db_user:
+    # Look the user up first, so a 404 does not take a slot in the password pool
+    if not await run_in_threadpool(crud.get_user, db, user_id):
         raise HTTPException(status_code=404, detail="User not found")
-    return db_user
+    hashed_password = await hasher.hash(user_in.password)
+
+    def _update():
+        db_user = crud.update_user(db, user_id, user_in, hashed_password)
+        return schemas.UserRead.model_validate(db_user) if db_user else None
+
+    user = await run_in_threadpool(_update)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(get_current_admin)])
 def delete_user(user_id: int, db: Session = Depends(get_db)):
@@ -1,8 +1,9 @@
 # app/schemas.py
 
-from datetime import datetime
+import os
+from datetime import date, datetime
 from typing import Any, Dict, List, Optional
-from pydantic import BaseModel, EmailStr, ConfigDict  # add ConfigDict import
+from pydantic import BaseModel, EmailStr, ConfigDict, Field  # add ConfigDict import
 from enum import Enum  # new import
 
 # Define order status enum
@@ -14,6 +15,12 @@ class OrderStatus(str, Enum):
     refunded = "refunded"
 
 
+class ReservationState(str, Enum):
+    active = "active"  # held by a pending order until expires_at
+    committed = "committed"  # taken from stock when the order was paid
+    released = "released"  # given back (expired or canceled)
+
+
 # ==========================
 # CRM-schemas
 # ==========================
@@ -65,6 +72,7 @@ class ProductBase(BaseModel):
     description: Optional[str] = None
     price: float
     stock: int
+    sku: Optional[str] = None  # supplier/article number, unique when set
 
 
 class ProductCreate(ProductBase):
@@ -73,7 +81,10 @@ class ProductCreate(ProductBase):
 
 class ProductRead(ProductBase):
     id: int
+    reserved: int = 0  # held by pending orders
+    available: int  # stock - reserved
     thumbnail_url: Optional[str] = None
+    main_image_url: Optional[str] = None
     created_at: datetime
 
     model_config = ConfigDict(from_attributes=True)
@@ -123,6 +134,7 @@ class OrderRead(OrderBase):
     id: int
     total_amount: float
     status: OrderStatus  # constrained to valid statuses
+    refund_required: bool = False
     created_at: datetime
     items: List[OrderItemRead]
     customer: CustomerRead  # Include customer details
@@ -141,6 +153,7 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     username: Optional[str] = None
     role: Optional[str] = None
+    version: int = 0  # "ver" claim, must match User.token_version
 
 
 # ==========================
@@ -152,6 +165,11 @@ class UserRole(str, Enum):
     user = "user"
 
 
+class AccountState(str, Enum):
+    active = "active"
+    invite_pending = "invite_pending"  # created by an admin/import, no password yet
+
+
 # ==========================
 # Shipping Information schema
 # ==========================
@@ -183,12 +201,52 @@ class UserCreate(UserBase):
 class UserRead(UserBase):
     id: int
     created_at: datetime
+    account_state: AccountState = AccountState.active
     # Include linked customer/shipping profile when available
     customer: Optional[CustomerRead] = None
 
     model_config = ConfigDict(from_attributes=True)
 
 
+# ==========================
+# Slim projections (?expand=)
+# ==========================
+# Non-recursive response shapes used when a client passes ?expand=. Only the
+# scalar columns are always present; relationships are included only when
+# named in expand, and a nested customer never drags in its order history.
+
+class OrderHeader(BaseModel):
+    id: int
+    customer_id: Optional[int] = None
+    total_amount: float
+    status: OrderStatus
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class CustomerSummary(CustomerBase):
+    id: int
+    created_at: datetime
+    notes: List[CRMNoteRead] = []
+    orders: List[OrderHeader] = []
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class OrderSummary(OrderHeader):
+    items: List[OrderItemRead] = []
+    customer: Optional[CustomerSummary] = None
+
+
+class UserSummary(UserBase):
+    id: int
+    created_at: datetime
+    customer: Optional[CustomerSummary] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 # ==========================
 # Statistics schemas
 # ==========================
@@ -197,6 +255,19 @@ class MonthlySales(BaseModel):
     total: float
 
 
+class Granularity(str, Enum):
+    day = "day"
+    week = "week"
+    month = "month"
+
+
+class SalesBucket(BaseModel):
+    period_start: date  # first day of the day/week (Monday)/month bucket
+    order_count: int
+    revenue: float
+    item_count: int
+
+
 class UnprocessedOrder(  # for clarity, reuse OrderRead schema for full order data
     BaseModel
 ):
@@ -211,6 +282,65 @@ class UnprocessedOrder(  # for clarity, reuse OrderRead schema for full order da
     model_config = ConfigDict(from_attributes=True)
 
 
+class ImportRowError(BaseModel):
+    row: int  # 0-based position in the submitted batch
+    error: str
+
+
+class ImportResult(BaseModel):
+    created: int
+    updated: int = 0
+    errors: List[ImportRowError] = []
+
+
+class StockLevel(BaseModel):
+    """One row of a stock import: absolute level for a product by id or SKU."""
+    product_id: Optional[int] = None
+    sku: Optional[str] = None
+    stock: int
+
+
+class StockBatchItem(BaseModel):
+    """One line of a stock batch: either a delta or an absolute level, by product id or SKU."""
+    product_id: Optional[int] = None
+    sku: Optional[str] = None
+    delta: Optional[int] = None
+    stock: Optional[int] = None
+
+
+# Max lines per POST /products/stock/batch (all of them are locked in one transaction)
+STOCK_BATCH_MAX_ITEMS = int(os.getenv("STOCK_BATCH_MAX_ITEMS", "1000"))
+
+
+class StockBatch(BaseModel):
+    items: List[StockBatchItem] = Field(max_length=STOCK_BATCH_MAX_ITEMS)
+    # Roll the whole batch back if any item fails
+    all_or_nothing: bool = False
+
+
+class StockBatchStatus(str, Enum):
+    ok = "ok"
+    not_found = "not_found"
+    insufficient_stock = "insufficient_stock"
+    invalid = "invalid"
+    rolled_back = "rolled_back"
+
+
+class StockBatchItemResult(BaseModel):
+    index: int
+    product_id: Optional[int] = None
+    status: StockBatchStatus
+    stock: Optional[int] = None
+    error: Optional[str] = None
+
+
+class StockBatchResult(BaseModel):
+    applied: int
+    failed: int
+    committed: bool
+    results: List[StockBatchItemResult]
+
+
 class StockUpdate(BaseModel):
     """
     Model for adjusting product stock (positive or negative quantity).
@@ -227,6 +357,13 @@ class RevenueResponse(BaseModel):
     total: float
 
 
+class StatisticsSummary(BaseModel):
+    total_users: int
+    total_orders: int
+    total_revenue: float
+    paid_unprocessed_count: int
+
+
 # ==========================
 # Product Image schemas
 # ==========================
@@ -269,6 +406,31 @@ class VippsPaymentResponse(BaseModel):
 class VippsCallback(BaseModel):
     transactionStatus: str
     orderId: Optional[str] = None
+    transactionId: Optional[str] = None
+
+
+class PaymentEvent(BaseModel):
+    """One webhook delivery, normalized across providers."""
+    provider: str
+    event_id: str
+    event_type: Optional[str] = None
+    order_id: Optional[int] = None
+    status: Optional[OrderStatus] = None  # None: event does not change the order
+
+
+class WebhookResult(str, Enum):
+    applied = "applied"
+    duplicate = "duplicate"  # already in the ledger
+    ignored = "ignored"  # no change, or a transition that would move the order backwards
+    needs_refund = "needs_refund"  # late payment for a canceled order whose units are gone
+    not_found = "not_found"
+
+
+class InboxState(str, Enum):
+    pending = "pending"  # waiting for a webhook worker
+    processing = "processing"  # claimed by a worker
+    done = "done"
+    failed = "failed"  # unparseable, or gave up after WEBHOOK_MAX_ATTEMPTS
 
 
 class VippsInitiateRequest(BaseModel):
@@ -0,0 +1,79 @@
+# benchmarks/bulk_import.py
+
+"""
+Throughput of the bulk import paths compared with one API-style call per row.
+
+Imports N synthetic products (upsert by SKU, then again as pure updates),
+N customers (invite-pending users, no bcrypt) and N stock levels, and times
+a sample of per-row crud.create_product calls for comparison.
+
+Usage:
+    python -m benchmarks.bulk_import --rows 50000
+    python -m benchmarks.bulk_import --url mysql+pymysql://user:pw@host/bench_db
+
+Never point --url at a real database: the tables are dropped and recreated.
+"""
+
+import argparse
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, schemas
+from app.database import Base
+from app.crud.bulk import import_in_chunks
+
+
+def report(name: str, rows: int, seconds: float) -> None:
+    print(f"{name:<28} {rows:>8} rows  {seconds:7.2f} s  {rows / seconds:10.0f} rows/s")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bulk_import")
+    parser.add_argument("--url", default="sqlite:///bench_import.sqlite")
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--single", type=int, default=500, help="rows for the per-row baseline")
+    args = parser.parse_args(argv)
+
+    engine = create_engine(args.url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine, autoflush=False)()
+
+    products = [
+        (i, schemas.ProductCreate(sku=f"SKU-{i}", name=f"Produkt {i}", price=10 + i % 90, stock=i % 50))
+        for i in range(args.rows)
+    ]
+    t0 = time.perf_counter()
+    for _, product in products[:args.single]:
+        crud.create_product(db, product.model_copy(update={"sku": f"single-{product.sku}"}))
+    report("create_product (per row)", args.single, time.perf_counter() - t0)
+
+    seen = set()
+    t0 = time.perf_counter()
+    import_in_chunks(products, lambda chunk: crud.import_product_chunk(db, chunk, seen))
+    report("products import (insert)", args.rows, time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    import_in_chunks(products, lambda chunk: crud.import_product_chunk(db, chunk, set()))
+    report("products import (upsert)", args.rows, time.perf_counter() - t0)
+
+    levels = [(i, schemas.StockLevel(sku=f"SKU-{i}", stock=i % 7)) for i in range(args.rows)]
+    t0 = time.perf_counter()
+    import_in_chunks(levels, lambda chunk: crud.import_stock_chunk(db, chunk))
+    report("stock import", args.rows, time.perf_counter() - t0)
+
+    customers = [
+        schemas.CustomerCreate(first_name="Kunde", last_name=str(i), email=f"kunde{i}@example.com")
+        for i in range(args.rows)
+    ]
+    t0 = time.perf_counter()
+    crud.import_customers(db, customers)
+    report("customers import", args.rows, time.perf_counter() - t0)
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# benchmarks/statistics_ranges.py
+
+"""
+Compare the old extract()-based statistics query with the half-open range
+query on ix_orders_status_created_at and with the sales_daily rollup.
+
+Fills a scratch database with synthetic orders, then prints the query plan
+and the median time of each variant.
+
+Usage:
+    python -m benchmarks.statistics_ranges --orders 3000000
+    python -m benchmarks.statistics_ranges --url mysql+pymysql://user:pw@host/bench_db
+
+Never point --url at a real database: the tables are dropped and recreated.
+"""
+
+import argparse
+import random
+import statistics
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import create_engine, extract, func, insert, select, text
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import Base
+from app.crud.sales import rebuild_sales_daily
+from app.crud.statistics import get_sales_range
+from app.schemas import Granularity
+
+TABLES = [
+    models.User.__table__,
+    models.Customer.__table__,
+    models.Order.__table__,
+    models.OrderItem.__table__,
+    models.SalesDaily.__table__,
+]
+STATUSES = ["pending", "paid", "paid", "paid", "shipped", "canceled", "refunded"]
+
+
+def populate(engine, n_orders: int, years: int, chunk: int = 20_000) -> None:
+    Base.metadata.drop_all(engine, tables=TABLES)
+    Base.metadata.create_all(engine, tables=TABLES)
+    start = datetime(date.today().year - years + 1, 1, 1)
+    span = int(timedelta(days=365 * years).total_seconds())
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        for offset in range(0, n_orders, chunk):
+            rows = [
+                {
+                    "customer_id": None,
+                    "total_amount": round(rng.uniform(20, 2000), 2),
+                    "status": rng.choice(STATUSES),
+                    "created_at": start + timedelta(seconds=rng.randrange(span)),
+                }
+                for _ in range(min(chunk, n_orders - offset))
+            ]
+            conn.execute(insert(models.Order.__table__), rows)
+
+
+def explain(engine, stmt) -> str:
+    sql = str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    with engine.connect() as conn:
+        return "\n".join("  " + " | ".join(str(v) for v in row) for row in conn.execute(text(prefix + sql)))
+
+
+def timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.statistics_ranges")
+    parser.add_argument("--url", default="sqlite:///bench_statistics.sqlite")
+    parser.add_argument("--orders", type=int, default=2_000_000)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--skip-populate", action="store_true")
+    args = parser.parse_args(argv)
+
+    engine = create_engine(args.url)
+    if not args.skip_populate:
+        t0 = time.perf_counter()
+        populate(engine, args.orders, args.years)
+        print(f"Inserted {args.orders} orders in {time.perf_counter() - t0:.1f}s")
+
+    year = date.today().year
+    month = extract("month", models.Order.created_at).label("month")
+    total = func.sum(models.Order.total_amount)
+    legacy = (
+        select(month, total)
+        .where(extract("year", models.Order.created_at) == year, models.Order.status == "paid")
+        .group_by(month)
+    )
+    ranged = (
+        select(month, total)
+        .where(
+            models.Order.status == "paid",
+            models.Order.created_at >= datetime(year, 1, 1),
+            models.Order.created_at < datetime(year + 1, 1, 1),
+        )
+        .group_by(month)
+    )
+
+    with Session(engine) as db:
+        t0 = time.perf_counter()
+        rebuild_sales_daily(db)
+        print(f"Rebuilt sales_daily in {time.perf_counter() - t0:.1f}s\n")
+
+        for name, stmt in (("extract(year) + status", legacy), ("half-open range", ranged)):
+            print(f"{name}:\n{explain(engine, stmt)}")
+            print(f"  median {timed(lambda: db.execute(stmt).all(), args.repeat):.1f} ms\n")
+
+        rollup = lambda: get_sales_range(db, date(year, 1, 1), date(year + 1, 1, 1), Granularity.month)
+        print(f"sales_daily rollup:\n  median {timed(rollup, args.repeat):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
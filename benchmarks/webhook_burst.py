@@ -0,0 +1,124 @@
+# benchmarks/webhook_burst.py
+
+"""
+Simulated payment-webhook burst: acknowledge time versus apply time.
+
+Creates N pending orders, then fires a burst of Stripe/Vipps deliveries for
+them from several threads (payments, late expiries and redeliveries) through
+crud.enqueue_webhook, the same call the webhook endpoints make. A pool of
+PeriodicWorkers runs drain_webhook_inbox meanwhile, as in the API process.
+Reports enqueue latency, time until the inbox is empty, and checks that
+every order ended up paid exactly once.
+
+Usage:
+    python -m benchmarks.webhook_burst --orders 2000 --workers 4
+    python -m benchmarks.webhook_burst --url mysql+pymysql://user:pw@host/bench_db
+
+Never point --url at a real database: the tables are dropped and recreated.
+"""
+
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models, schemas
+from app.background import PeriodicWorker
+from app.database import Base
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.webhook_burst")
+    parser.add_argument("--url", default="sqlite:///bench_webhooks.sqlite")
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--senders", type=int, default=16, help="threads delivering webhooks")
+    parser.add_argument("--workers", type=int, default=2, help="webhook workers draining the inbox")
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    connect_args = {"check_same_thread": False, "timeout": 30} if args.url.startswith("sqlite") else {}
+    engine = create_engine(args.url, connect_args=connect_args, pool_size=args.senders + args.workers)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    db = Session()
+    product_id = crud.create_product(db, schemas.ProductCreate(name="Burst", price=100, stock=args.orders)).id
+    customer = crud.create_customer(db, schemas.CustomerCreate(first_name="Burst", last_name="Test", email="burst@example.com"))
+    order_ids = [
+        crud.create_order(db, schemas.OrderCreate(
+            customer_id=customer.id, items=[schemas.OrderItemCreate(product_id=product_id, quantity=1)]
+        )).id
+        for _ in range(args.orders)
+    ]
+    db.close()
+
+    # Payment, late expiry and Vipps settle per order, each delivered twice, shuffled
+    def stripe(event_id, event_type, order_id):
+        event = {"id": event_id, "type": event_type, "data": {"object": {"metadata": {"order_id": str(order_id)}}}}
+        return crud.stripe_payment_event(event), json.dumps(event)
+
+    def vipps(order_id, status):
+        callback = schemas.VippsCallback(transactionStatus=status)
+        return crud.vipps_payment_event(order_id, callback), crud.vipps_payload(order_id, callback)
+
+    deliveries = []
+    for order_id in order_ids:
+        deliveries += [
+            stripe(f"pay-{order_id}", "checkout.session.completed", order_id),
+            stripe(f"exp-{order_id}", "checkout.session.expired", order_id),
+            vipps(order_id, "SETTLED"),
+        ]
+    deliveries *= 2
+    random.shuffle(deliveries)
+
+    workers = [
+        PeriodicWorker(f"bench-webhook-{i}", 0.05, lambda: crud.drain_webhook_inbox(Session, args.batch_size))
+        for i in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    local = threading.local()
+    latencies = []
+
+    def deliver(delivery):
+        if not hasattr(local, "db"):
+            local.db = Session()
+        t0 = time.perf_counter()
+        crud.enqueue_webhook(local.db, *delivery)
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.senders) as pool:
+        list(pool.map(deliver, deliveries))
+    acked = time.perf_counter() - started
+
+    db = Session()
+    while crud.inbox_counts(db)[schemas.InboxState.done.value] < len(order_ids) * 3:
+        db.rollback()
+        time.sleep(0.05)
+    drained = time.perf_counter() - started
+    for worker in workers:
+        worker.stop()
+
+    latencies.sort()
+    print(f"deliveries         {len(deliveries):>8}")
+    print(f"acknowledged in    {acked:8.2f} s  ({len(deliveries) / acked:,.0f}/s)")
+    print(f"enqueue p50 / p99  {statistics.median(latencies):8.2f} / {latencies[int(len(latencies) * 0.99)]:.2f} ms")
+    print(f"inbox drained in   {drained:8.2f} s")
+    print(f"inbox              {crud.inbox_counts(db)}")
+    paid = db.scalar(select(func.count()).where(models.Order.status == schemas.OrderStatus.paid.value))
+    product = db.get(models.Product, product_id)
+    print(f"orders paid        {paid} / {len(order_ids)}; stock {product.stock}, reserved {product.reserved}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
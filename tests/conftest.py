@@ -2,12 +2,19 @@
 
 import os
 import pytest
+
+# No background reservation sweeper in tests; they call crud.expire_reservations directly
+os.environ.setdefault("RESERVATION_SWEEP_INTERVAL", "0")
+# Same for the webhook workers; tests drain the inbox with crud.drain_webhook_inbox
+os.environ.setdefault("WEBHOOK_WORKER_INTERVAL", "0")
+
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool  # use StaticPool for in-memory DB persistence
 
-from app.database import Base, get_db
+from app.database import Base, get_db, get_read_db
+from app.cache import clear_caches
 from app.main import app as fastapi_app
 # Import models so Base.metadata knows all tables (alias to avoid shadowing 'app')
 import app.models as _models
@@ -46,6 +53,7 @@ Base.metadata.create_all(bind=engine_test)
 
 # Override dependency i FastAPI (get_db) med vår override_get_db
 fastapi_app.dependency_overrides[get_db] = override_get_db
+fastapi_app.dependency_overrides[get_read_db] = override_get_db
 
 @pytest.fixture(scope="session")
 def client():
@@ -61,6 +69,8 @@ def client():
 def reset_database():
     Base.metadata.drop_all(bind=engine_test)
     Base.metadata.create_all(bind=engine_test)
+    # In-process caches must not leak rows between tests
+    clear_caches()
     # Seed default admin with valid email for test database
     ADMIN_EMAIL = os.getenv("ADMIN_EMAIL", "admin")
     from app.models import User
@@ -73,6 +83,20 @@ def reset_database():
     db.close()
     yield
 
+@pytest.fixture
+def query_counter():
+    """
+    Record every SQL statement sent to the test database while the fixture is active.
+    """
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine_test, "before_cursor_execute", _record)
+    yield statements
+    event.remove(engine_test, "before_cursor_execute", _record)
+
 @pytest.fixture(scope="session")
 def admin_token(client):
     # Obtain JWT for admin user
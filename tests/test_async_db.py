@@ -0,0 +1,73 @@
+# tests/test_async_db.py
+
+import pytest
+
+pytest.importorskip("aiosqlite")
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app import crud
+from app.database import get_async_db
+from app.main import app as fastapi_app
+
+
+@pytest.fixture
+def async_db():
+    """
+    Route the async read path to the same SQLite file as the sync test engine.
+    """
+    engine = create_async_engine("sqlite+aiosqlite:///testdb.sqlite", poolclass=NullPool)
+    session_local = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with session_local() as session:
+            yield session
+
+    fastapi_app.dependency_overrides[get_async_db] = override_get_async_db
+    yield
+    fastapi_app.dependency_overrides.pop(get_async_db, None)
+
+
+def _no_sync(*args, **kwargs):
+    raise AssertionError("sync crud used while the async session is available")
+
+
+def test_hot_reads_use_async_session(client, admin_headers, async_db, monkeypatch):
+    product = client.post(
+        "/products/",
+        json={"name": "Async", "description": "", "price": 10.0, "stock": 3},
+        headers=admin_headers,
+    ).json()
+    customer = client.post(
+        "/customers/",
+        json={"first_name": "A", "last_name": "B", "email": "async@example.com",
+              "phone": "1", "address": "x", "postal_code": "1", "city": "y", "country": "NO"},
+        headers=admin_headers,
+    ).json()
+    order = client.post(
+        "/orders/",
+        json={"customer_id": customer["id"], "items": [{"product_id": product["id"], "quantity": 1}]},
+        headers=admin_headers,
+    )
+    assert order.status_code == 201
+    order_id = order.json()["id"]
+
+    monkeypatch.setattr(crud, "get_products", _no_sync)
+    monkeypatch.setattr(crud, "get_product", _no_sync)
+    monkeypatch.setattr(crud, "get_orders", _no_sync)
+    monkeypatch.setattr(crud, "get_order", _no_sync)
+
+    response = client.get("/products/")
+    assert response.status_code == 200
+    assert [p["id"] for p in response.json()] == [product["id"]]
+
+    assert client.get(f"/products/{product['id']}").json()["available"] == 2
+
+    response = client.get("/orders/", headers=admin_headers)
+    assert response.status_code == 200
+    assert [o["id"] for o in response.json()] == [order_id]
+
+    response = client.get(f"/orders/{order_id}", headers=admin_headers)
+    assert response.status_code == 200
+    assert response.json()["items"][0]["product_id"] == product["id"]
@@ -68,3 +68,74 @@ def test_delete_customer(client, admin_headers):
     # Bekreft at kunden er borte
     response = client.get(f"/customers/{customer_id}", headers=admin_headers)
     assert response.status_code == 404
+
+
+def test_list_customers_expand_projection(client, admin_headers):
+    customer_id, payload = create_customer(client, admin_headers)
+    response = client.get("/customers/", params={"expand": "notes"}, headers=admin_headers)
+    assert response.status_code == 200
+    customer = next(c for c in response.json() if c["id"] == customer_id)
+    assert customer["email"] == payload["email"]
+    assert customer["notes"] == []
+    assert "orders" not in customer
+
+
+def test_admin_created_customer_is_invite_pending(client, admin_headers, monkeypatch):
+    from app.passwords import hasher
+
+    def no_bcrypt(*args):
+        raise AssertionError("customer creation must not hash a password")
+
+    monkeypatch.setattr(hasher, "hash_sync", no_bcrypt)
+    customer_id, payload = create_customer(client, admin_headers)
+
+    users = client.get("/users/", headers=admin_headers).json()
+    user = next(u for u in users if u["email"] == payload["email"])
+    assert user["account_state"] == "invite_pending"
+    # No password yet: login is impossible
+    resp = client.post("/token", data={"username": payload["email"], "password": ""})
+    assert resp.status_code in (401, 422)
+
+
+def test_import_customers(client, admin_headers, monkeypatch):
+    from app.passwords import hasher
+
+    monkeypatch.setattr(hasher, "hash_sync", lambda *a: pytest.fail("import must not hash passwords"))
+    existing_id, existing = create_customer(client, admin_headers)
+    rows = [
+        {"first_name": f"Kunde{i}", "last_name": "Import", "email": f"import{i}@example.com", "city": "Bergen"}
+        for i in range(5)
+    ]
+    rows.append({"first_name": "Dup", "last_name": "Batch", "email": "import0@example.com"})
+    rows.append({**existing, "first_name": "Dup"})
+
+    resp = client.post("/customers/import", json=rows, headers=admin_headers)
+    assert resp.status_code == 200
+    result = resp.json()
+    assert result["created"] == 5
+    assert [e["row"] for e in result["errors"]] == [5, 6]
+
+    customers = client.get("/customers/", params={"expand": ""}, headers=admin_headers).json()
+    assert {c["email"] for c in customers} == {existing["email"]} | {r["email"] for r in rows[:5]}
+    users = client.get("/users/", headers=admin_headers).json()
+    imported = [u for u in users if u["email"].startswith("import")]
+    assert len(imported) == 5
+    assert all(u["account_state"] == "invite_pending" for u in imported)
+
+
+def test_import_customers_file(client, admin_headers):
+    body = (
+        "first_name,last_name,email,city\n"
+        "Kari,Nordmann,kari@example.com,Oslo\n"
+        "Per,Hansen,ikke-en-epost,Bergen\n"
+        "Kari,Igjen,kari@example.com,Oslo\n"
+    )
+    resp = client.post(
+        "/customers/import/file",
+        files={"file": ("customers.csv", body, "text/csv")},
+        headers=admin_headers,
+    )
+    assert resp.status_code == 200
+    result = resp.json()
+    assert result["created"] == 1
+    assert [e["row"] for e in result["errors"]] == [1, 2]
@@ -0,0 +1,86 @@
+# tests/test_logging.py
+
+import io
+import json
+import logging
+
+from app import logconfig
+from app.logconfig import JsonFormatter, log_event, redact
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def make_logger(name, level=logging.INFO):
+    logger = logging.getLogger(name)
+    logger.handlers = [ListHandler()]
+    logger.propagate = False
+    logger.setLevel(level)
+    return logger, logger.handlers[0]
+
+
+def test_redact_masks_secret_keys_and_tokens():
+    headers = {
+        "Authorization": "Bearer abc.def",
+        "client_secret": "s3cret",
+        "Ocp-Apim-Subscription-Key": "key",
+        "Content-Type": "application/json",
+    }
+    assert redact(headers) == {
+        "Authorization": "***",
+        "client_secret": "***",
+        "Ocp-Apim-Subscription-Key": "***",
+        "Content-Type": "application/json",
+    }
+    body = '{"token_type": "Bearer", "access_token": "eyJ0eXAi", "expires_in": "3600"}'
+    assert "eyJ0eXAi" not in redact(body)
+    assert redact("failed with Bearer eyJ0eXAi.x.y") == "failed with Bearer ***"
+
+
+def test_success_events_are_sampled(monkeypatch):
+    logger, handler = make_logger("test.sampled")
+    monkeypatch.setattr(logconfig, "LOG_SUCCESS_SAMPLE_RATE", 0.0)
+    for _ in range(20):
+        log_event(logger, logging.INFO, "payment_created", sample=True, order_id=1)
+    log_event(logger, logging.WARNING, "payment_failed", order_id=2)
+    assert [r.getMessage() for r in handler.records] == ["payment_failed"]
+
+    monkeypatch.setattr(logconfig, "LOG_SUCCESS_SAMPLE_RATE", 1.0)
+    log_event(logger, logging.INFO, "payment_created", sample=True, order_id=3)
+    assert handler.records[-1].fields == {"order_id": 3}
+
+
+def test_disabled_level_builds_no_record():
+    logger, handler = make_logger("test.quiet", level=logging.WARNING)
+    log_event(logger, logging.INFO, "token_fetched", token="never-logged")
+    assert handler.records == []
+
+
+def test_json_formatter_writes_one_redacted_line():
+    logger, handler = make_logger("test.json")
+    log_event(logger, logging.WARNING, "vipps.token_failed", status=401, headers={"client_secret": "x"})
+    line = JsonFormatter().format(handler.records[0])
+    entry = json.loads(line)
+    assert entry["event"] == "vipps.token_failed"
+    assert entry["status"] == 401
+    assert entry["headers"] == {"client_secret": "***"}
+
+
+def test_vipps_client_does_not_print(monkeypatch, capsys):
+    from tests.test_vipps_client import FakeSession
+    from app.integrations import vipps
+
+    monkeypatch.setattr(vipps, "VIPPS_CLIENT_ID", "id")
+    monkeypatch.setattr(vipps, "VIPPS_CLIENT_SECRET", "very-secret")
+    monkeypatch.setattr(vipps, "VIPPS_APIM_SUBSCRIPTION_KEY", "key")
+    client = vipps.VippsClient(session=FakeSession())
+    client.create_payment(order_id=1, amount=100.0, callback_url="https://app/cb")
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert "very-secret" not in captured.err
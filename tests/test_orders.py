@@ -80,3 +80,61 @@ def test_delete_order(client, admin_headers, user_headers):
     # Verify deletion
     response = client.get(f"/orders/{order_id}", headers=user_headers)
     assert response.status_code == 404
+
+
+def test_list_orders_uses_bounded_number_of_queries(client, user_headers, admin_headers, query_counter):
+    # Two customers with several multi-line orders each
+    product_ids = [create_product(client, admin_headers) for _ in range(3)]
+    customer_ids = [create_customer(client, admin_headers) for _ in range(2)]
+
+    def place_orders(count):
+        for i in range(count):
+            payload = {
+                "customer_id": customer_ids[i % 2],
+                "items": [{"product_id": pid, "quantity": 1} for pid in product_ids],
+            }
+            response = client.post("/orders/", json=payload, headers=user_headers)
+            assert response.status_code == 201
+
+    place_orders(2)
+    query_counter.clear()
+    response = client.get("/orders/", headers=user_headers)
+    assert response.status_code == 200
+    small_page = len(query_counter)
+
+    place_orders(4)
+    query_counter.clear()
+    response = client.get("/orders/", headers=user_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) == 6
+    assert all(len(order["items"]) == 3 for order in data)
+    assert all(order["customer"]["orders"] for order in data)
+    # Query count depends on the response shape, not on the number of rows
+    assert len(query_counter) == small_page
+    assert len(query_counter) <= 10
+
+
+def test_list_orders_expand_projection(client, user_headers, admin_headers):
+    order_id, customer_id, product_id = create_order(client, user_headers, admin_headers)
+
+    # Empty expand: scalar columns only
+    response = client.get("/orders/", params={"expand": ""}, headers=user_headers)
+    assert response.status_code == 200
+    order = next(o for o in response.json() if o["id"] == order_id)
+    assert order["customer_id"] == customer_id
+    assert order["total_amount"] == 100.00
+    assert "items" not in order
+    assert "customer" not in order
+
+    # Expanded customer is a summary without order history or notes
+    response = client.get(f"/orders/{order_id}", params={"expand": "customer,items"}, headers=user_headers)
+    assert response.status_code == 200
+    order = response.json()
+    assert order["items"][0]["product_id"] == product_id
+    assert order["customer"]["id"] == customer_id
+    assert "orders" not in order["customer"]
+    assert "notes" not in order["customer"]
+
+    response = client.get("/orders/", params={"expand": "bogus"}, headers=user_headers)
+    assert response.status_code == 400
@@ -0,0 +1,55 @@
+# tests/test_payment_offload.py
+
+import threading
+
+import anyio
+import pytest
+
+from app.integrations.offload import PaymentProviderBusy, ProviderPool
+
+
+def test_provider_pool_bounds_concurrency_and_rejects_overflow():
+    pool = ProviderPool("slow", max_concurrency=2, max_waiting=1)
+    release = threading.Event()
+    running = []
+
+    def call(i):
+        running.append(i)
+        release.wait(5)
+        return i
+
+    results, rejected = [], []
+
+    async def caller(i):
+        try:
+            results.append(await pool.run(call, i))
+        except PaymentProviderBusy:
+            rejected.append(i)
+
+    async def main():
+        async with anyio.create_task_group() as tg:
+            for i in range(5):
+                tg.start_soon(caller, i)
+                await anyio.sleep(0.05)
+            # 2 running, 1 queued, the rest rejected without waiting
+            assert len(running) == 2
+            assert pool.stats()["waiting"] == 1
+            release.set()
+
+    anyio.run(main)
+    assert sorted(results) == [0, 1, 2]
+    assert rejected == [3, 4]
+    stats = pool.stats()
+    assert (stats["completed"], stats["rejected"], stats["in_flight"]) == (3, 2, 0)
+
+
+def test_provider_pool_propagates_errors():
+    pool = ProviderPool("failing", max_concurrency=1, max_waiting=0)
+
+    def boom():
+        raise ValueError("provider down")
+
+    with pytest.raises(ValueError):
+        anyio.run(pool.run, boom)
+    stats = pool.stats()
+    assert (stats["completed"], stats["failed"]) == (0, 1)
@@ -0,0 +1,56 @@
+# tests/test_pool.py
+
+import pytest
+from sqlalchemy import create_engine, exc, text
+
+from app.dbpool import InstrumentedQueuePool, install_idle_ping, pool_stats
+from app.routers import admin
+from tests.conftest import engine_test
+
+
+def test_pool_stats_endpoint(client, admin_headers, headers):
+    assert client.get("/admin/pool", headers=headers).status_code in (401, 403)
+    response = client.get("/admin/pool", headers=admin_headers)
+    assert response.status_code == 200
+    assert "pool" in response.json()
+    assert "replica" not in response.json()
+
+
+def test_pool_stats_include_replica(client, admin_headers, monkeypatch):
+    monkeypatch.setattr(admin, "replica_engine", engine_test)
+    stats = client.get("/admin/pool", headers=admin_headers).json()
+    assert stats["replica"]["pool"] == type(engine_test.pool).__name__
+
+
+def test_instrumented_pool_records_waits_and_timeouts(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.sqlite'}",
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05,
+    )
+    install_idle_ping(engine, idle_seconds=0)
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            stats = pool_stats(engine)
+            assert stats["checked_out"] == 1
+            assert stats["connect"]["count"] == 1
+
+            # Pool exhausted: the second checkout waits pool_timeout and fails
+            with pytest.raises(exc.TimeoutError):
+                engine.connect()
+
+        # Returned connection is reused, pinged because it has been idle
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+        stats = pool_stats(engine)
+        assert stats["timeouts"] == 1
+        assert stats["checkout_wait"]["count"] == 3
+        assert stats["connect"]["count"] == 1
+        assert stats["pings"] == 1
+        assert stats["checked_out"] == 0
+    finally:
+        engine.dispose()
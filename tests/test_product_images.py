@@ -82,3 +82,60 @@ def test_upload_image_invalid_product(client, admin_headers):
     files = {"file": ("test4.png", b"data", "image/png")}
     r = client.post(f"/products/9999/images", files=files, headers=admin_headers)
     assert r.status_code == 404
+
+
+def test_list_images_conditional_request(client, admin_headers):
+    product_id = create_product(client, admin_headers)
+    files = {"file": ("etag.png", b"data", "image/png")}
+    client.post(f"/products/{product_id}/images", files=files, headers=admin_headers)
+    response = client.get(f"/products/{product_id}/images")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert client.get(f"/products/{product_id}/images", headers={"If-None-Match": etag}).status_code == 304
+
+    client.post(f"/products/{product_id}/images", files=files, headers=admin_headers)
+    response = client.get(f"/products/{product_id}/images", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+
+
+def test_thumbnail_url_is_denormalized(client, admin_headers):
+    product_id = create_product(client, admin_headers)
+    assert client.get(f"/products/{product_id}").json()["thumbnail_url"] is None
+
+    first = client.post(f"/products/{product_id}/images", files={"file": ("a.png", b"a", "image/png")}, headers=admin_headers).json()
+    second = client.post(f"/products/{product_id}/images", files={"file": ("b.png", b"b", "image/png")}, headers=admin_headers).json()
+    product = client.get(f"/products/{product_id}").json()
+    # Falls back to the first image until one is flagged
+    assert product["thumbnail_url"] == first["url"]
+    assert product["main_image_url"] == first["url"]
+
+    client.put(f"/products/{product_id}/images/{second['id']}", json={"is_main": True, "is_thumbnail": True}, headers=admin_headers)
+    product = client.get(f"/products/{product_id}").json()
+    assert product["thumbnail_url"] == second["url"]
+    assert product["main_image_url"] == second["url"]
+
+    client.delete(f"/products/{product_id}/images/{second['id']}", headers=admin_headers)
+    product = client.get(f"/products/{product_id}").json()
+    assert product["thumbnail_url"] == first["url"]
+
+
+def test_backfill_product_image_urls():
+    from app import models
+    from app.crud.products import backfill_product_image_urls
+    from tests.conftest import TestingSessionLocal
+
+    db = TestingSessionLocal()
+    product = models.Product(name="Legacy", price=1.0, stock=1)
+    db.add(product)
+    db.flush()
+    db.add_all([
+        models.ProductImage(product_id=product.id, url="/static/a.png"),
+        models.ProductImage(product_id=product.id, url="/static/b.png", is_thumbnail=1),
+    ])
+    db.commit()
+    assert backfill_product_image_urls(db) == 1
+    db.refresh(product)
+    assert product.thumbnail_url == "/static/b.png"
+    assert product.main_image_url == "/static/a.png"
+    db.close()
@@ -3,6 +3,9 @@
 import pytest
 import uuid
 
+from app import crud, database, schemas
+from tests.conftest import engine_test
+
 # Helper to create a product and return its ID and payload
 def create_product(client, headers, payload=None):
     if payload is None:
@@ -56,3 +59,262 @@ def test_delete_product(client, admin_headers):
     assert response.status_code == 204
     response = client.get(f"/products/{product_id}")  # public
     assert response.status_code == 404
+
+
+def test_list_products_cursor_pagination(client, admin_headers):
+    created = [create_product(client, admin_headers)[0] for _ in range(5)]
+
+    seen = []
+    params = {"limit": 2}
+    while True:
+        response = client.get("/products/", params=params)
+        assert response.status_code == 200
+        seen += [p["id"] for p in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        params = {"limit": 2, "cursor": cursor}
+    assert seen == created
+
+    # skip/limit keeps working alongside the cursor
+    response = client.get("/products/", params={"skip": 2, "limit": 2})
+    assert [p["id"] for p in response.json()] == created[2:4]
+
+    response = client.get("/products/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+def test_product_catalog_cache(client, admin_headers):
+    product_id, _ = create_product(client, admin_headers)
+    before = client.get("/admin/cache", headers=admin_headers).json()["products"]
+
+    assert client.get(f"/products/{product_id}").json()["price"] == 199.99
+    assert client.get(f"/products/{product_id}").json()["price"] == 199.99
+    stats = client.get("/admin/cache", headers=admin_headers).json()["products"]
+    assert stats["misses"] == before["misses"] + 1
+    assert stats["hits"] == before["hits"] + 1
+
+    # Mutations through the crud layer invalidate cached responses
+    update_payload = {"name": "Cached", "description": None, "price": 10.0, "stock": 1}
+    response = client.put(f"/products/{product_id}", json=update_payload, headers=admin_headers)
+    assert response.status_code == 200
+    assert client.get(f"/products/{product_id}").json()["price"] == 10.0
+    response = client.post(f"/products/{product_id}/stock", json={"quantity": 4}, headers=admin_headers)
+    assert response.status_code == 200
+    assert client.get("/products/").json()[0]["stock"] == 5
+
+
+def test_product_cache_skips_reads_older_than_a_write(client, admin_headers, monkeypatch):
+    product_id, _ = create_product(client, admin_headers)
+    real = crud.get_product
+
+    def read_then_write(db, pid):
+        product = real(db, pid)
+        # A write commits and clears the cache while this request is still serializing
+        client.post(f"/products/{pid}/stock", json={"quantity": 4}, headers=admin_headers)
+        return product
+
+    monkeypatch.setattr(crud, "get_product", read_then_write)
+    assert client.get(f"/products/{product_id}").json()["stock"] == 10
+    monkeypatch.undo()
+    assert client.get(f"/products/{product_id}").json()["stock"] == 14
+
+
+def test_product_list_from_replica_is_not_cached(client, admin_headers, monkeypatch):
+    create_product(client, admin_headers)
+
+    def hits():
+        return client.get("/admin/cache", headers=admin_headers).json()["products"]["hits"]
+
+    before = hits()
+    # Pretend the read session (the test engine) is a separate replica
+    monkeypatch.setattr(database, "replica_engine", engine_test)
+    client.get("/products/")
+    client.get("/products/")
+    assert hits() == before
+    monkeypatch.undo()
+    client.get("/products/")
+    client.get("/products/")
+    assert hits() == before + 1
+
+
+def test_product_conditional_requests(client, admin_headers):
+    product_id, _ = create_product(client, admin_headers)
+    response = client.get(f"/products/{product_id}")
+    etag = response.headers["ETag"]
+    assert response.headers["Last-Modified"]
+
+    response = client.get(f"/products/{product_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    listing = client.get("/products/")
+    list_etag = listing.headers["ETag"]
+    assert client.get("/products/", headers={"If-None-Match": list_etag}).status_code == 304
+
+    # A stock change produces a new version
+    client.post(f"/products/{product_id}/stock", json={"quantity": 1}, headers=admin_headers)
+    response = client.get(f"/products/{product_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert client.get("/products/", headers={"If-None-Match": list_etag}).status_code == 200
+
+
+def test_list_products_is_a_single_query(client, admin_headers, query_counter):
+    for _ in range(5):
+        product_id, _ = create_product(client, admin_headers)
+        files = {"file": ("img.png", b"data", "image/png")}
+        client.post(f"/products/{product_id}/images", files=files, headers=admin_headers)
+    query_counter.clear()
+    response = client.get("/products/")
+    assert response.status_code == 200
+    assert all(p["thumbnail_url"] for p in response.json())
+    assert len(query_counter) == 1
+
+
+def test_import_products_csv_upserts_by_sku(client, admin_headers):
+    existing_id, _ = create_product(client, admin_headers, {
+        "name": "Gammel", "description": "", "price": 10.0, "stock": 1, "sku": "SKU-1",
+    })
+    csv_body = (
+        "sku,name,description,price,stock\n"
+        "SKU-1,Oppdatert,,12.5,4\n"
+        "SKU-2,Ny,Beskrivelse,99,10\n"
+        ",Uten SKU,,5,0\n"
+        "SKU-3,Mangler pris,,,3\n"
+    )
+    resp = client.post(
+        "/products/import",
+        files={"file": ("catalog.csv", csv_body, "text/csv")},
+        headers=admin_headers,
+    )
+    assert resp.status_code == 200
+    result = resp.json()
+    assert (result["created"], result["updated"]) == (2, 1)
+    assert [e["row"] for e in result["errors"]] == [3]
+
+    updated = client.get(f"/products/{existing_id}").json()
+    assert (updated["name"], updated["price"], updated["stock"]) == ("Oppdatert", 12.5, 4)
+    assert {p["sku"] for p in client.get("/products/").json()} == {"SKU-1", "SKU-2", None}
+
+
+def test_import_stock_ndjson(client, admin_headers):
+    first, _ = create_product(client, admin_headers, {"name": "A", "price": 1.0, "stock": 1, "sku": "A-1"})
+    second, _ = create_product(client, admin_headers)
+    body = "\n".join([
+        '{"sku": "A-1", "stock": 40}',
+        f'{{"product_id": {second}, "stock": 7}}',
+        '{"sku": "UKJENT", "stock": 1}',
+        f'{{"product_id": {second}, "stock": -1}}',
+        "not json",
+    ])
+    resp = client.post(
+        "/products/stock/import",
+        params={"format": "ndjson"},
+        files={"file": ("stock.txt", body, "application/octet-stream")},
+        headers=admin_headers,
+    )
+    assert resp.status_code == 200
+    result = resp.json()
+    assert result["updated"] == 2
+    assert [e["row"] for e in result["errors"]] == [2, 3, 4]
+    assert client.get(f"/products/{first}").json()["stock"] == 40
+    assert client.get(f"/products/{second}").json()["stock"] == 7
+
+
+def test_import_reports_bad_encoding_after_first_records(client, admin_headers):
+    product_id, _ = create_product(client, admin_headers)
+    # Record n sets stock n + 1; record 5 is not UTF-8 and record 6 comes after it
+    body = "".join(f'{{"product_id": {product_id}, "stock": {n + 1}}}\n' for n in range(5)).encode()
+    body += b'{"sku": "\xff", "stock": 1}\n'
+    body += f'{{"product_id": {product_id}, "stock": 70}}\n'.encode()
+    resp = client.post(
+        "/products/stock/import",
+        params={"format": "ndjson"},
+        files={"file": ("stock.ndjson", body, "application/x-ndjson")},
+        headers=admin_headers,
+    )
+    assert resp.status_code == 200
+    assert resp.json()["updated"] == 1
+    assert [(e["row"], e["error"]) for e in resp.json()["errors"]] == [(5, "Record is not valid UTF-8")]
+    assert client.get(f"/products/{product_id}").json()["stock"] == 70
+
+    resp = client.post(
+        "/products/stock/import",
+        params={"format": "ndjson"},
+        files={"file": ("stock.ndjson", b'{"sku": "\xff", "stock": 1}\n', "application/x-ndjson")},
+        headers=admin_headers,
+    )
+    assert resp.status_code == 200
+    assert [e["row"] for e in resp.json()["errors"]] == [0]
+
+    # CSV stops at the record with the bad byte; the ones before it are imported
+    body = "product_id,stock\n".encode()
+    body += "".join(f"{product_id},{n + 1}\n" for n in range(3)).encode()
+    body += f"{product_id},\xff\n{product_id},90\n".encode("latin-1")
+    resp = client.post(
+        "/products/stock/import",
+        files={"file": ("stock.csv", body, "text/csv")},
+        headers=admin_headers,
+    )
+    assert resp.status_code == 200
+    [error] = resp.json()["errors"]
+    assert error["row"] == 3 and "UTF-8" in error["error"]
+    assert client.get(f"/products/{product_id}").json()["stock"] == 3
+
+    resp = client.post(
+        "/products/stock/import",
+        files={"file": ("stock.csv", b"product_id,st\xffck\n1,2\n", "text/csv")},
+        headers=admin_headers,
+    )
+    assert resp.status_code == 400
+
+
+def test_stock_batch_per_item_results(client, admin_headers):
+    first, _ = create_product(client, admin_headers, {"name": "A", "price": 1.0, "stock": 5, "sku": "B-1"})
+    second, _ = create_product(client, admin_headers)
+    items = [
+        {"sku": "B-1", "delta": -3},
+        {"product_id": second, "stock": 2},
+        {"product_id": first, "delta": -3},  # 2 left, guard rejects
+        {"product_id": 999999, "delta": 1},
+        {"product_id": second, "delta": 1, "stock": 1},
+    ]
+    resp = client.post("/products/stock/batch", json={"items": items}, headers=admin_headers)
+    assert resp.status_code == 200
+    result = resp.json()
+    assert (result["applied"], result["failed"], result["committed"]) == (2, 3, True)
+    assert [r["status"] for r in result["results"]] == [
+        "ok", "ok", "insufficient_stock", "not_found", "invalid",
+    ]
+    assert result["results"][0]["stock"] == 2
+    assert client.get(f"/products/{first}").json()["stock"] == 2
+    assert client.get(f"/products/{second}").json()["stock"] == 2
+
+
+def test_stock_batch_all_or_nothing(client, admin_headers, query_counter):
+    product_id, _ = create_product(client, admin_headers)
+    items = [
+        {"product_id": product_id, "delta": -4},
+        {"product_id": product_id, "delta": -7},
+        {"product_id": product_id, "delta": 1},  # not reached
+    ]
+    resp = client.post(
+        "/products/stock/batch", json={"items": items, "all_or_nothing": True}, headers=admin_headers
+    )
+    result = resp.json()
+    assert (result["applied"], result["committed"]) == (0, False)
+    assert [r["status"] for r in result["results"]] == ["rolled_back", "insufficient_stock", "rolled_back"]
+    assert client.get(f"/products/{product_id}").json()["stock"] == 10
+
+    # An unknown product fails the batch before any row is updated or locked
+    query_counter.clear()
+    items = [{"product_id": product_id, "delta": 1}, {"product_id": 999999, "delta": 1}]
+    resp = client.post(
+        "/products/stock/batch", json={"items": items, "all_or_nothing": True}, headers=admin_headers
+    )
+    assert [r["status"] for r in resp.json()["results"]] == ["rolled_back", "not_found"]
+    assert not [s for s in query_counter if s.lstrip().upper().startswith("UPDATE")]
+
+    items = [{"product_id": product_id, "delta": 1}] * (schemas.STOCK_BATCH_MAX_ITEMS + 1)
+    assert client.post("/products/stock/batch", json={"items": items}, headers=admin_headers).status_code == 422
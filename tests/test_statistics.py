@@ -115,3 +115,152 @@ def test_total_revenue_and_monthly_sales(client, user_headers, admin_headers):
     current_month = datetime.utcnow().month
     months = [item["month"] for item in sales]
     assert current_month in months
+
+
+def test_read_only_routes_use_replica_session(client, admin_headers):
+    from app.database import get_read_db
+    from app.main import app
+    from tests.conftest import override_get_db
+
+    used = []
+
+    def recording_read_db():
+        used.append(True)
+        yield from override_get_db()
+
+    app.dependency_overrides[get_read_db] = recording_read_db
+    try:
+        product_id, _ = create_product(client, admin_headers)
+        assert used == []  # writes stay on the primary
+
+        for path in ("/statistics/total_orders", "/products/", f"/products/{product_id}/images"):
+            before = len(used)
+            assert client.get(path, headers=admin_headers).status_code == 200
+            assert len(used) == before + 1, path
+    finally:
+        app.dependency_overrides[get_read_db] = override_get_db
+
+
+def test_sales_daily_rollup_tracks_orders_and_rebuild(client, user_headers, admin_headers):
+    from app import models
+    from app.crud.sales import rebuild_sales_daily
+    from tests.conftest import TestingSessionLocal
+
+    cust_id = create_customer(client, admin_headers)
+    prod_id, price = create_product(client, admin_headers)
+    o1, _ = create_order(client, user_headers, admin_headers, cust_id, prod_id)
+    o2, _ = create_order(client, user_headers, admin_headers, cust_id, prod_id)
+    o3, _ = create_order(client, user_headers, admin_headers, cust_id, prod_id)
+    client.put(f"/orders/{o1}/status", params={"status": "paid"}, headers=admin_headers)
+    client.put(f"/orders/{o2}/status", params={"status": "paid"}, headers=admin_headers)
+    assert client.delete(f"/orders/{o2}", headers=admin_headers).status_code == 204
+
+    def snapshot(db):
+        return {
+            row.status: (row.order_count, round(row.revenue, 2), row.item_count)
+            for row in db.query(models.SalesDaily).all()
+            if row.order_count
+        }
+
+    db = TestingSessionLocal()
+    try:
+        incremental = snapshot(db)
+        assert incremental == {"paid": (1, price, 1), "pending": (1, price, 1)}
+        rebuild_sales_daily(db)
+        assert snapshot(db) == incremental
+    finally:
+        db.close()
+
+    assert client.get("/statistics/total_orders", headers=admin_headers).json()["count"] == 2
+    assert client.get("/statistics/paid_unprocessed_count", headers=admin_headers).json()["count"] == 1
+    assert abs(client.get("/statistics/total_revenue", headers=admin_headers).json()["total"] - price) < 1e-6
+
+
+def test_sales_range_buckets(client, admin_headers):
+    from datetime import date
+    from app.crud.sales import add_sales_delta
+    from tests.conftest import TestingSessionLocal
+
+    db = TestingSessionLocal()
+    # Mon 2024-01-29 .. Thu 2024-02-01, plus a day outside the range
+    for day, revenue in ((date(2024, 1, 29), 10.0), (date(2024, 1, 31), 20.0),
+                         (date(2024, 2, 1), 5.0), (date(2024, 2, 5), 99.0)):
+        add_sales_delta(db, day, "paid", 1, revenue, 2)
+    add_sales_delta(db, date(2024, 1, 29), "pending", 1, 7.0, 1)
+    db.commit()
+    db.close()
+
+    def sales(**params):
+        resp = client.get("/statistics/sales", params={"from": "2024-01-29", "to": "2024-02-05", **params},
+                          headers=admin_headers)
+        assert resp.status_code == 200
+        return [(b["period_start"], b["order_count"], b["revenue"], b["item_count"]) for b in resp.json()]
+
+    assert sales() == [("2024-01-29", 1, 10.0, 2), ("2024-01-31", 1, 20.0, 2), ("2024-02-01", 1, 5.0, 2)]
+    assert sales(granularity="week") == [("2024-01-29", 3, 35.0, 6)]
+    assert sales(granularity="month") == [("2024-01-01", 2, 30.0, 4), ("2024-02-01", 1, 5.0, 2)]
+    assert sales(status="pending") == [("2024-01-29", 1, 7.0, 1)]
+
+    resp = client.get("/statistics/sales", params={"from": "2024-02-05", "to": "2024-01-29"}, headers=admin_headers)
+    assert resp.status_code == 400
+
+
+def test_summary_matches_counters_and_is_cached(client, user_headers, admin_headers, query_counter):
+    from app.cache import stats_cache
+
+    cust_id = create_customer(client, admin_headers)
+    prod_id, price = create_product(client, admin_headers)
+    o1, _ = create_order(client, user_headers, admin_headers, cust_id, prod_id)
+    create_order(client, user_headers, admin_headers, cust_id, prod_id)
+    client.put(f"/orders/{o1}/status", params={"status": "paid"}, headers=admin_headers)
+
+    resp = client.get("/statistics/summary", headers=admin_headers)
+    assert resp.status_code == 200
+    summary = resp.json()
+    assert summary == {
+        "total_users": client.get("/statistics/total_users", headers=admin_headers).json()["count"],
+        "total_orders": 2,
+        "total_revenue": price,
+        "paid_unprocessed_count": 1,
+    }
+
+    # Served from the cache until the TTL expires
+    create_order(client, user_headers, admin_headers, cust_id, prod_id)
+    query_counter.clear()
+    assert client.get("/statistics/summary", headers=admin_headers).json() == summary
+    assert not [sql for sql in query_counter if "sales_daily" in sql]
+
+    stats_cache.clear()
+    assert client.get("/statistics/summary", headers=admin_headers).json()["total_orders"] == 3
+
+
+def test_unprocessed_orders_export_streams_in_batches(client, user_headers, admin_headers, monkeypatch):
+    import csv
+    import io
+    import json
+    from app.routers import statistics as statistics_router
+
+    monkeypatch.setattr(statistics_router, "EXPORT_BATCH_SIZE", 2)
+    cust_id = create_customer(client, admin_headers)
+    prod_id, price = create_product(client, admin_headers)
+    paid = []
+    for i in range(4):
+        order_id, _ = create_order(client, user_headers, admin_headers, cust_id, prod_id)
+        if i != 1:
+            client.put(f"/orders/{order_id}/status", params={"status": "paid"}, headers=admin_headers)
+            paid.append(order_id)
+
+    resp = client.get("/statistics/unprocessed_orders/export", headers=admin_headers)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert [line["id"] for line in lines] == paid
+    assert lines[0]["customer"]["id"] == cust_id
+    assert lines[0]["items"][0]["product"]["id"] == prod_id
+
+    resp = client.get("/statistics/unprocessed_orders/export", params={"format": "csv"}, headers=admin_headers)
+    assert resp.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(resp.text)))
+    assert [int(row["order_id"]) for row in rows] == paid
+    assert rows[0]["product_name"] == "StatsProduct"
+    assert int(rows[0]["quantity"]) == 1
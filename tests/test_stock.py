@@ -72,17 +72,134 @@ def test_order_decrements_and_delete_restores_stock(client, user_headers, admin_
     prod_id, prod = create_product(client, admin_headers, {"name": "StockTest", "description": "","price": 5.0, "stock": 8})
     # Place order for quantity 3
     order_id, _ = create_order(client, user_headers, admin_headers, product_id=prod_id)
-    # Verify stock decreased
+    # Verify availability decreased (reserved until the order is paid)
     resp = client.get(f"/products/{prod_id}")
     assert resp.status_code == 200
-    assert resp.json()["stock"] == 8 - 3
+    assert (resp.json()["stock"], resp.json()["reserved"], resp.json()["available"]) == (8, 3, 8 - 3)
     # Delete order
     resp_del = client.delete(f"/orders/{order_id}", headers=admin_headers)
     assert resp_del.status_code == 204
-    # Stock should be restored
+    # Reservation should be released
     resp2 = client.get(f"/products/{prod_id}")
     assert resp2.status_code == 200
-    assert resp2.json()["stock"] == 8
+    assert (resp2.json()["stock"], resp2.json()["available"]) == (8, 8)
+
+
+def test_paid_order_commits_reservation(client, user_headers, admin_headers):
+    prod_id, _ = create_product(client, admin_headers, {"name": "Paid", "price": 5.0, "stock": 8})
+    order_id, _ = create_order(client, user_headers, admin_headers, product_id=prod_id)
+    resp = client.put(f"/orders/{order_id}/status", params={"status": "paid"}, headers=admin_headers)
+    assert resp.status_code == 200
+    product = client.get(f"/products/{prod_id}").json()
+    assert (product["stock"], product["reserved"], product["available"]) == (5, 0, 5)
+    # Deleting a paid order puts the units back on stock
+    client.delete(f"/orders/{order_id}", headers=admin_headers)
+    product = client.get(f"/products/{prod_id}").json()
+    assert (product["stock"], product["reserved"]) == (8, 0)
+
+
+def test_expired_reservations_cancel_pending_orders(client, user_headers, admin_headers):
+    from datetime import datetime, timedelta, timezone
+    from app import crud
+    from tests.conftest import TestingSessionLocal
+
+    prod_id, _ = create_product(client, admin_headers, {"name": "Hot", "price": 5.0, "stock": 3})
+    order_id, _ = create_order(client, user_headers, admin_headers, product_id=prod_id)
+    assert client.get(f"/products/{prod_id}").json()["available"] == 0
+
+    db = TestingSessionLocal()
+    try:
+        assert crud.expire_reservations(db) == 0  # not expired yet
+        later = datetime.now(timezone.utc) + timedelta(days=1)
+        assert crud.expire_reservations(db, now=later) == 1
+        assert crud.expire_reservations(db, now=later) == 0
+    finally:
+        db.close()
+
+    product = client.get(f"/products/{prod_id}").json()
+    assert (product["stock"], product["reserved"], product["available"]) == (3, 0, 3)
+    order = client.get(f"/orders/{order_id}", headers=admin_headers).json()
+    assert order["status"] == "canceled"
+    # A late payment takes the units from stock again
+    client.put(f"/orders/{order_id}/status", params={"status": "paid"}, headers=admin_headers)
+    assert client.get(f"/products/{prod_id}").json()["stock"] == 0
+
+
+def test_late_payment_does_not_take_stock_sold_to_others(client, user_headers, admin_headers):
+    from datetime import datetime, timedelta, timezone
+    from app import crud
+    from tests.conftest import TestingSessionLocal
+
+    prod_id, _ = create_product(client, admin_headers, {"name": "Last", "price": 5.0, "stock": 3})
+    first, _ = create_order(client, user_headers, admin_headers, product_id=prod_id)
+    db = TestingSessionLocal()
+    try:
+        assert crud.expire_reservations(db, now=datetime.now(timezone.utc) + timedelta(days=1)) == 1
+    finally:
+        db.close()
+    second, _ = create_order(client, user_headers, admin_headers, product_id=prod_id)
+
+    # The first order's payment arrives late: its units now belong to the second order
+    resp = client.put(f"/orders/{first}/status", params={"status": "paid"}, headers=admin_headers)
+    assert resp.status_code == 200
+    assert (resp.json()["status"], resp.json()["refund_required"]) == ("canceled", True)
+    product = client.get(f"/products/{prod_id}").json()
+    assert (product["stock"], product["reserved"], product["available"]) == (3, 3, 0)
+
+    client.put(f"/orders/{second}/status", params={"status": "paid"}, headers=admin_headers)
+    product = client.get(f"/products/{prod_id}").json()
+    assert (product["stock"], product["reserved"]) == (0, 0)
+
+
+def test_status_change_rereads_order_after_sweeper(client, user_headers, admin_headers):
+    from datetime import datetime, timedelta, timezone
+    from app import crud, models
+    from tests.conftest import TestingSessionLocal
+
+    prod_id, _ = create_product(client, admin_headers, {"name": "Race", "price": 5.0, "stock": 8})
+    order_id, _ = create_order(client, user_headers, admin_headers, product_id=prod_id)
+    admin_db, sweeper_db = TestingSessionLocal(), TestingSessionLocal()
+    try:
+        stale = admin_db.get(models.Order, order_id)  # read by the admin session before the sweeper runs
+        assert stale.status == "pending"
+        assert crud.expire_reservations(sweeper_db, now=datetime.now(timezone.utc) + timedelta(days=1)) == 1
+        crud.update_order_status(admin_db, order_id, "paid")
+        counts = {row.status: row.order_count for row in admin_db.query(models.SalesDaily)}
+    finally:
+        admin_db.close()
+        sweeper_db.close()
+    # Moved from canceled, so the order is counted once
+    assert counts == {"pending": 0, "canceled": 0, "paid": 1}
+
+
+def test_absolute_stock_cannot_drop_below_reserved(client, user_headers, admin_headers):
+    prod_id, _ = create_product(client, admin_headers, {"name": "Held", "price": 5.0, "stock": 5, "sku": "HELD-1"})
+    create_order(client, user_headers, admin_headers, product_id=prod_id)  # reserves 3
+
+    resp = client.post("/products/stock/batch", json={"items": [{"product_id": prod_id, "stock": 0}]}, headers=admin_headers)
+    assert resp.json()["results"][0]["status"] == "insufficient_stock"
+    resp = client.put(f"/products/{prod_id}", json={"name": "Held", "price": 5.0, "stock": 2}, headers=admin_headers)
+    assert resp.status_code == 400
+    resp = client.post(
+        "/products/stock/import?format=ndjson",
+        files={"file": ("stock.ndjson", f'{{"product_id": {prod_id}, "stock": 1}}\n', "application/x-ndjson")},
+        headers=admin_headers,
+    )
+    assert resp.json()["updated"] == 0
+    assert "reserved" in resp.json()["errors"][0]["error"]
+    resp = client.post(
+        "/products/import?format=csv",
+        files={"file": ("catalog.csv", "sku,name,price,stock\nHELD-1,Held,5,2\nNEG-1,Negative,5,-1\n", "text/csv")},
+        headers=admin_headers,
+    )
+    assert (resp.json()["created"], resp.json()["updated"]) == (0, 0)
+    assert [e["row"] for e in resp.json()["errors"]] == [0, 1]
+
+    # Setting it to exactly the reserved units is fine
+    resp = client.post("/products/stock/batch", json={"items": [{"product_id": prod_id, "stock": 3}]}, headers=admin_headers)
+    assert resp.json()["results"][0]["status"] == "ok"
+    product = client.get(f"/products/{prod_id}").json()
+    assert (product["stock"], product["reserved"], product["available"]) == (3, 3, 0)
 
 
 def test_get_stock(client, headers):
@@ -108,3 +225,55 @@ def test_delete_stock(client, headers):
     resp = client.get(f"/products/{product_id}/stock", headers=headers)
     assert resp.status_code == 200
     assert resp.json() == 0
+
+
+def test_parallel_checkouts_never_oversell(tmp_path):
+    # Separate file-backed database so every worker gets its own connection
+    from concurrent.futures import ThreadPoolExecutor
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app import crud, models, schemas
+    from app.database import Base
+
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'checkout.sqlite'}",
+        connect_args={"check_same_thread": False, "timeout": 30},
+    )
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    db = Session()
+    user = models.User(email="buyer@example.com", hashed_password="x", role="customer")
+    db.add(user)
+    db.flush()
+    customer = models.Customer(user_id=user.id, first_name="B", last_name="Uyer", email="buyer@example.com")
+    product = models.Product(name="Limited", price=10.0, stock=5)
+    db.add_all([customer, product])
+    db.commit()
+    customer_id, product_id = customer.id, product.id
+    db.close()
+
+    def checkout(_):
+        session = Session()
+        try:
+            order_in = schemas.OrderCreate(
+                customer_id=customer_id,
+                items=[schemas.OrderItemCreate(product_id=product_id, quantity=1)],
+            )
+            crud.create_order(session, order_in)
+            return True
+        except ValueError:
+            return False
+        finally:
+            session.close()
+
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        results = list(pool.map(checkout, range(30)))
+
+    db = Session()
+    assert sum(results) == 5
+    product = db.get(models.Product, product_id)
+    assert (product.stock, product.reserved, product.available) == (5, 5, 0)
+    assert db.query(models.Order).count() == 5
+    db.close()
+    engine.dispose()
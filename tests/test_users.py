@@ -105,3 +105,26 @@ def test_register_customer_with_shipping(client, admin_headers):
     assert resp.status_code == 200
     customers = resp.json()
     assert any(c["email"] == payload["shipping"]["email"] for c in customers)
+
+
+def test_password_pool_sheds_load(client, admin_headers, monkeypatch):
+    from app.passwords import hasher
+
+    create_user(client)  # hashed in the process pool
+    stats = client.get("/admin/passwords", headers=admin_headers).json()
+    assert stats["completed"] >= 1
+    assert stats["pending"] == 0
+
+    monkeypatch.setattr(hasher, "max_pending", 0)
+    resp = client.post("/users/", json={"email": "busy@example.com", "password": "x", "role": "customer"})
+    assert resp.status_code == 503
+    assert resp.headers["retry-after"] == "1"
+    assert client.get("/admin/passwords", headers=admin_headers).json()["rejected"] >= 1
+
+    # Unknown users are rejected before anything is hashed
+    rejected = client.get("/admin/passwords", headers=admin_headers).json()["rejected"]
+    resp = client.put(
+        "/users/999999", json={"email": "nobody@example.com", "password": "x", "role": "customer"}, headers=admin_headers
+    )
+    assert resp.status_code == 404
+    assert client.get("/admin/passwords", headers=admin_headers).json()["rejected"] == rejected
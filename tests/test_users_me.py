@@ -22,3 +22,39 @@ def test_get_current_user_as_admin(client, admin_headers):
     data = response.json()
     assert data["email"] == "admin"
     assert data["role"] == "admin"
+
+
+def test_get_current_user_expand_projection(client, user_headers):
+    response = client.get("/users/me", params={"expand": ""}, headers=user_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["role"] == "customer"
+    assert "customer" not in data
+
+
+def test_principal_cache_and_token_revocation(client, user_headers, admin_headers, query_counter):
+    me = client.get("/users/me", headers=user_headers).json()
+
+    # Cached principal: authenticating again does not look the user up
+    query_counter.clear()
+    assert client.get("/crm/notes/1", headers=user_headers).status_code == 200
+    assert not [sql for sql in query_counter if "FROM users" in sql]
+
+    # Updating the user bumps token_version, so the old token stops working
+    resp = client.put(
+        f"/users/{me['id']}",
+        json={"email": me["email"], "password": "newpass", "role": "customer"},
+        headers=admin_headers,
+    )
+    assert resp.status_code == 200
+    assert client.get("/users/me", headers=user_headers).status_code == 401
+
+    token = client.post("/token", data={"username": me["email"], "password": "newpass"}).json()["access_token"]
+    assert client.get("/users/me", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+
+
+def test_read_only_admin_endpoints_use_claims(client, admin_headers, user_headers, query_counter):
+    query_counter.clear()
+    assert client.get("/statistics/total_orders", headers=admin_headers).status_code == 200
+    assert not [sql for sql in query_counter if "FROM users" in sql]
+    assert client.get("/statistics/total_orders", headers=user_headers).status_code == 403
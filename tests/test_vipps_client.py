@@ -0,0 +1,103 @@
+# tests/test_vipps_client.py
+
+import threading
+import time
+
+import pytest
+
+from app.integrations import vipps
+
+
+class FakeResponse:
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self._data = data
+        self.text = str(data)
+
+    def json(self):
+        return self._data
+
+
+class FakeSession:
+    """Records calls instead of talking to Vipps; token fetches can be slowed down."""
+
+    def __init__(self, token_delay=0.0, expires_in="3600"):
+        self.token_delay = token_delay
+        self.expires_in = expires_in
+        self.token_calls = 0
+        self.calls = []
+        self.reject_token = None
+        self._lock = threading.Lock()
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        assert timeout == vipps.VIPPS_TIMEOUT
+        time.sleep(self.token_delay)
+        with self._lock:
+            self.token_calls += 1
+            token = f"token-{self.token_calls}"
+        return FakeResponse(200, {"access_token": token, "expires_in": self.expires_in})
+
+    def request(self, method, url, headers=None, timeout=None, **kwargs):
+        assert timeout == vipps.VIPPS_TIMEOUT
+        token = headers["Authorization"].split()[-1]
+        self.calls.append(token)
+        if token == self.reject_token:
+            return FakeResponse(401, {"error": "expired"})
+        return FakeResponse(201 if method == "POST" else 200, {"reference": "x", "token": token})
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def vipps_credentials(monkeypatch):
+    monkeypatch.setattr(vipps, "VIPPS_CLIENT_ID", "id")
+    monkeypatch.setattr(vipps, "VIPPS_CLIENT_SECRET", "secret")
+    monkeypatch.setattr(vipps, "VIPPS_APIM_SUBSCRIPTION_KEY", "key")
+
+
+def test_token_is_fetched_once_and_reused():
+    session = FakeSession()
+    client = vipps.VippsClient(session=session)
+    for order_id in range(3):
+        client.create_payment(order_id=order_id, amount=100.0, callback_url="https://app/cb")
+    assert session.token_calls == 1
+    assert session.calls == ["token-1"] * 3
+
+
+def test_concurrent_callers_share_one_token_fetch():
+    session = FakeSession(token_delay=0.05)
+    client = vipps.VippsClient(session=session)
+    threads = [
+        threading.Thread(target=client.create_payment, args=(i, 100.0, "https://app/cb"))
+        for i in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert session.token_calls == 1
+    assert set(session.calls) == {"token-1"}
+
+
+def test_token_refreshed_ahead_of_expiry_and_after_401(monkeypatch):
+    session = FakeSession(expires_in="600")
+    client = vipps.VippsClient(session=session)
+    client.get_payment_status("p1")
+    # Inside the refresh margin: renewed before it actually expires
+    monkeypatch.setattr(vipps, "VIPPS_TOKEN_REFRESH_MARGIN", 900)
+    client.get_payment_status("p2")
+    assert session.calls == ["token-1", "token-2"]
+
+    monkeypatch.setattr(vipps, "VIPPS_TOKEN_REFRESH_MARGIN", 0)
+    session.reject_token = "token-2"
+    client.get_payment_status("p3")
+    assert session.calls[-2:] == ["token-2", "token-3"]
+    assert session.token_calls == 3
+
+
+def test_get_vipps_client_is_shared():
+    try:
+        assert vipps.get_vipps_client() is vipps.get_vipps_client()
+    finally:
+        vipps.close_vipps_clients()